@@ -0,0 +1,340 @@
+"""Materialized forecasts in the `forecasts` table.
+
+One row per (keyword, scope, ds), where scope is 'trends' for the Google
+Trends series, 'geo:<country>' for a country's geo_metrics series or
+'geo:<country>:<platform>' for one platform in that country.
+
+Each stored forecast keeps the input watermark of the history it was built
+from: the latest point time, point count and value sum of that series. A
+forecast is stale once the current watermark differs, i.e. when newer
+raw_data/geo_metrics points exist or stored points were revised.
+
+  - `get_forecast` serves the stored rows; a stale forecast is still served
+    while a background refresh runs, a missing one is computed on the spot.
+    A request for another engine or an explicit LSTM mode is computed for that
+    request only (repeat requests hit the model registry) and never replaces
+    the stored forecast.
+  - `refresh_stale_forecasts` (run by scheduler.py) recomputes every tracked
+    series whose watermark moved; a series too short to forecast is only
+    retried once its watermark moves again.
+"""
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from database import db
+from backend.analytics.forecasting import ENGINES, FORECAST_MODES, forecast_with_info
+
+logger = logging.getLogger(__name__)
+
+FORECAST_REFRESH_WORKERS = int(os.environ.get('FORECAST_REFRESH_WORKERS', 2))
+
+FORECAST_UPSERT = ("INSERT INTO forecasts (keyword, scope, ds, yhat, yhat_lower, yhat_upper, engine, model_version, generated_at, input_watermark) "
+                   "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s) "
+                   "ON DUPLICATE KEY UPDATE yhat = VALUES(yhat), yhat_lower = VALUES(yhat_lower), yhat_upper = VALUES(yhat_upper), "
+                   "engine = VALUES(engine), model_version = VALUES(model_version), generated_at = VALUES(generated_at), "
+                   "input_watermark = VALUES(input_watermark)")
+
+_refresh_executor = ThreadPoolExecutor(max_workers=FORECAST_REFRESH_WORKERS, thread_name_prefix="forecast-refresh")
+_in_flight = set()
+_in_flight_lock = threading.Lock()
+# {(keyword, scope): watermark} of series that could not be forecast (e.g. fewer
+# than 30 points); nothing is stored for them, so this keeps the periodic
+# refresh from recomputing them until their input changes
+_unforecastable = {}
+
+
+def geo_scope(country, platform=None):
+    return f"geo:{country}:{platform}" if platform else f"geo:{country}"
+
+
+def parse_scope(scope):
+    """'trends' -> ('trends', None, None); 'geo:<country>[:<platform>]' -> ('geo', country, platform)."""
+    if scope == 'trends':
+        return 'trends', None, None
+    parts = scope.split(':', 2)
+    if len(parts) < 2 or parts[0] != 'geo':
+        raise ValueError(f"Unknown forecast scope: {scope}")
+    return 'geo', parts[1], parts[2] if len(parts) > 2 else None
+
+
+def registry_source(scope):
+    """`generate_forecast` source for a scope (keeps the model registry paths stable)."""
+    kind, country, platform = parse_scope(scope)
+    return 'google_trends' if kind == 'trends' else f"geo:{country}:{platform or 'all'}"
+
+
+def load_history(cursor, keyword, scope):
+    """History rows for one series, oldest first: {date, score} for trends, {date, y} for geo."""
+    kind, country, platform = parse_scope(scope)
+    if kind == 'trends':
+        cursor.execute("SELECT post_time as date, score FROM raw_data WHERE keyword = %s "
+                       "AND platform = 'Google Trends' ORDER BY post_time ASC", (keyword,))
+        return cursor.fetchall()
+    q = "SELECT `date` as date, metric as y FROM geo_metrics WHERE keyword = %s AND country = %s"
+    params = [keyword, country]
+    if platform:
+        q += " AND platform = %s"
+        params.append(platform)
+    q += " ORDER BY `date` ASC"
+    cursor.execute(q, tuple(params))
+    return cursor.fetchall()
+
+
+def _format_watermark(last_ts, n, total):
+    return f"{last_ts}|{int(n)}|{float(total or 0):.4f}"
+
+
+def input_watermark(cursor, keyword, scope):
+    """Current input watermark of one series, or None if it has no points."""
+    kind, country, platform = parse_scope(scope)
+    if kind == 'trends':
+        cursor.execute("SELECT MAX(post_time) AS last_ts, COUNT(*) AS n, SUM(score) AS total FROM raw_data "
+                       "WHERE keyword = %s AND platform = 'Google Trends'", (keyword,))
+    else:
+        q = ("SELECT MAX(`date`) AS last_ts, COUNT(*) AS n, SUM(metric) AS total FROM geo_metrics "
+             "WHERE keyword = %s AND country = %s AND `date` IS NOT NULL")
+        params = [keyword, country]
+        if platform:
+            q += " AND platform = %s"
+            params.append(platform)
+        cursor.execute(q, tuple(params))
+    row = cursor.fetchone()
+    if not row or not row['n']:
+        return None
+    return _format_watermark(row['last_ts'], row['n'], row['total'])
+
+
+def input_watermarks(cursor, keywords=None, include_geo=True):
+    """
+    Current watermarks of every tracked series in two grouped queries:
+    {(keyword, scope): watermark} for 'trends' and all-platform 'geo:<country>'.
+    """
+    kw_filter, params = '', ()
+    if keywords:
+        kw_filter = " AND keyword IN (" + ", ".join(["%s"] * len(keywords)) + ")"
+        params = tuple(keywords)
+    watermarks = {}
+    cursor.execute("SELECT keyword, MAX(post_time) AS last_ts, COUNT(*) AS n, SUM(score) AS total FROM raw_data "
+                   "WHERE platform = 'Google Trends'" + kw_filter + " GROUP BY keyword", params)
+    for r in cursor.fetchall():
+        watermarks[(r['keyword'], 'trends')] = _format_watermark(r['last_ts'], r['n'], r['total'])
+    if include_geo:
+        cursor.execute("SELECT keyword, country, MAX(`date`) AS last_ts, COUNT(*) AS n, SUM(metric) AS total "
+                       "FROM geo_metrics WHERE country IS NOT NULL AND `date` IS NOT NULL" + kw_filter +
+                       " GROUP BY keyword, country", params)
+        for r in cursor.fetchall():
+            watermarks[(r['keyword'], geo_scope(r['country']))] = _format_watermark(r['last_ts'], r['n'], r['total'])
+    return watermarks
+
+
+def load_stored_forecast(cursor, keyword, scope):
+    """Returns (records, meta) for the stored forecast, or (None, None)."""
+    cursor.execute("SELECT ds, yhat, yhat_lower, yhat_upper, engine, model_version, generated_at, input_watermark "
+                   "FROM forecasts WHERE keyword = %s AND scope = %s ORDER BY ds ASC", (keyword, scope))
+    rows = cursor.fetchall()
+    if not rows:
+        return None, None
+    meta = {k: rows[0][k] for k in ('engine', 'model_version', 'generated_at', 'input_watermark')}
+    records = [{'ds': r['ds'].strftime('%Y-%m-%d'), 'yhat': r['yhat'],
+                'yhat_lower': r['yhat_lower'], 'yhat_upper': r['yhat_upper']} for r in rows]
+    return records, meta
+
+
+def store_forecasts(items, generated_at=None):
+    """
+    Upserts forecasts and removes rows of the same series left from earlier runs.
+
+    `items` is an iterable of (keyword, scope, records, engine, model_version,
+    input_watermark) where `records` are `generate_forecast`-style dicts (ds,
+    yhat, yhat_lower, yhat_upper). Returns the number of forecast rows written.
+    """
+    generated_at = (generated_at or datetime.now()).replace(microsecond=0)
+    series = []
+    with db.BulkUpserter(FORECAST_UPSERT, background=True) as upserter:
+        for keyword, scope, records, engine, model_version, watermark in items:
+            series.append((keyword, scope, generated_at))
+            upserter.add_many([
+                (keyword, scope, r['ds'], r.get('yhat'), r.get('yhat_lower'), r.get('yhat_upper'),
+                 engine, model_version or 0, generated_at, watermark)
+                for r in records
+            ])
+    rows_written = upserter.rows_written
+
+    if series:
+        conn = db.get_db_connection()
+        if conn is None:
+            logger.warning('Stored %d forecast rows but could not prune old rows: no DB connection', rows_written)
+            return rows_written
+        cursor = conn.cursor()
+        try:
+            cursor.executemany("DELETE FROM forecasts WHERE keyword = %s AND scope = %s AND generated_at < %s", series)
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+    return rows_written
+
+
+def validate_forecast_options(mode=None, engine=None):
+    """Raises ValueError for a `mode` or `engine` that is not in FORECAST_MODES / ENGINES."""
+    if mode and mode not in FORECAST_MODES:
+        raise ValueError(f"mode must be one of: {', '.join(FORECAST_MODES)}")
+    if engine and engine not in ENGINES:
+        raise ValueError(f"engine must be one of: {', '.join(sorted(ENGINES))}")
+
+
+def compute_forecast(keyword, scope, mode=None, engine=None):
+    """
+    Computes one series' forecast without storing it. Returns (records, meta)
+    or (None, None) when the series cannot be forecast.
+    """
+    conn = db.get_db_connection()
+    if conn is None:
+        return None, None
+    cursor = conn.cursor(dictionary=True)
+    try:
+        # Watermark first: points landing while we read the history make the
+        # stored forecast look stale (recomputed next time), never fresh
+        watermark = input_watermark(cursor, keyword, scope)
+        history = load_history(cursor, keyword, scope)
+    finally:
+        cursor.close()
+        conn.close()
+
+    if not history or len(history) < 30:
+        return None, None
+    records, info = forecast_with_info(history, keyword=keyword, source=registry_source(scope),
+                                       mode=mode, engine=engine)
+    if records is None:
+        return None, None
+    return records, {'engine': info['engine'], 'model_version': info['model_version'] or 0,
+                     'generated_at': datetime.now().replace(microsecond=0), 'input_watermark': watermark}
+
+
+def refresh_forecast(keyword, scope):
+    """
+    Recomputes one series' forecast with the default engine and mode and
+    stores it. Returns (records, meta) or (None, None).
+    """
+    records, meta = compute_forecast(keyword, scope)
+    if records is None:
+        return None, None
+    store_forecasts([(keyword, scope, records, meta['engine'], meta['model_version'], meta['input_watermark'])],
+                    generated_at=meta['generated_at'])
+    return records, meta
+
+
+def _refresh_in_background(keyword, scope):
+    try:
+        refresh_forecast(keyword, scope)
+    except Exception as e:
+        logger.exception('Background forecast refresh failed for %s/%s: %s', keyword, scope, e)
+    finally:
+        with _in_flight_lock:
+            _in_flight.discard((keyword, scope))
+
+
+def schedule_refresh(keyword, scope):
+    """Queues a background refresh unless one is in flight. Returns True if queued."""
+    with _in_flight_lock:
+        if (keyword, scope) in _in_flight:
+            return False
+        _in_flight.add((keyword, scope))
+    _refresh_executor.submit(_refresh_in_background, keyword, scope)
+    return True
+
+
+def get_forecast(keyword, scope, mode=None, engine=None):
+    """
+    Stored forecast for a series: returns (records, meta) or (None, None).
+
+    meta adds 'stale' (the input watermark moved since it was generated) and
+    'refreshing'. Stale forecasts are returned as-is with a background refresh
+    queued; missing ones are computed and stored before returning.
+
+    An explicit `mode`, or an `engine` other than the stored one, is served
+    from `compute_forecast` for this request only (meta 'override' is True),
+    so per-request options never replace the forecast other clients see.
+    Raises ValueError for an unknown `mode` or `engine`.
+    """
+    validate_forecast_options(mode, engine)
+    conn = db.get_db_connection()
+    if conn is None:
+        return None, None
+    cursor = conn.cursor(dictionary=True)
+    try:
+        records, meta = load_stored_forecast(cursor, keyword, scope)
+        current = input_watermark(cursor, keyword, scope) if records else None
+    finally:
+        cursor.close()
+        conn.close()
+
+    override = mode or (engine and (records is None or meta['engine'] != engine))
+    if override:
+        records, meta = compute_forecast(keyword, scope, mode=mode, engine=engine)
+        if records is None:
+            return None, None
+        meta.update(stale=False, refreshing=False, override=True)
+        return records, meta
+
+    if records is None:
+        records, meta = refresh_forecast(keyword, scope)
+        if records is None:
+            return None, None
+        meta.update(stale=False, refreshing=False)
+        return records, meta
+
+    meta['stale'] = current != meta['input_watermark']
+    meta['refreshing'] = schedule_refresh(keyword, scope) if meta['stale'] else False
+    return records, meta
+
+
+def refresh_stale_forecasts(keywords=None, include_geo=True):
+    """
+    Recomputes every tracked series whose input watermark moved since its
+    stored forecast (or that has none). A series that could not be forecast
+    is skipped until its watermark moves. Returns a summary dict.
+    """
+    started = datetime.now()
+    conn = db.get_db_connection()
+    if conn is None:
+        return {'success': False, 'reason': 'db_connect_fail'}
+    cursor = conn.cursor(dictionary=True)
+    try:
+        current = input_watermarks(cursor, keywords, include_geo=include_geo)
+        cursor.execute("SELECT keyword, scope, MAX(input_watermark) AS input_watermark FROM forecasts GROUP BY keyword, scope")
+        stored = {(r['keyword'], r['scope']): r['input_watermark'] for r in cursor.fetchall()}
+    finally:
+        cursor.close()
+        conn.close()
+
+    with _in_flight_lock:
+        unforecastable = dict(_unforecastable)
+    stale = [key for key, watermark in current.items()
+             if watermark not in (stored.get(key), unforecastable.get(key))]
+    print(f"FORECAST_REFRESH: {len(stale)} of {len(current)} series are stale.")
+
+    futures = {key: _refresh_executor.submit(refresh_forecast, *key) for key in stale}
+    refreshed, skipped, failed = 0, 0, {}
+    for (keyword, scope), future in futures.items():
+        try:
+            records, _ = future.result()
+            with _in_flight_lock:
+                if records is None:
+                    _unforecastable[(keyword, scope)] = current[(keyword, scope)]
+                else:
+                    _unforecastable.pop((keyword, scope), None)
+            if records is None:
+                skipped += 1
+            else:
+                refreshed += 1
+        except Exception as e:
+            failed[f"{keyword}|{scope}"] = str(e)
+    return {'success': not failed, 'checked': len(current), 'stale': len(stale), 'refreshed': refreshed,
+            'skipped': skipped, 'failed': failed,
+            'duration_s': round((datetime.now() - started).total_seconds(), 1)}
@@ -1,135 +1,463 @@
 import pandas as pd
 import numpy as np
+import hashlib
+import multiprocessing
+import re
+import sys
+import threading
 import warnings
 import os
-from sklearn.preprocessing import MinMaxScaler
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import LSTM, Dense
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from numpy.lib.stride_tricks import sliding_window_view
+from datetime import datetime
+import joblib
+from statsmodels.tsa.exponential_smoothing.ets import ETSModel
 
-# Suppress TensorFlow warnings
-os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+# TensorFlow is only imported by backend/analytics/lstm_engine.py, which is
+# loaded the first time an LSTM forecast is trained or run in this process
 warnings.filterwarnings("ignore")
 
-def create_sequences(data, sequence_length):
+# --- Trained model registry ---
+# Forecast state is cached per (keyword, source, frequency, model) in memory,
+# and LSTM weights on disk too. An unchanged history is served from the cached
+# forecast; new points warm-start the saved LSTM weights for
+# FORECAST_WARM_EPOCHS instead of training from scratch.
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+FORECAST_MODEL_DIR = os.environ.get('FORECAST_MODEL_DIR', os.path.join(PROJECT_ROOT, 'models', 'forecast_models'))
+FORECAST_MEMORY_MODELS = int(os.environ.get('FORECAST_MEMORY_MODELS', 32))
+FORECAST_TRAIN_EPOCHS = int(os.environ.get('FORECAST_TRAIN_EPOCHS', 5))
+FORECAST_WARM_EPOCHS = int(os.environ.get('FORECAST_WARM_EPOCHS', 2))
+
+# --- Multi-step forecast modes ---
+#   recursive - one model.predict call per future step (original behaviour)
+#   rollout   - same one-step model, whole autoregressive loop compiled into a
+#               single tf.function graph
+#   direct    - a model whose last layer emits all FORECAST_STEPS at once
+FORECAST_MODES = ('recursive', 'rollout', 'direct')
+FORECAST_MODE = os.environ.get('FORECAST_MODE', 'rollout')
+
+# --- Forecasting engines ---
+# 'auto' uses exponential smoothing unless the series is long enough for the
+# LSTM to be worth training (FORECAST_LSTM_MIN_POINTS_* resampled points)
+FORECAST_ENGINE = os.environ.get('FORECAST_ENGINE', 'auto')
+FORECAST_LSTM_MIN_POINTS = {
+    'D': int(os.environ.get('FORECAST_LSTM_MIN_POINTS_DAILY', 1095)),
+    'W': int(os.environ.get('FORECAST_LSTM_MIN_POINTS_WEEKLY', 520)),
+}
+# Coverage of yhat_lower..yhat_upper
+FORECAST_INTERVAL = float(os.environ.get('FORECAST_INTERVAL', 0.8))
+SEASONAL_PERIODS = {'D': 7, 'W': 52}
+
+# LSTM training/inference in a dedicated process pool (0 = in the calling
+# process). Pool workers are spawned, so web workers never load TensorFlow.
+FORECAST_LSTM_WORKERS = int(os.environ.get('FORECAST_LSTM_WORKERS', 0))
+FORECAST_LSTM_TIMEOUT = float(os.environ.get('FORECAST_LSTM_TIMEOUT', 600))
+
+_registry = OrderedDict()
+_registry_lock = threading.Lock()
+_key_locks = {}
+_lstm_pool = None
+_lstm_pool_lock = threading.Lock()
+
+
+def create_sequences(data, sequence_length, horizon=1, target=0):
+    """
+    Creates time-series sequences from the data without copying it.
+
+    `data` is (n_steps,) or (n_steps, n_features). Returns read-only strided
+    views X of shape (n_windows, sequence_length, n_features) and y of shape
+    (n_windows, horizon) holding the next `horizon` values of feature `target`,
+    where n_windows = n_steps - sequence_length - horizon + 1. Memory use does
+    not grow with `sequence_length`; copy slices (e.g. one batch) as needed.
+    """
+    data = np.asarray(data)
+    if data.ndim == 1:
+        data = data[:, None]
+    n_windows = len(data) - sequence_length - horizon + 1
+    if n_windows <= 0:
+        return (np.empty((0, sequence_length, data.shape[1]), dtype=data.dtype),
+                np.empty((0, horizon), dtype=data.dtype))
+    # (n_steps - L + 1, n_features, L) -> (n_windows, L, n_features)
+    X = sliding_window_view(data, sequence_length, axis=0)[:n_windows].transpose(0, 2, 1)
+    y = sliding_window_view(data[sequence_length:, target], horizon)[:n_windows]
+    return X, y
+
+
+def latest_window(data, sequence_length):
+    """The last `sequence_length` steps of `data` as a (1, sequence_length, n_features) model input."""
+    data = np.asarray(data)
+    if data.ndim == 1:
+        data = data[:, None]
+    return data[-sequence_length:][None, :, :]
+
+
+def _prepare_series(historical_data):
+    """
+    Builds the resampled score series and picks the model settings for its
+    frequency. Returns (df, FREQ, SEQUENCE_LENGTH, FORECAST_STEPS).
+    """
+    df = pd.DataFrame(historical_data)
+    if 'score' not in df.columns and 'y' in df.columns:
+        # geo_metrics history comes as (date, y)
+        df.rename(columns={'y': 'score'}, inplace=True)
+    df['date'] = pd.to_datetime(df['date'])
+    df['score'] = pd.to_numeric(df['score'], errors='coerce')
+
+    if df.duplicated(subset=['date']).any():
+        print("DUPLICATE_DATES_FOUND: Consolidating duplicate date entries.")
+        df = df.groupby('date')['score'].mean().reset_index()
+
+    df.set_index('date', inplace=True)
+    df.sort_index(inplace=True)
+
+    # --- Auto-detect Frequency ---
+    # Get the time difference between the first two data points
+    time_diff = (df.index[1] - df.index[0]).days
+
+    if time_diff < 3:
+        # --- DAILY DATA ---
+        print("Data appears to be DAILY. Using daily model.")
+        FREQ = 'D'
+        SEQUENCE_LENGTH = 30 # Look back 30 days
+        FORECAST_STEPS = 90  # Forecast 90 days
+    else:
+        # --- WEEKLY DATA ---
+        print("Data appears to be WEEKLY. Using weekly model.")
+        FREQ = 'W'
+        SEQUENCE_LENGTH = 12 # Look back 12 weeks
+        FORECAST_STEPS = 12  # Forecast 12 weeks
+
+    # Resample based on the detected frequency
+    df = df[['score']].resample(FREQ).mean()
+    df['score'] = df['score'].interpolate(method='time')
+    return df, FREQ, SEQUENCE_LENGTH, FORECAST_STEPS
+
+
+def _history_fingerprint(df):
+    """Hash of the resampled series; equal fingerprints give equal forecasts."""
+    h = hashlib.sha1()
+    h.update(df.index.asi8.tobytes())
+    h.update(np.ascontiguousarray(df['score'].to_numpy(dtype='float64')).tobytes())
+    return h.hexdigest()
+
+
+def _model_arch(mode):
+    """recursive and rollout share the one-step model; direct has its own."""
+    return 'direct' if mode == 'direct' else 'one_step'
+
+
+def _model_path(key):
+    keyword, source, freq, arch = key
+    slug = re.sub(r'[^a-z0-9]+', '_', f"{keyword}__{source}".lower()).strip('_') or 'series'
+    # slugs collide ("C++" / "C#"), so the exact keyword and source are hashed in too
+    digest = hashlib.sha1(f"{keyword}\x1f{source}".encode('utf-8')).hexdigest()[:8]
+    return os.path.join(FORECAST_MODEL_DIR, f"{slug}_{digest}__{freq}__{arch}")
+
+
+def _key_lock(key):
+    with _registry_lock:
+        return _key_locks.setdefault(key, threading.Lock())
+
+
+def load_forecast_model(key, with_model=True):
     """
-    Creates time-series sequences from the data.
+    Returns the LSTM registry entry for `key` = (keyword, source, freq, arch), or None.
+    Entry: {model, scaler, sigma, fingerprint, forecast, n_points, trained_at, version, engine}.
+    With `with_model=False` only the metadata is loaded from disk (no TensorFlow).
     """
-    X, y = [], []
-    for i in range(len(data) - sequence_length):
-        X.append(data[i:(i + sequence_length)])
-        y.append(data[i + sequence_length])
-    return np.array(X), np.array(y)
+    with _registry_lock:
+        entry = _registry.get(key)
+        if entry is not None:
+            _registry.move_to_end(key)
+            return entry
 
-def generate_forecast(historical_data):
+    path = _model_path(key)
+    meta_path = os.path.join(path, 'meta.joblib')
+    model_path = os.path.join(path, 'model.keras')
+    if not (os.path.exists(meta_path) and os.path.exists(model_path)):
+        return None
+    try:
+        entry = joblib.load(meta_path)
+        if with_model:
+            from backend.analytics import lstm_engine
+            entry['model'] = lstm_engine.load_keras_model(model_path)
+    except Exception as e:
+        print(f"⚠️ Could not load forecast model for {key}: {e}")
+        return None
+    _remember(key, entry)
+    return entry
+
+
+def save_forecast_model(key, entry):
+    """
+    Persists the metadata (scaler, fingerprint, forecast) and, when the entry
+    holds the Keras model, its weights. Pool workers save weights themselves.
+    """
+    path = _model_path(key)
+    os.makedirs(path, exist_ok=True)
+    if entry.get('model') is not None:
+        from backend.analytics import lstm_engine
+        lstm_engine.save_keras_model(entry['model'], os.path.join(path, 'model.keras'))
+    meta_path = os.path.join(path, 'meta.joblib')
+    joblib.dump({k: v for k, v in entry.items() if k not in ('model', 'rollout')}, meta_path + '.tmp')
+    os.replace(meta_path + '.tmp', meta_path)
+
+
+def _remember(key, entry):
+    with _registry_lock:
+        _registry[key] = entry
+        _registry.move_to_end(key)
+        while len(_registry) > FORECAST_MEMORY_MODELS:
+            _registry.popitem(last=False)
+
+
+def _lstm_worker(model_dir, df, FREQ, SEQUENCE_LENGTH, FORECAST_STEPS, mode, warm):
+    # Runs in a pool process; importing lstm_engine here keeps TF out of the parent
+    from backend.analytics import lstm_engine
+    return lstm_engine.fit_forecast_at_path(model_dir, df, FREQ, SEQUENCE_LENGTH, FORECAST_STEPS, mode, warm)
+
+
+def _get_lstm_pool():
+    global _lstm_pool
+    if _lstm_pool is None:
+        with _lstm_pool_lock:
+            if _lstm_pool is None:
+                # spawn: forked children would inherit the parent's threads and
+                # DB pool, and TensorFlow is not fork-safe
+                _lstm_pool = ProcessPoolExecutor(max_workers=FORECAST_LSTM_WORKERS,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+    return _lstm_pool
+
+
+def get_registry_stats():
+    with _registry_lock:
+        return {'models_in_memory': len(_registry), 'max_models_in_memory': FORECAST_MEMORY_MODELS,
+                'model_dir': FORECAST_MODEL_DIR, 'lstm_workers': FORECAST_LSTM_WORKERS,
+                'tensorflow_loaded': 'tensorflow' in sys.modules}
+
+
+def _format_forecast(yhat, yhat_lower, yhat_upper, last_date, FREQ, FORECAST_STEPS):
+    # Create a new date range based on the detected frequency
+    if FREQ == 'D':
+        forecast_dates = pd.date_range(start=last_date + pd.Timedelta(days=1), periods=FORECAST_STEPS, freq='D')
+    else:
+        forecast_dates = pd.date_range(start=last_date + pd.Timedelta(weeks=1), periods=FORECAST_STEPS, freq='W')
+
+    forecast_df = pd.DataFrame({
+        'ds': forecast_dates,
+        'yhat': np.asarray(yhat, dtype=float).flatten(),
+        'yhat_lower': np.asarray(yhat_lower, dtype=float).flatten(),
+        'yhat_upper': np.asarray(yhat_upper, dtype=float).flatten()
+    })
+
+    # Convert timestamps to ISO strings so they are JSON serializable
+    forecast_df['ds'] = forecast_df['ds'].dt.strftime('%Y-%m-%d')
+
+    # Return a JSON-friendly structure (list of records). The API layer can `jsonify` this directly.
+    return forecast_df.to_dict(orient='records')
+
+
+class Forecaster:
+    """
+    Forecasting engine interface used by `generate_forecast`.
+
+    `fit_forecast(df, FREQ, SEQUENCE_LENGTH, FORECAST_STEPS, entry, mode, key)`
+    returns (yhat, yhat_lower, yhat_upper, state) for the FORECAST_STEPS
+    points after `df`. `entry` is the cached registry entry from the previous
+    run for this series (or None), `key` its registry key (None when the
+    series is not cached) and `state` is what to keep for the next run.
+    """
+    name = None
+
+    def resolve_mode(self, df, SEQUENCE_LENGTH, FORECAST_STEPS, mode):
+        return mode
+
+    def arch(self, mode):
+        """Registry key component; runs with the same arch share cached state."""
+        return self.name
+
+    def load(self, key):
+        with _registry_lock:
+            return _registry.get(key)
+
+    def save(self, key, entry):
+        pass
+
+    def fit_forecast(self, df, FREQ, SEQUENCE_LENGTH, FORECAST_STEPS, entry=None, mode=None, key=None):
+        raise NotImplementedError
+
+
+class ExponentialSmoothingForecaster(Forecaster):
+    """
+    Damped additive-trend ETS with additive weekly (daily data) or yearly
+    (weekly data) seasonality when there are two full seasons of history.
+    Fits in well under a second and gives analytic prediction intervals.
+    """
+    name = 'ets'
+
+    @staticmethod
+    def _fit(y, seasonal, period):
+        model = ETSModel(y, error='add', trend='add', damped_trend=True,
+                         seasonal=seasonal, seasonal_periods=period if seasonal else None)
+        return model.fit(disp=False)
+
+    def fit_forecast(self, df, FREQ, SEQUENCE_LENGTH, FORECAST_STEPS, entry=None, mode=None, key=None):
+        # ETSModel needs the dated series (with its resampled freq) to predict
+        # out of sample; a bare array has no index to extend
+        y = df['score'].astype(float)
+        period = SEASONAL_PERIODS.get(FREQ)
+        seasonal = 'add' if period and len(y) >= 2 * period else None
+        print(f"--- Fitting exponential smoothing model ({FREQ}, seasonal={seasonal and period})... ---")
+        try:
+            res = self._fit(y, seasonal, period)
+        except Exception as e:
+            if seasonal is None:
+                raise
+            print(f"FORECASTING_WARNING: Seasonal ETS fit failed ({e}), retrying without seasonality.")
+            res = self._fit(y, None, None)
+
+        frame = res.get_prediction(start=len(y), end=len(y) + FORECAST_STEPS - 1).summary_frame(
+            alpha=1 - FORECAST_INTERVAL)
+        return frame['mean'].to_numpy(), frame['pi_lower'].to_numpy(), frame['pi_upper'].to_numpy(), {}
+
+
+class LSTMForecaster(Forecaster):
+    """
+    Two-layer Keras LSTM (see lstm_engine). Weights and scaler are persisted
+    and warm-started; runs in the FORECAST_LSTM_WORKERS process pool when set.
+    """
+    name = 'lstm'
+
+    def resolve_mode(self, df, SEQUENCE_LENGTH, FORECAST_STEPS, mode):
+        if mode == 'direct' and len(df) < SEQUENCE_LENGTH + FORECAST_STEPS:
+            # direct targets need a full horizon after every window
+            print(f"FORECASTING_WARNING: Not enough points for a direct {FORECAST_STEPS}-step model, using rollout.")
+            return 'rollout'
+        return mode
+
+    def arch(self, mode):
+        return _model_arch(mode)
+
+    def load(self, key):
+        return load_forecast_model(key, with_model=FORECAST_LSTM_WORKERS == 0)
+
+    def save(self, key, entry):
+        save_forecast_model(key, entry)
+
+    def fit_forecast(self, df, FREQ, SEQUENCE_LENGTH, FORECAST_STEPS, entry=None, mode='recursive', key=None):
+        if FORECAST_LSTM_WORKERS > 0:
+            # Train in the LSTM process pool; the worker warm-starts from and
+            # saves the weights on disk, so only the scaler/sigma come back
+            future = _get_lstm_pool().submit(
+                _lstm_worker, _model_path(key) if key else None, df, FREQ,
+                SEQUENCE_LENGTH, FORECAST_STEPS, mode, entry is not None)
+            return future.result(timeout=FORECAST_LSTM_TIMEOUT)
+
+        from backend.analytics import lstm_engine
+        return lstm_engine.fit_forecast(df, FREQ, SEQUENCE_LENGTH, FORECAST_STEPS, entry=entry, mode=mode)
+
+
+ENGINES = {}
+
+
+def register_engine(forecaster):
+    """Adds (or replaces) a Forecaster selectable by its `name`."""
+    ENGINES[forecaster.name] = forecaster
+
+
+register_engine(ExponentialSmoothingForecaster())
+register_engine(LSTMForecaster())
+
+
+def select_engine(df, FREQ, engine=None):
+    """
+    Engine name for this series: `engine` or FORECAST_ENGINE when set to a
+    registered engine, otherwise chosen by series length and frequency.
+    """
+    engine = engine or FORECAST_ENGINE
+    if engine in ENGINES:
+        return engine
+    min_points = FORECAST_LSTM_MIN_POINTS.get(FREQ)
+    return 'lstm' if min_points and len(df) >= min_points else 'ets'
+
+
+def generate_forecast(historical_data, keyword=None, source='google_trends', mode=None, engine=None):
+    """
+    Returns forecast records ({ds, yhat, yhat_lower, yhat_upper}) or None.
+    See `forecast_with_info`.
+    """
+    return forecast_with_info(historical_data, keyword=keyword, source=source, mode=mode, engine=engine)[0]
+
+
+def forecast_with_info(historical_data, keyword=None, source='google_trends', mode=None, engine=None):
     """
     Takes historical trend data (daily OR weekly), auto-detects the frequency,
-    trains a TensorFlow/Keras LSTM model, and returns a forecast.
+    fits a forecasting engine (see `select_engine`) and returns a forecast with
+    FORECAST_INTERVAL prediction intervals.
+
+    When `keyword` is given the fitted state is kept in the registry under
+    (keyword, source, frequency, model): repeat calls with the same history
+    return the cached forecast, and a changed history fine-tunes saved LSTM
+    weights.
+
+    `mode` picks how the LSTM produces its multi-step forecast (see
+    FORECAST_MODES); defaults to FORECAST_MODE.
+
+    Returns (records, info) with info = {'engine', 'model_version'}, or
+    (None, None) when no forecast could be made.
     """
-    
+    mode = mode or FORECAST_MODE
+    if mode not in FORECAST_MODES:
+        print(f"FORECASTING_WARNING: Unknown forecast mode '{mode}', using '{FORECAST_MODE}'.")
+        mode = FORECAST_MODE
+
     # 1. --- Data Preparation ---
     if not historical_data or len(historical_data) < 30: # Need at least 30 data points
-        print("FORECASTING_WARNING: Not enough historical data for a reliable TensorFlow forecast.")
-        return None
+        print("FORECASTING_WARNING: Not enough historical data for a reliable forecast.")
+        return None, None
 
     try:
-        df = pd.DataFrame(historical_data)
-        df['date'] = pd.to_datetime(df['date'])
-
-        if df.duplicated(subset=['date']).any():
-            print("DUPLICATE_DATES_FOUND: Consolidating duplicate date entries.")
-            df = df.groupby('date')['score'].mean().reset_index()
-            
-        df.set_index('date', inplace=True)
-        
-        # --- NEW: Auto-detect Frequency ---
-        # Get the time difference between the first two data points
-        time_diff = (df.index[1] - df.index[0]).days
-        
-        if time_diff < 3:
-            # --- DAILY DATA ---
-            print("Data appears to be DAILY. Using daily model.")
-            FREQ = 'D'
-            SEQUENCE_LENGTH = 30 # Look back 30 days
-            FORECAST_STEPS = 90  # Forecast 90 days
-            FORECAST_FREQ = 'D'
-        else:
-            # --- WEEKLY DATA ---
-            print("Data appears to be WEEKLY. Using weekly model.")
-            FREQ = 'W'
-            SEQUENCE_LENGTH = 12 # Look back 12 weeks
-            FORECAST_STEPS = 12  # Forecast 12 weeks
-            FORECAST_FREQ = 'W'
-        # --- END NEW ---
-
-        # Resample based on the detected frequency
-        df = df.resample(FREQ).mean()
-        df['score'].interpolate(method='time', inplace=True)
-        
-        # 2. --- Data Scaling ---
-        scaler = MinMaxScaler(feature_range=(0, 1))
-        scaled_data = scaler.fit_transform(df[['score']])
-
-        # 3. --- Create Sequences ---
-        if len(scaled_data) < SEQUENCE_LENGTH + 1:
-             print(f"FORECASTING_WARNING: Not enough {FREQ} data points to create a sequence.")
-             return None
-
-        X, y = create_sequences(scaled_data, SEQUENCE_LENGTH)
-        X = X.reshape(X.shape[0], X.shape[1], 1)
-
-        # 4. --- Build & Train the LSTM Model ---
-        print(f"--- Building and training TensorFlow LSTM model ({FREQ})... ---")
-        model = Sequential()
-        model.add(LSTM(50, return_sequences=True, input_shape=(SEQUENCE_LENGTH, 1)))
-        model.add(LSTM(50, return_sequences=False))
-        model.add(Dense(25))
-        model.add(Dense(1))
-
-        model.compile(optimizer='adam', loss='mean_squared_error')
-        
-        # Use a larger batch_size for faster training
-        model.fit(X, y, batch_size=16, epochs=5, verbose=0)
-        print("✅ TensorFlow model training complete.")
-
-        # 5. --- Generate Forecast ---
-        forecast_input = scaled_data[-SEQUENCE_LENGTH:].tolist()
-        forecast_scaled = []
-
-        for _ in range(FORECAST_STEPS):
-            current_input = np.array(forecast_input[-SEQUENCE_LENGTH:])
-            current_input = current_input.reshape((1, SEQUENCE_LENGTH, 1))
-            
-            predicted_value = model.predict(current_input, verbose=0)[0][0]
-            
-            forecast_scaled.append(predicted_value)
-            forecast_input.append([predicted_value])
-
-        # 6. --- Inverse Scale & Format ---
-        forecast_values = scaler.inverse_transform(np.array(forecast_scaled).reshape(-1, 1))
-        
-        last_date = df.index[-1]
-        
-        # Create a new date range based on the detected frequency
-        if FREQ == 'D':
-            forecast_dates = pd.date_range(start=last_date + pd.Timedelta(days=1), periods=FORECAST_STEPS, freq='D')
-        else:
-            forecast_dates = pd.date_range(start=last_date + pd.Timedelta(weeks=1), periods=FORECAST_STEPS, freq='W')
-        
-        forecast_df = pd.DataFrame({
-            'ds': forecast_dates,
-            'yhat': forecast_values.flatten(),
-            'yhat_lower': forecast_values.flatten(),
-            'yhat_upper': forecast_values.flatten() 
-        })
-
-        # Convert timestamps to ISO strings so they are JSON serializable
-        forecast_df['ds'] = forecast_df['ds'].dt.strftime('%Y-%m-%d')
-
-        print(f"✅ TensorFlow forecast generated successfully for the next {FORECAST_STEPS} {FREQ}.")
-
-        # Return a JSON-friendly structure (list of records). The API layer can `jsonify` this directly.
-        return forecast_df.to_dict(orient='records')
+        df, FREQ, SEQUENCE_LENGTH, FORECAST_STEPS = _prepare_series(historical_data)
+
+        forecaster = ENGINES[select_engine(df, FREQ, engine)]
+        mode = forecaster.resolve_mode(df, SEQUENCE_LENGTH, FORECAST_STEPS, mode)
+        key = (keyword, source, FREQ, forecaster.arch(mode)) if keyword else None
+        if key is None:
+            yhat, lower, upper, _ = forecaster.fit_forecast(df, FREQ, SEQUENCE_LENGTH, FORECAST_STEPS, mode=mode)
+            return (_format_forecast(yhat, lower, upper, df.index[-1], FREQ, FORECAST_STEPS),
+                    {'engine': forecaster.name, 'model_version': None})
+
+        # One fit per series at a time; concurrent requests for the same
+        # series wait and then hit the cache
+        with _key_lock(key):
+            fingerprint = _history_fingerprint(df)
+            entry = forecaster.load(key)
+            if entry is not None and entry['fingerprint'] == fingerprint:
+                print(f"✅ Serving cached forecast for {key} (v{entry['version']}).")
+                return entry['forecast'], {'engine': forecaster.name, 'model_version': entry['version']}
+
+            yhat, lower, upper, state = forecaster.fit_forecast(
+                df, FREQ, SEQUENCE_LENGTH, FORECAST_STEPS, entry=entry, mode=mode, key=key)
+            forecast = _format_forecast(yhat, lower, upper, df.index[-1], FREQ, FORECAST_STEPS)
+            print(f"✅ {forecaster.name} forecast generated for the next {FORECAST_STEPS} {FREQ} (mode={mode}).")
+
+            new_entry = dict(state)
+            new_entry.update({
+                'engine': forecaster.name,
+                'fingerprint': fingerprint,
+                'forecast': forecast,
+                'n_points': len(df),
+                'trained_at': datetime.now().isoformat(timespec='seconds'),
+                'version': (entry['version'] + 1) if entry else 1,
+            })
+            _remember(key, new_entry)
+            try:
+                forecaster.save(key, new_entry)
+            except Exception as e:
+                print(f"⚠️ Could not save forecast model for {key}: {e}")
+            return forecast, {'engine': forecaster.name, 'model_version': new_entry['version']}
 
     except Exception as e:
-        print(f"❌ FORECASTING_ERROR: An error occurred during TensorFlow forecasting: {e}")
-        return None
\ No newline at end of file
+        print(f"❌ FORECASTING_ERROR: An error occurred during forecasting: {e}")
+        return None, None
@@ -0,0 +1,161 @@
+"""Global multi-series forecasting.
+
+Instead of one LSTM per (keyword) and per (keyword, country), trains a single
+direct multi-horizon LSTM per frequency over every tracked Google Trends and
+geo_metrics series. Each series is min-max scaled on its own and identified
+to the model by a learned series-id embedding (see
+`lstm_engine.build_global_model`). Forecasts for all series come from one
+batched predict and are written to the `forecasts` table with their input
+watermarks, so `forecast_store` only recomputes series that change later.
+
+Series shorter than lookback + horizon cannot give a training target and
+are skipped; `generate_forecast` still handles those on request.
+
+Usage:
+    python backend/scripts/run_global_forecast.py
+    python backend/scripts/run_global_forecast.py --keywords iphone "taylor swift" --no-geo
+"""
+import logging
+import os
+import sys
+from datetime import datetime
+
+import joblib
+import numpy as np
+from scipy.stats import norm
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from database import db
+from backend.analytics.forecasting import (
+    FORECAST_INTERVAL, FORECAST_MODEL_DIR, _format_forecast, _prepare_series,
+)
+from backend.analytics.forecast_store import geo_scope, input_watermarks, store_forecasts
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_FORECAST_EPOCHS = int(os.environ.get('GLOBAL_FORECAST_EPOCHS', 10))
+GLOBAL_FORECAST_BATCH_SIZE = int(os.environ.get('GLOBAL_FORECAST_BATCH_SIZE', 64))
+GLOBAL_ENGINE = 'lstm_global'
+
+
+def load_tracked_series(keywords=None, include_geo=True):
+    """
+    Returns ({(keyword, scope): history rows}, {(keyword, scope): watermark})
+    for every Google Trends series (scope 'trends', rows {date, score}) and,
+    with `include_geo`, every per-country geo_metrics series (scope
+    'geo:<country>', rows {date, y}).
+    """
+    conn = db.get_db_connection()
+    if conn is None:
+        return {}, {}
+    cursor = conn.cursor(dictionary=True)
+    series = {}
+    try:
+        # read before the history so late points leave the forecasts stale, not fresh
+        watermarks = input_watermarks(cursor, keywords, include_geo=include_geo)
+        kw_filter, params = '', ()
+        if keywords:
+            kw_filter = " AND keyword IN (" + ", ".join(["%s"] * len(keywords)) + ")"
+            params = tuple(keywords)
+
+        cursor.execute("SELECT keyword, post_time AS date, score FROM raw_data "
+                       "WHERE platform = 'Google Trends'" + kw_filter + " ORDER BY keyword, post_time", params)
+        for r in cursor.fetchall():
+            series.setdefault((r['keyword'], 'trends'), []).append({'date': r['date'], 'score': r['score']})
+
+        if include_geo:
+            cursor.execute("SELECT keyword, country, `date` AS date, metric AS y FROM geo_metrics "
+                           "WHERE country IS NOT NULL AND `date` IS NOT NULL" + kw_filter +
+                           " ORDER BY keyword, country, `date`", params)
+            for r in cursor.fetchall():
+                series.setdefault((r['keyword'], geo_scope(r['country'])), []).append({'date': r['date'], 'y': r['y']})
+        return series, watermarks
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _save_global_model(FREQ, model, meta):
+    """Saves the group's model as the next version and returns that version."""
+    from backend.analytics import lstm_engine
+    path = os.path.join(FORECAST_MODEL_DIR, f"_global__{FREQ}")
+    os.makedirs(path, exist_ok=True)
+    meta_path = os.path.join(path, 'meta.joblib')
+    version = 1
+    if os.path.exists(meta_path):
+        try:
+            version = joblib.load(meta_path)['version'] + 1
+        except Exception:
+            pass
+    lstm_engine.save_keras_model(model, os.path.join(path, 'model.keras'))
+    joblib.dump(dict(meta, version=version), meta_path + '.tmp')
+    os.replace(meta_path + '.tmp', meta_path)
+    return version
+
+
+def run_global_forecast(keywords=None, include_geo=True, epochs=None):
+    """
+    Trains the global model(s) and stores forecasts for every eligible series.
+    Returns {'success', 'series_forecast', 'skipped', 'groups', 'rows_written'}.
+    """
+    epochs = epochs or GLOBAL_FORECAST_EPOCHS
+    series, watermarks = load_tracked_series(keywords, include_geo=include_geo)
+    if not series:
+        return {'success': False, 'reason': 'no_series'}
+
+    # group series that share frequency, lookback and horizon
+    groups, skipped = {}, {}
+    for key, history in series.items():
+        if len(history) < 30:
+            skipped[key] = 'not_enough_history'
+            continue
+        try:
+            df, FREQ, SEQUENCE_LENGTH, FORECAST_STEPS = _prepare_series(history)
+        except Exception as e:
+            skipped[key] = f'bad_history: {e}'
+            continue
+        if df['score'].isna().any() or len(df) < SEQUENCE_LENGTH + FORECAST_STEPS:
+            skipped[key] = 'too_short_for_horizon'
+            continue
+        groups.setdefault((FREQ, SEQUENCE_LENGTH, FORECAST_STEPS), []).append((key, df))
+
+    from backend.analytics import lstm_engine
+
+    z = norm.ppf(0.5 + FORECAST_INTERVAL / 2)
+    items, group_summary = [], {}
+    for (FREQ, SEQUENCE_LENGTH, FORECAST_STEPS), members in groups.items():
+        values = [df['score'].to_numpy(dtype=float) for _, df in members]
+        lows = np.array([v.min() for v in values])
+        ranges = np.array([v.max() for v in values]) - lows
+        ranges[ranges == 0] = 1.0
+        scaled = [(v - lo) / rng for v, lo, rng in zip(values, lows, ranges)]
+
+        print(f"--- Training global {FREQ} model over {len(members)} series... ---")
+        started = datetime.now()
+        model, yhat_scaled, sigma_scaled = lstm_engine.fit_global_forecast(
+            scaled, SEQUENCE_LENGTH, FORECAST_STEPS, epochs, batch_size=GLOBAL_FORECAST_BATCH_SIZE)
+
+        version = None
+        try:
+            version = _save_global_model(FREQ, model, {
+                'series': [key for key, _ in members], 'lows': lows, 'ranges': ranges,
+                'sequence_length': SEQUENCE_LENGTH, 'forecast_steps': FORECAST_STEPS,
+                'trained_at': datetime.now().isoformat(timespec='seconds'),
+            })
+        except Exception as e:
+            logger.warning('Could not save global %s forecast model: %s', FREQ, e)
+
+        yhat = yhat_scaled * ranges[:, None] + lows[:, None]
+        half_width = z * sigma_scaled * ranges[:, None]
+        for i, ((keyword, scope), df) in enumerate(members):
+            records = _format_forecast(yhat[i], yhat[i] - half_width[i], yhat[i] + half_width[i],
+                                       df.index[-1], FREQ, FORECAST_STEPS)
+            items.append((keyword, scope, records, GLOBAL_ENGINE, version or 0, watermarks.get((keyword, scope))))
+
+        group_summary[FREQ] = {'series': len(members), 'model_version': version,
+                               'train_seconds': round((datetime.now() - started).total_seconds(), 1)}
+        print(f"✅ Global {FREQ} forecast done for {len(members)} series.")
+
+    rows_written = store_forecasts(items) if items else 0
+    return {'success': bool(items), 'series_forecast': len(items), 'rows_written': rows_written,
+            'groups': group_summary, 'skipped': {f"{k}|{s}": reason for (k, s), reason in skipped.items()}}
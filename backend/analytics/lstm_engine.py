@@ -0,0 +1,256 @@
+"""Keras LSTM forecasting engine.
+
+Imported lazily by `forecasting.LSTMForecaster`, so TensorFlow is only loaded
+by processes that actually train or run an LSTM. With FORECAST_LSTM_WORKERS > 0
+those are the spawned pool processes running `fit_forecast_at_path`, and the
+Flask workers never import this module.
+"""
+import copy
+import math
+import os
+import numpy as np
+import joblib
+from scipy.stats import norm
+from sklearn.preprocessing import MinMaxScaler
+
+# Suppress TensorFlow warnings
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+import tensorflow as tf
+from tensorflow.keras.models import Model, Sequential, load_model
+from tensorflow.keras.layers import LSTM, Concatenate, Dense, Embedding, Input
+from tensorflow.keras.utils import PyDataset
+
+from backend.analytics.forecasting import (
+    create_sequences, latest_window, FORECAST_TRAIN_EPOCHS, FORECAST_WARM_EPOCHS, FORECAST_INTERVAL,
+)
+
+
+class WindowBatches(PyDataset):
+    """
+    Feeds (X, y) windows from `create_sequences` to Keras one batch at a time,
+    so only a batch of windows is ever materialised. Shuffles per epoch like
+    `model.fit` does for in-memory arrays.
+
+    `index` restricts batches to those window positions; with `ids` (one
+    series id per entry of `index`) inputs are {'window', 'series'} dicts for
+    `build_global_model`.
+    """
+    def __init__(self, X, y, batch_size, shuffle=True, index=None, ids=None, **kwargs):
+        super().__init__(**kwargs)
+        self.X, self.y = X, y
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.index = np.arange(len(X)) if index is None else np.asarray(index)
+        self.ids = ids
+        self.order = np.arange(len(self.index))
+        self.on_epoch_end()
+
+    def __len__(self):
+        return math.ceil(len(self.index) / self.batch_size)
+
+    def __getitem__(self, idx):
+        sel = np.sort(self.order[idx * self.batch_size:(idx + 1) * self.batch_size])
+        rows = self.index[sel]
+        x = self.X[rows].astype('float32')
+        if self.ids is not None:
+            x = {'window': x, 'series': self.ids[sel].astype('int32')}
+        return x, self.y[rows].astype('float32')
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            np.random.shuffle(self.order)
+
+
+def build_model(sequence_length, outputs=1):
+    model = Sequential()
+    model.add(LSTM(50, return_sequences=True, input_shape=(sequence_length, 1)))
+    model.add(LSTM(50, return_sequences=False))
+    model.add(Dense(25))
+    model.add(Dense(outputs))
+    model.compile(optimizer='adam', loss='mean_squared_error')
+    return model
+
+
+def build_global_model(sequence_length, n_series, outputs, embedding_dim=8):
+    """
+    Same LSTM stack as `build_model`, with a learned embedding of the series
+    id joined to the LSTM state so one model can serve many series.
+    """
+    window = Input(shape=(sequence_length, 1), name='window')
+    series = Input(shape=(), dtype='int32', name='series')
+    h = LSTM(50, return_sequences=True)(window)
+    h = LSTM(50, return_sequences=False)(h)
+    h = Concatenate()([h, Embedding(n_series, embedding_dim)(series)])
+    h = Dense(25)(h)
+    model = Model(inputs=[window, series], outputs=Dense(outputs)(h))
+    model.compile(optimizer='adam', loss='mean_squared_error')
+    return model
+
+
+def compile_rollout(model, sequence_length, steps):
+    """
+    Builds a tf.function that feeds each one-step prediction back into the
+    window for `steps` steps inside one graph, instead of `steps` predict calls.
+    """
+    @tf.function(input_signature=[tf.TensorSpec((1, sequence_length, 1), tf.float32)])
+    def rollout(window):
+        outputs = tf.TensorArray(tf.float32, size=steps)
+        for i in tf.range(steps):
+            pred = model(window, training=False)
+            outputs = outputs.write(i, pred[0, 0])
+            window = tf.concat([window[:, 1:, :], tf.reshape(pred, (1, 1, 1))], axis=1)
+        return outputs.stack()
+    return rollout
+
+
+def predict_horizon(model, scaled_data, SEQUENCE_LENGTH, FORECAST_STEPS, mode='recursive', rollout=None):
+    """
+    Scaled forecast for the FORECAST_STEPS points after `scaled_data`.
+    `rollout` may pass a compiled rollout from `compile_rollout` to reuse.
+    """
+    window = latest_window(scaled_data, SEQUENCE_LENGTH).astype('float32')
+    if mode == 'direct':
+        return np.asarray(model(window, training=False))[0][:FORECAST_STEPS]
+
+    if mode == 'rollout':
+        rollout = rollout or compile_rollout(model, SEQUENCE_LENGTH, FORECAST_STEPS)
+        return rollout(tf.constant(window)).numpy()
+
+    forecast_input = window[0].tolist()
+    forecast_scaled = []
+
+    for _ in range(FORECAST_STEPS):
+        current_input = latest_window(forecast_input, SEQUENCE_LENGTH)
+
+        predicted_value = model.predict(current_input, verbose=0)[0][0]
+
+        forecast_scaled.append(predicted_value)
+        forecast_input.append([predicted_value])
+    return np.array(forecast_scaled)
+
+
+def load_keras_model(path):
+    return load_model(path)
+
+
+def save_keras_model(model, path):
+    model.save(path + '.tmp.keras')
+    os.replace(path + '.tmp.keras', path)
+
+
+def fit_forecast(df, FREQ, SEQUENCE_LENGTH, FORECAST_STEPS, entry=None, mode='recursive'):
+    """
+    Trains (or warm-starts `entry['model']`) and forecasts. Returns
+    (yhat, yhat_lower, yhat_upper, state) as described on forecasting.Forecaster.
+
+    Intervals come from the in-sample residual spread: per horizon for the
+    direct model, growing with sqrt(h) for the one-step model.
+    """
+    # 2. --- Data Scaling ---
+    # A warm start keeps the saved scaler (widened to any new extremes) so the
+    # previous weights still see inputs on the scale they were trained on
+    if entry is not None:
+        scaler = copy.deepcopy(entry['scaler'])
+        scaler.partial_fit(df[['score']])
+    else:
+        scaler = MinMaxScaler(feature_range=(0, 1))
+        scaler.fit(df[['score']])
+    scaled_data = scaler.transform(df[['score']])
+
+    # 3. --- Create Sequences ---
+    if len(scaled_data) < SEQUENCE_LENGTH + 1:
+        raise ValueError(f"Not enough {FREQ} data points to create a sequence.")
+
+    horizon = FORECAST_STEPS if mode == 'direct' else 1
+    X, y = create_sequences(scaled_data, SEQUENCE_LENGTH, horizon=horizon)
+
+    # 4. --- Build & Train the LSTM Model ---
+    if entry is not None:
+        print(f"--- Warm-starting TensorFlow LSTM model ({FREQ}) from v{entry['version']}... ---")
+        model = entry['model']
+        epochs = FORECAST_WARM_EPOCHS
+    else:
+        print(f"--- Building and training TensorFlow LSTM model ({FREQ})... ---")
+        model = build_model(SEQUENCE_LENGTH, outputs=horizon)
+        epochs = FORECAST_TRAIN_EPOCHS
+
+    # Batches are cut from the strided windows on demand
+    model.fit(WindowBatches(X, y, batch_size=16), epochs=epochs, verbose=0)
+    print("✅ TensorFlow model training complete.")
+
+    # In-sample residual spread (scaled units) for the prediction intervals
+    fitted = model.predict(WindowBatches(X, y, batch_size=256, shuffle=False), verbose=0)
+    resid = y - fitted.reshape(len(y), -1)
+    if mode == 'direct':
+        sigma = resid.std(axis=0)[:FORECAST_STEPS]
+    else:
+        sigma = resid.std() * np.sqrt(np.arange(1, FORECAST_STEPS + 1))
+
+    # 5. --- Generate Forecast ---
+    # The compiled rollout is tied to the model object, so it is kept with the
+    # in-memory entry and only rebuilt when the model is
+    rollout = entry.get('rollout') if (entry is not None and mode == 'rollout') else None
+    if mode == 'rollout' and rollout is None:
+        rollout = compile_rollout(model, SEQUENCE_LENGTH, FORECAST_STEPS)
+    forecast_scaled = predict_horizon(model, scaled_data, SEQUENCE_LENGTH, FORECAST_STEPS,
+                                      mode=mode, rollout=rollout)
+
+    # 6. --- Inverse Scale ---
+    yhat = scaler.inverse_transform(np.array(forecast_scaled).reshape(-1, 1)).flatten()
+    half_width = norm.ppf(0.5 + FORECAST_INTERVAL / 2) * sigma * scaler.data_range_[0]
+    state = {'model': model, 'scaler': scaler, 'sigma': sigma, 'rollout': rollout}
+    return yhat, yhat - half_width, yhat + half_width, state
+
+
+def fit_forecast_at_path(model_dir, df, FREQ, SEQUENCE_LENGTH, FORECAST_STEPS, mode, warm):
+    """
+    Process-pool entry point. Warm-starts from the weights and scaler saved in
+    `model_dir` when `warm`, writes the updated weights back, and returns the
+    forecast with a picklable state (no Keras objects).
+    """
+    entry = None
+    if model_dir and warm:
+        meta_path = os.path.join(model_dir, 'meta.joblib')
+        model_path = os.path.join(model_dir, 'model.keras')
+        if os.path.exists(meta_path) and os.path.exists(model_path):
+            entry = joblib.load(meta_path)
+            entry['model'] = load_keras_model(model_path)
+
+    yhat, lower, upper, state = fit_forecast(df, FREQ, SEQUENCE_LENGTH, FORECAST_STEPS, entry=entry, mode=mode)
+    if model_dir:
+        os.makedirs(model_dir, exist_ok=True)
+        save_keras_model(state['model'], os.path.join(model_dir, 'model.keras'))
+    return yhat, lower, upper, {'scaler': state['scaler'], 'sigma': state['sigma']}
+
+
+def fit_global_forecast(scaled_series, SEQUENCE_LENGTH, FORECAST_STEPS, epochs, batch_size=64):
+    """
+    Trains one direct multi-horizon model over every series in `scaled_series`
+    (1-D arrays already scaled to [0, 1], each at least SEQUENCE_LENGTH +
+    FORECAST_STEPS long) and forecasts all of them in one batched predict.
+
+    Returns (model, yhat, sigma): scaled forecasts and in-sample residual
+    spread per horizon, both of shape (n_series, FORECAST_STEPS).
+    """
+    lengths = np.array([len(v) for v in scaled_series])
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    n_windows = lengths - SEQUENCE_LENGTH - FORECAST_STEPS + 1
+
+    # Window the concatenated series once and only use windows that stay
+    # inside a single series
+    concat = np.concatenate(scaled_series).astype('float32')
+    X, y = create_sequences(concat, SEQUENCE_LENGTH, horizon=FORECAST_STEPS)
+    index = np.concatenate([np.arange(o, o + n) for o, n in zip(offsets, n_windows)])
+    ids = np.repeat(np.arange(len(scaled_series)), n_windows)
+
+    model = build_global_model(SEQUENCE_LENGTH, len(scaled_series), FORECAST_STEPS)
+    model.fit(WindowBatches(X, y, batch_size=batch_size, index=index, ids=ids), epochs=epochs, verbose=0)
+
+    fitted = model.predict(WindowBatches(X, y, batch_size=512, shuffle=False, index=index, ids=ids), verbose=0)
+    resid = y[index] - fitted
+    sigma = np.vstack([r.std(axis=0) for r in np.split(resid, np.cumsum(n_windows)[:-1])])
+
+    windows = np.concatenate([latest_window(v, SEQUENCE_LENGTH) for v in scaled_series]).astype('float32')
+    yhat = model.predict({'window': windows, 'series': np.arange(len(scaled_series), dtype='int32')},
+                         batch_size=512, verbose=0)
+    return model, yhat, sigma
@@ -4,20 +4,75 @@ Performs TF-IDF + NMF topic modeling over recent posts for a keyword,
 inserts/upserts discovered topics into `topics` table, and writes
 per-post sentiment (VADER) and assigned topic into `post_enrichment`.
 
+The fitted vectorizer and NMF model are saved per keyword (versioned, see
+`save_topic_model`). Later runs score posts with `transform` only and refit
+when the keyword's corpus has grown by TOPIC_REFIT_GROWTH or the share of
+out-of-vocabulary tokens has drifted by TOPIC_REFIT_OOV_DRIFT since the fit.
+
+`run_streaming_pipeline` handles corpora too large for one TF-IDF matrix: it
+reads posts in chunks from a server-side cursor, hashes them into a fixed
+feature space and fits MiniBatchNMF with `partial_fit`, so peak memory depends
+on TOPIC_STREAM_CHUNK_SIZE and TOPIC_STREAM_FEATURES, not on corpus size.
+
 Usage:
     python backend/scripts/run_nlp_pipeline.py --keyword iphone --n_topics 8 --limit 500
+    python backend/scripts/run_nlp_pipeline.py --keyword iphone --n_topics 8 --stream
 """
+import hashlib
 import logging
+import re
 import sys, os
+from datetime import datetime
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 from database import db
+from backend.processing.nlp_cache import get_nlp_cache
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.decomposition import NMF
-import spacy
+from sklearn.feature_extraction import FeatureHasher
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer
+from sklearn.decomposition import NMF, MiniBatchNMF
+from sklearn.preprocessing import normalize
+import numpy as np
+import scipy.sparse as sp
+import joblib
 
 logger = logging.getLogger(__name__)
 
+TOPIC_UPSERT = ("INSERT INTO topics (keyword, platform, topic_id, topic_label, score) "
+                "VALUES (%s, %s, %s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE topic_label = VALUES(topic_label), score = VALUES(score), created_at = CURRENT_TIMESTAMP")
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+TOPIC_MODEL_DIR = os.environ.get('TOPIC_MODEL_DIR', os.path.join(PROJECT_ROOT, 'models', 'topic_models'))
+TOPIC_MODEL_KEEP_VERSIONS = int(os.environ.get('TOPIC_MODEL_KEEP_VERSIONS', 3))
+# refit when the keyword has this much more data than at fit time (0.5 = +50%)
+TOPIC_REFIT_GROWTH = float(os.environ.get('TOPIC_REFIT_GROWTH', 0.5))
+# refit when the out-of-vocabulary token share rises this much above the fit-time share
+TOPIC_REFIT_OOV_DRIFT = float(os.environ.get('TOPIC_REFIT_OOV_DRIFT', 0.15))
+
+# streaming mode: rows per server-side fetch / NMF minibatch, and hashed feature space size
+TOPIC_STREAM_CHUNK_SIZE = int(os.environ.get('TOPIC_STREAM_CHUNK_SIZE', 2000))
+TOPIC_STREAM_FEATURES = int(os.environ.get('TOPIC_STREAM_FEATURES', 2 ** 18))
+TOPIC_STREAM_EPOCHS = int(os.environ.get('TOPIC_STREAM_EPOCHS', 1))
+
+# The analyzer owns sentiment_compound (scored on the cleaned content and tracked by
+# content_hash); this pipeline only fills it for posts the analyzer has not scored yet
+POST_ENRICHMENT_UPSERT = ("INSERT INTO post_enrichment (platform_post_id, keyword, platform, sentiment_compound, assigned_topic, topic_weight) "
+                          "VALUES (%s, %s, %s, %s, %s, %s) "
+                          "ON DUPLICATE KEY UPDATE sentiment_compound = COALESCE(sentiment_compound, VALUES(sentiment_compound)), assigned_topic = VALUES(assigned_topic), topic_weight = VALUES(topic_weight), created_at = CURRENT_TIMESTAMP")
+
+
+def _row_to_post(r):
+    text = ''
+    if r.get('title'):
+        text += str(r['title']) + '\n'
+    if r.get('content'):
+        text += str(r['content'])
+    return {
+        'platform': r.get('platform'),
+        'platform_post_id': r.get('platform_post_id'),
+        'text': text.strip() or ''
+    }
+
 
 def fetch_posts(keyword, limit=500):
     conn = db.get_db_connection()
@@ -27,54 +82,124 @@ def fetch_posts(keyword, limit=500):
     try:
         query = "SELECT platform, platform_post_id, title, content FROM raw_data WHERE keyword = %s ORDER BY post_time DESC LIMIT %s"
         cursor.execute(query, (keyword, int(limit)))
-        rows = cursor.fetchall()
-        posts = []
-        for r in rows:
-            text = ''
-            if r.get('title'):
-                text += str(r['title']) + '\n'
-            if r.get('content'):
-                text += str(r['content'])
-            posts.append({
-                'platform': r.get('platform'),
-                'platform_post_id': r.get('platform_post_id'),
-                'text': text.strip() or ''
-            })
-        return posts
+        return [_row_to_post(r) for r in cursor.fetchall()]
     finally:
         cursor.close()
         conn.close()
 
 
-def run_pipeline(keyword, limit=500, n_topics=8):
-    # fetch posts
-    posts = fetch_posts(keyword, limit=limit)
-    if not posts:
-        return {'success': False, 'reason': 'no_posts'}
+def iter_post_chunks(keyword, chunk_size=None, limit=None):
+    """
+    Yields lists of up to `chunk_size` posts for `keyword`, newest first.
+
+    Uses an unbuffered (server-side) cursor, so only one chunk of rows is held
+    client-side at a time. The connection is busy until the generator is
+    exhausted or closed; writes must go through other connections.
+    """
+    chunk_size = chunk_size or TOPIC_STREAM_CHUNK_SIZE
+    conn = db.get_db_connection()
+    if conn is None:
+        return
+    cursor = conn.cursor(dictionary=True, buffered=False)
+    try:
+        query = "SELECT platform, platform_post_id, title, content FROM raw_data WHERE keyword = %s ORDER BY post_time DESC"
+        params = (keyword,)
+        if limit:
+            query += " LIMIT %s"
+            params += (int(limit),)
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield [_row_to_post(r) for r in rows]
+    finally:
+        try:
+            # drain unread rows so the connection goes back to the pool clean
+            cursor.fetchall()
+        except Exception:
+            pass
+        cursor.close()
+        conn.close()
 
-    texts = [p['text'] for p in posts]
 
-    # prepare NLP tools
+def count_posts(keyword):
+    """Total raw_data rows for a keyword (used to detect corpus growth)."""
+    conn = db.get_db_connection()
+    if conn is None:
+        return None
+    cursor = conn.cursor()
     try:
-        nlp = spacy.load('en_core_web_sm')
+        cursor.execute("SELECT COUNT(*) FROM raw_data WHERE keyword = %s", (keyword,))
+        return int(cursor.fetchone()[0])
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _model_dir(keyword):
+    # the slug keeps directories readable; the hash of the exact keyword keeps
+    # keywords with the same slug ("C++", "C#", "c") apart
+    slug = re.sub(r'[^a-z0-9]+', '_', keyword.lower()).strip('_') or 'keyword'
+    digest = hashlib.sha1(keyword.encode('utf-8')).hexdigest()[:8]
+    return os.path.join(TOPIC_MODEL_DIR, f"{slug}_{digest}")
+
+
+def load_topic_model(keyword):
+    """Returns the latest saved model bundle for `keyword`, or None."""
+    path = _model_dir(keyword)
+    if not os.path.isdir(path):
+        return None
+    versions = sorted(f for f in os.listdir(path) if re.fullmatch(r'v\d+\.joblib', f))
+    if not versions:
+        return None
+    try:
+        return joblib.load(os.path.join(path, versions[-1]))
     except Exception as e:
-        logger.exception('spaCy model load failed: %s', e)
-        return {'success': False, 'reason': 'spacy_missing', 'error': str(e)}
+        logger.warning('Could not load topic model for %s: %s', keyword, e)
+        return None
 
-    vader = SentimentIntensityAnalyzer()
 
-    # vectorize
-    vectorizer = TfidfVectorizer(max_df=0.95, min_df=2, stop_words='english', max_features=4000)
-    X = vectorizer.fit_transform(texts)
+def save_topic_model(keyword, bundle):
+    """Writes `bundle` as the next version and prunes old versions."""
+    path = _model_dir(keyword)
+    os.makedirs(path, exist_ok=True)
+    final = os.path.join(path, f"v{bundle['version']:05d}.joblib")
+    tmp = final + '.tmp'
+    joblib.dump(bundle, tmp)
+    os.replace(tmp, final)
+    versions = sorted(f for f in os.listdir(path) if re.fullmatch(r'v\d+\.joblib', f))
+    for old in versions[:-TOPIC_MODEL_KEEP_VERSIONS]:
+        os.remove(os.path.join(path, old))
 
-    # NMF
-    nmf = NMF(n_components=n_topics, random_state=1, init='nndsvda', max_iter=400)
-    W = nmf.fit_transform(X)
-    H = nmf.components_
 
-    feature_names = vectorizer.get_feature_names_out()
+def _oov_rate(vectorizer, texts):
+    """Share of analyzed tokens in `texts` that are not in the vectorizer vocabulary."""
+    analyze = vectorizer.build_analyzer()
+    vocab = vectorizer.vocabulary_
+    total = oov = 0
+    for text in texts:
+        tokens = analyze(text)
+        total += len(tokens)
+        oov += sum(1 for t in tokens if t not in vocab)
+    return oov / total if total else 0.0
+
+
+def _refit_reason(bundle, texts, post_count, n_topics):
+    """Why the saved model should be refit, or None if it can be reused."""
+    if bundle is None:
+        return 'no_model'
+    if bundle['n_topics'] != n_topics:
+        return 'n_topics_changed'
+    if post_count is not None and post_count >= bundle['source_post_count'] * (1 + TOPIC_REFIT_GROWTH):
+        return 'corpus_growth'
+    if _oov_rate(bundle['vectorizer'], texts) - bundle['oov_rate'] > TOPIC_REFIT_OOV_DRIFT:
+        return 'vocabulary_drift'
+    return None
 
-    # extract topics
+
+def _extract_topics(vectorizer, H):
+    feature_names = vectorizer.get_feature_names_out()
     topics = []
     for topic_idx, topic in enumerate(H):
         top_indices = topic.argsort()[::-1][:10]
@@ -82,42 +207,107 @@ def run_pipeline(keyword, limit=500, n_topics=8):
         label = ' '.join(top_words[:5])
         score = float(topic.max())
         topics.append({'topic_id': f'topic_{topic_idx}', 'label': label, 'score': score, 'words': top_words})
+    return topics
+
 
-    # write topics and per-post enrichment
+def _iter_enrichment_rows(keyword, posts, W, vader, cache, cache_updates):
+    """
+    Yields post_enrichment rows for `posts` given their NMF weights `W`. VADER
+    scores the post text as-is (title + content, not `clean_text`), as this
+    pipeline always has; the score comes from the shared NLP cache, keyed on
+    that exact text, when it has been scored before, and new scores are
+    collected in `cache_updates`.
+    """
+    for idx, p in enumerate(posts):
+        text = p['text']
+        sentiment = None
+        if text:
+            entry = cache_updates.get(text) or cache.get(text)
+            sentiment = entry.get('compound') if entry else None
+            if sentiment is None:
+                sentiment = vader.polarity_scores(text).get('compound')
+                cache_updates[text] = {'compound': sentiment, 'entities': None}
+        # assigned topic by max weight
+        assigned = None
+        topic_weight = None
+        if idx < len(W):
+            row = W[idx]
+            if row.size:
+                ti = int(row.argmax())
+                assigned = f'topic_{ti}'
+                topic_weight = float(row[ti])
+        yield (p['platform_post_id'], keyword, p['platform'], sentiment, assigned, topic_weight)
+
+
+def run_pipeline(keyword, limit=500, n_topics=8, force_refit=False):
+    # fetch posts
+    posts = fetch_posts(keyword, limit=limit)
+    if not posts:
+        return {'success': False, 'reason': 'no_posts'}
+
+    texts = [p['text'] for p in posts]
+
+    vader = SentimentIntensityAnalyzer()
+
+    post_count = count_posts(keyword)
+    bundle = load_topic_model(keyword)
+    reason = 'forced' if force_refit else _refit_reason(bundle, texts, post_count, n_topics)
+
+    if reason:
+        # vectorize
+        vectorizer = TfidfVectorizer(max_df=0.95, min_df=2, stop_words='english', max_features=4000)
+        X = vectorizer.fit_transform(texts)
+
+        # NMF
+        nmf = NMF(n_components=n_topics, random_state=1, init='nndsvda', max_iter=400)
+        W = nmf.fit_transform(X)
+
+        bundle = {
+            'version': (bundle['version'] + 1) if bundle else 1,
+            'fitted_at': datetime.now().isoformat(timespec='seconds'),
+            'corpus_size': len(texts),
+            'source_post_count': post_count if post_count is not None else len(texts),
+            'n_topics': n_topics,
+            'oov_rate': _oov_rate(vectorizer, texts),
+            'vectorizer': vectorizer,
+            'nmf': nmf,
+            'topics': _extract_topics(vectorizer, nmf.components_),
+        }
+        try:
+            save_topic_model(keyword, bundle)
+        except Exception as e:
+            logger.warning('Could not save topic model for %s: %s', keyword, e)
+        logger.info('Refit topic model for %s (reason=%s, version=%d)', keyword, reason, bundle['version'])
+    else:
+        # transform-only scoring with the saved model
+        W = bundle['nmf'].transform(bundle['vectorizer'].transform(texts))
+
+    topics = bundle['topics']
+    model_info = {'version': bundle['version'], 'fitted_at': bundle['fitted_at'],
+                  'corpus_size': bundle['corpus_size'], 'refit': bool(reason), 'refit_reason': reason}
+
+    # write topics, then per-post enrichment in chunked multi-row upserts
     conn = db.get_db_connection()
     if conn is None:
         return {'success': False, 'reason': 'db_connect_fail'}
     cursor = conn.cursor()
+    cache = get_nlp_cache()
+    cache_updates = {}
     try:
         # upsert topics
-        for t in topics:
-            upsert = ("INSERT INTO topics (keyword, platform, topic_id, topic_label, score) "
-                      "VALUES (%s, %s, %s, %s, %s) "
-                      "ON DUPLICATE KEY UPDATE topic_label = VALUES(topic_label), score = VALUES(score), created_at = CURRENT_TIMESTAMP")
-            cursor.execute(upsert, (keyword, 'multi', t['topic_id'], t['label'], t['score']))
-
-        # per-post enrichment
-        for idx, p in enumerate(posts):
-            sentiment = vader.polarity_scores(p['text']).get('compound') if p['text'] else None
-            # assigned topic by max weight
-            assigned = None
-            topic_weight = None
-            if idx < len(W):
-                row = W[idx]
-                if row.size:
-                    ti = int(row.argmax())
-                    assigned = f'topic_{ti}'
-                    topic_weight = float(row[ti])
-
-            # upsert into post_enrichment
-            # Use INSERT ... ON DUPLICATE KEY UPDATE to upsert per-post enrichment
-            ins = ("INSERT INTO post_enrichment (platform_post_id, keyword, platform, sentiment_compound, assigned_topic, topic_weight) "
-                   "VALUES (%s, %s, %s, %s, %s, %s) "
-                   "ON DUPLICATE KEY UPDATE sentiment_compound = VALUES(sentiment_compound), assigned_topic = VALUES(assigned_topic), topic_weight = VALUES(topic_weight), created_at = CURRENT_TIMESTAMP")
-            cursor.execute(ins, (p['platform_post_id'], keyword, p['platform'], sentiment, assigned, topic_weight))
-
+        cursor.executemany(TOPIC_UPSERT, [(keyword, 'multi', t['topic_id'], t['label'], t['score']) for t in topics])
         conn.commit()
-        return {'success': True, 'posts_processed': len(posts), 'topics_inserted': len(topics)}
+
+        # per-post enrichment; sentiment comes from the shared NLP cache when
+        # the cleaned text has been scored before. Rows are handed to a
+        # background writer chunk by chunk while the rest are still scored.
+        with db.BulkUpserter(POST_ENRICHMENT_UPSERT, background=True) as upserter:
+            for row in _iter_enrichment_rows(keyword, posts, W, vader, cache, cache_updates):
+                upserter.add_many([row])
+
+        cache.put_many(cache_updates)
+        return {'success': True, 'posts_processed': len(posts), 'topics_inserted': len(topics),
+                'model': model_info, 'nlp_cache': cache.stats()}
     except Exception as e:
         logger.exception('NLP pipeline DB write failed: %s', e)
         conn.rollback()
@@ -127,11 +317,131 @@ def run_pipeline(keyword, limit=500, n_topics=8):
         conn.close()
 
 
+def _hashing_vectorizer(n_features):
+    # raw counts; IDF weighting and l2 normalisation are applied per chunk
+    return HashingVectorizer(n_features=n_features, stop_words='english', alternate_sign=False, norm=None)
+
+
+def _stream_tfidf(vectorizer, texts, idf):
+    return normalize(vectorizer.transform(texts) @ sp.diags(idf), norm='l2', copy=False)
+
+
+def run_streaming_pipeline(keyword, n_topics=8, limit=None, chunk_size=None, n_features=None, epochs=None):
+    """
+    Topic modeling over the whole corpus for `keyword` (or the newest `limit`
+    posts) with bounded memory. Makes 2 + `epochs` chunked passes over raw_data:
+
+      1. document frequencies per hashed feature -> IDF (same max_df/min_df
+         cut-offs as the in-memory vectorizer)
+      2. MiniBatchNMF.partial_fit on each TF-IDF chunk (repeated `epochs` times)
+      3. transform each chunk, write post_enrichment rows, and map the top
+         hashed features of each topic back to the most frequent token for labels
+
+    Streamed models are not saved; `run_pipeline` keeps managing the
+    persisted per-keyword models.
+    """
+    chunk_size = chunk_size or TOPIC_STREAM_CHUNK_SIZE
+    n_features = n_features or TOPIC_STREAM_FEATURES
+    epochs = max(1, epochs or TOPIC_STREAM_EPOCHS)
+    vectorizer = _hashing_vectorizer(n_features)
+
+    # pass 1: document frequencies
+    df = np.zeros(n_features, dtype=np.int64)
+    n_docs = 0
+    for posts in iter_post_chunks(keyword, chunk_size=chunk_size, limit=limit):
+        X = vectorizer.transform([p['text'] for p in posts])
+        df += np.bincount(X.indices, minlength=n_features)
+        n_docs += len(posts)
+    if n_docs == 0:
+        return {'success': False, 'reason': 'no_posts'}
+    if n_docs < n_topics:
+        return {'success': False, 'reason': 'not_enough_posts', 'posts': n_docs}
+
+    idf = np.log((1 + n_docs) / (1 + df)) + 1
+    idf[(df < 2) | (df > 0.95 * n_docs)] = 0.0
+
+    # pass 2: minibatch NMF
+    nmf = MiniBatchNMF(n_components=n_topics, random_state=1, init='nndsvda', batch_size=chunk_size)
+    for _ in range(epochs):
+        for posts in iter_post_chunks(keyword, chunk_size=chunk_size, limit=limit):
+            X = _stream_tfidf(vectorizer, [p['text'] for p in posts], idf)
+            if X.nnz:
+                nmf.partial_fit(X)
+    if not hasattr(nmf, 'components_'):
+        return {'success': False, 'reason': 'empty_vocabulary'}
+
+    # pass 3: score posts and collect label tokens for each topic's top features
+    H = nmf.components_
+    top_indices = [topic.argsort()[::-1][:10] for topic in H]
+    wanted = set(int(i) for idx in top_indices for i in idx)
+    token_counts = {}
+    analyze = vectorizer.build_analyzer()
+    hasher = FeatureHasher(n_features=n_features, input_type='string', alternate_sign=False)
+
+    vader = SentimentIntensityAnalyzer()
+    cache = get_nlp_cache()
+    processed = 0
+    try:
+        with db.BulkUpserter(POST_ENRICHMENT_UPSERT, background=True) as upserter:
+            for posts in iter_post_chunks(keyword, chunk_size=chunk_size, limit=limit):
+                texts = [p['text'] for p in posts]
+                W = nmf.transform(_stream_tfidf(vectorizer, texts, idf))
+                cache_updates = {}
+                for row in _iter_enrichment_rows(keyword, posts, W, vader, cache, cache_updates):
+                    upserter.add_many([row])
+                cache.put_many(cache_updates)
+                processed += len(posts)
+
+                counts = {}
+                for text in texts:
+                    for token in analyze(text):
+                        counts[token] = counts.get(token, 0) + 1
+                tokens = list(counts)
+                if tokens:
+                    hashed = hasher.transform([[t] for t in tokens]).tocsr()
+                    for token, lo, hi in zip(tokens, hashed.indptr[:-1], hashed.indptr[1:]):
+                        if hi > lo and int(hashed.indices[lo]) in wanted:
+                            bucket = token_counts.setdefault(int(hashed.indices[lo]), {})
+                            bucket[token] = bucket.get(token, 0) + counts[token]
+    except Exception as e:
+        logger.exception('Streaming NLP pipeline DB write failed: %s', e)
+        return {'success': False, 'reason': 'db_write_failed', 'error': str(e)}
+
+    topics = []
+    for topic_idx, (topic, indices) in enumerate(zip(H, top_indices)):
+        top_words = [max(token_counts[int(i)], key=token_counts[int(i)].get)
+                     for i in indices if int(i) in token_counts]
+        topics.append({'topic_id': f'topic_{topic_idx}', 'label': ' '.join(top_words[:5]),
+                       'score': float(topic.max()), 'words': top_words})
+
+    conn = db.get_db_connection()
+    if conn is None:
+        return {'success': False, 'reason': 'db_connect_fail'}
+    cursor = conn.cursor()
+    try:
+        cursor.executemany(TOPIC_UPSERT, [(keyword, 'multi', t['topic_id'], t['label'], t['score']) for t in topics])
+        conn.commit()
+        return {'success': True, 'mode': 'streaming', 'posts_processed': processed, 'topics_inserted': len(topics),
+                'nlp_cache': cache.stats()}
+    except Exception as e:
+        logger.exception('Streaming NLP pipeline topic write failed: %s', e)
+        conn.rollback()
+        return {'success': False, 'reason': 'db_write_failed', 'error': str(e)}
+    finally:
+        cursor.close()
+        conn.close()
+
+
 if __name__ == '__main__':
     import argparse
     p = argparse.ArgumentParser()
     p.add_argument('--keyword', required=True)
-    p.add_argument('--limit', type=int, default=500)
+    p.add_argument('--limit', type=int, default=None)
     p.add_argument('--n_topics', type=int, default=8)
+    p.add_argument('--refit', action='store_true')
+    p.add_argument('--stream', action='store_true')
     args = p.parse_args()
-    print(run_pipeline(args.keyword, limit=args.limit, n_topics=args.n_topics))
+    if args.stream:
+        print(run_streaming_pipeline(args.keyword, n_topics=args.n_topics, limit=args.limit))
+    else:
+        print(run_pipeline(args.keyword, limit=args.limit or 500, n_topics=args.n_topics, force_refit=args.refit))
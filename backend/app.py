@@ -14,25 +14,19 @@ sys.path.append(PROJECT_ROOT)
 # ---------------------------------------------------
 
 # --- Project-Specific Imports ---
-from database.db import get_db_connection
-from backend.analytics.forecasting import generate_forecast
-from backend.ingest.reddit_connector import fetch_reddit_data
-from backend.scripts.google_trends import fetch_and_store_google_trends
-
-from backend.ingest.instagram_connector import fetch_instagram_data
-from backend.ingest.twitter_connector import fetch_twitter_data
-from backend.ingest.youtube_connector import fetch_youtube_data
-
-# --- Import YOUR new analyzer ---
-from backend.processing.analyzer import analyze_and_store_sentiment_and_entities
-from backend.scripts.clean_and_aggregate import clean_and_aggregate_google_trends
+from database.db import get_db_connection, get_pool_stats
+from backend.analytics.forecasting import get_registry_stats
+from backend.analytics.forecast_store import geo_scope, get_forecast, load_history, validate_forecast_options
+from backend.pipeline import run_fetch_and_analyze
+from backend.jobs import get_job_queue
+from backend.processing.nlp_cache import get_nlp_cache
+from backend.ingest.seen_filter import get_seen_stats, warm_seen_filters
 from backend.analytics.geo_pipeline import enrich_geo_and_aggregate
 from serpapi import GoogleSearch
 from backend.analytics.influencer_pipeline import run_pipeline as run_influencer_pipeline
 
 SERPAPI_KEY = os.getenv("SERPAPI_KEY")
 
-
 # --- Flask App Initialization ---
 TEMPLATE_FOLDER = os.path.join(PROJECT_ROOT, 'frontend')
 STATIC_FOLDER = os.path.join(PROJECT_ROOT, 'frontend')
@@ -59,6 +53,7 @@ def fetch_and_analyze():
     # --- CACHE LOGIC ---
     if not start_date and not end_date:
         connection = None
+        cursor = None
         try:
             connection = get_db_connection()
             cursor = connection.cursor(dictionary=True)
@@ -77,83 +72,52 @@ def fetch_and_analyze():
         except Exception as e:
             print(f"Cache check failed, proceeding with fetch: {e}")
         finally:
-            if connection and connection.is_connected():
+            if cursor:
                 cursor.close()
+            if connection:
                 connection.close()
     else:
         print(f"--- Custom date range requested for '{keyword}'. Bypassing cache. ---")
 
-    print(f"--- Starting REAL-TIME data fetch for keyword: '{keyword}' ---")
+    # --- Run the pipeline in the background; the client polls /api/jobs/<id> ---
     try:
-        # ===== STEP 1: FETCH RAW DATA =====
-        print("STEP 1: Starting Google Trends fetch...")
-        google_success = fetch_and_store_google_trends(keyword, start_date=start_date, end_date=end_date)
-        print(f"STEP 1: Google Trends done: {google_success}")
-
-        print("STEP 1: Starting Reddit fetch...")
-        reddit_success = fetch_reddit_data(keyword)
-        print(f"STEP 1: Reddit done: {reddit_success}")
-
-        print("STEP 1: Starting Instagram fetch...")
-        insta_success = fetch_instagram_data(keyword, max_results=30)
-        print(f"STEP 1: Instagram done: {insta_success}")
-
-        print("STEP 1: Starting Twitter/X fetch...")
-        twitter_success = fetch_twitter_data(keyword, max_results=10)
-        print(f"STEP 1: Twitter/X done: {twitter_success}")
-
-        print("STEP 1: Starting YouTube fetch...")
-        youtube_success = fetch_youtube_data(keyword, max_results=25)
-        print(f"STEP 1: YouTube done: {youtube_success}")
-
-        social_success = any([reddit_success, insta_success, twitter_success, youtube_success])
-        print(f"STEP 1 SUMMARY: social_success={social_success}")
-
-        if not social_success:
-            print(f"❌ Failed to fetch social media data for '{keyword}'.")
-            return jsonify({"error": "Failed to fetch social media data. Try again later."}), 500
-
-        if not google_success:
-            print(f"⚠️ Warning: Google Trends fetch failed for '{keyword}'.")
-
-        # ===== STEP 2: ANALYSIS & CLEANING =====
-        print("STEP 2: Starting NLP analyzer...")
-        sentiment_success = analyze_and_store_sentiment_and_entities(keyword)
-        print(f"STEP 2: Analyzer done: {sentiment_success}")
-
-        gtrends_clean_success = True
-        if google_success:
-            print("STEP 2: Starting Google Trends cleaning...")
-            gtrends_clean_success = clean_and_aggregate_google_trends(keyword)
-            print(f"STEP 2: Trends cleaning done: {gtrends_clean_success}")
-
-        if not sentiment_success or not gtrends_clean_success:
-            print(f"❌ Analysis/Cleaning failed for '{keyword}'.")
-            return jsonify({"error": "Data fetched but analysis failed."}), 500
-
-        # ===== STEP 3: INFLUENCER PIPELINE =====
-        try:
-            print("STEP 3: Running influencer pipeline...")
-            inf_result = run_influencer_pipeline(keyword)
-            print(f"STEP 3: Influencer pipeline done: {inf_result}")
-        except Exception as pipe_error:
-            print(f"⚠️ Influencer pipeline error: {pipe_error}")
-
-        # ===== STEP 4: GEO ENRICHMENT (fills geo_metrics) =====
-        try:
-            print("STEP 4: Running geo enrichment...")
-            geo_result = enrich_geo_and_aggregate(keyword, days_back=30)
-            print(f"STEP 4: Geo enrichment done: {geo_result}")
-        except Exception as geo_err:
-            print(f"⚠️ Geo enrichment error: {geo_err}")
-
+        job, attached = get_job_queue().submit(
+            "fetch-and-analyze",
+            run_fetch_and_analyze,
+            params={"keyword": keyword, "start_date": start_date, "end_date": end_date},
+            dedupe_key=f"fetch-and-analyze|{keyword}|{start_date or ''}|{end_date or ''}",
+        )
+    except Exception as e:
+        print(f"❌ Could not queue fetch job for '{keyword}': {e}")
+        return jsonify({"error": "Internal server error while queuing the fetch job."}), 500
+
+    if attached:
+        print(f"--- Attached to in-flight job {job['id']} for '{keyword}' ---")
+    return jsonify({
+        "message": f"Fetch and analysis queued for '{keyword}'",
+        "job_id": job["id"],
+        "status": job["status"],
+        "attached": attached,
+        "status_url": f"/api/jobs/{job['id']}",
+    }), 202
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Per-stage state, timings and errors for a background job."""
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    status = request.args.get('status')
+    limit = int(request.args.get('limit', 50))
+    return jsonify({"jobs": get_job_queue().list(status=status, limit=limit)})
 
-        print(f"--- ✅ Successfully fetched and analyzed all data for '{keyword}' ---")
-        return jsonify({"message": f"Successfully fetched and analyzed all data for '{keyword}'"}), 200
 
-    except Exception as e:
-        print(f"❌ Critical error during fetch: {e}")
-        return jsonify({"error": "Internal server error during data fetching."}), 500
 # --- This is the "waiter" for the Google Trends / Sentiment Chart ---
 @app.route('/api/trends', methods=['GET'])
 def get_trends():
@@ -164,6 +128,7 @@ def get_trends():
 
     print(f"Querying database for /api/trends with keyword: '{keyword}'")
     connection = None
+    cursor = None
     try:
         connection = get_db_connection()
         if not connection:
@@ -198,8 +163,9 @@ def get_trends():
         print(f"An error occurred in /api/trends: {e}")
         return jsonify({"error": "An internal server error occurred"}), 500
     finally:
-        if connection and connection.is_connected():
+        if cursor:
             cursor.close()
+        if connection:
             connection.close()
 
 
@@ -208,6 +174,8 @@ def get_topics():
     keyword = request.args.get('keyword')
     if not keyword:
         return jsonify({"error": "Keyword is required"}), 400
+    conn = None
+    cursor = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
@@ -219,8 +187,9 @@ def get_topics():
         print(f"Error in /api/topics: {e}")
         return jsonify({"error": "Internal server error"}), 500
     finally:
-        if conn and conn.is_connected():
+        if cursor:
             cursor.close()
+        if conn:
             conn.close()
 
 
@@ -251,6 +220,8 @@ def get_geo_metrics():
     date_to = request.args.get('date_to')
     if not keyword:
         return jsonify({'error': 'Keyword is required'}), 400
+    conn = None
+    cursor = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
@@ -273,11 +244,61 @@ def get_geo_metrics():
         print(f"Error in /api/geo/metrics: {e}")
         return jsonify({'error': 'Internal server error'}), 500
     finally:
-        if conn and conn.is_connected():
+        if cursor:
             cursor.close()
+        if conn:
             conn.close()
 
 
+FORECAST_COLUMNS = ['ds', 'y', 'yhat', 'yhat_lower', 'yhat_upper']
+
+
+def _merged_forecast_body(history, records, value_key, fmt='rows'):
+    """
+    JSON body of history outer-joined with forecast records on the date.
+
+    Built column-wise: pandas merges and formats the dates and writes NaN as
+    null while serializing, so no per-row Python work is done. `fmt` 'rows'
+    returns [{ds, y, yhat, yhat_lower, yhat_upper}, ...]; 'columns' returns
+    {ds: [...], y: [...], ...}, which is much smaller for long histories.
+    """
+    history_df = pd.DataFrame.from_records(history, columns=['date', value_key])
+    history_df.columns = ['ds', 'y']
+    history_df['ds'] = pd.to_datetime(history_df['ds'])
+    history_df['y'] = pd.to_numeric(history_df['y'], errors='coerce')
+
+    forecast_df = pd.DataFrame.from_records(records, columns=FORECAST_COLUMNS[:1] + FORECAST_COLUMNS[2:])
+    forecast_df['ds'] = pd.to_datetime(forecast_df['ds'])
+
+    full = pd.merge(history_df, forecast_df, on='ds', how='outer', sort=True)
+    full['ds'] = full['ds'].dt.strftime('%Y-%m-%d')
+    full = full[FORECAST_COLUMNS]
+
+    if fmt == 'columns':
+        return '{' + ','.join(f'"{c}":' + full[c].to_json(orient='values') for c in FORECAST_COLUMNS) + '}'
+    return full.to_json(orient='records')
+
+
+def _forecast_payload(history, records, value_key, meta):
+    """Forecast endpoint response; ?format=rows (default) or ?format=columns."""
+    fmt = request.args.get('format', 'rows')
+    if fmt not in ('rows', 'columns'):
+        return jsonify({'error': "format must be 'rows' or 'columns'"}), 400
+    body = _merged_forecast_body(history, records, value_key, fmt)
+    return _forecast_response(app.response_class(body, mimetype='application/json'), meta)
+
+
+def _forecast_response(response, meta):
+    """Adds the stored forecast's provenance and freshness as response headers."""
+    response.headers['X-Forecast-Engine'] = str(meta.get('engine'))
+    response.headers['X-Forecast-Model-Version'] = str(meta.get('model_version'))
+    response.headers['X-Forecast-Generated-At'] = str(meta.get('generated_at'))
+    response.headers['X-Forecast-Stale'] = 'true' if meta.get('stale') else 'false'
+    # computed for this request's ?engine=/?mode= rather than read from the forecasts table
+    response.headers['X-Forecast-Override'] = 'true' if meta.get('override') else 'false'
+    return response
+
+
 @app.route('/api/geo/forecast', methods=['GET'])
 def get_geo_forecast():
     keyword = request.args.get('keyword')
@@ -285,56 +306,38 @@ def get_geo_forecast():
     platform = request.args.get('platform')
     if not keyword or not country:
         return jsonify({'error': 'keyword and country are required'}), 400
+    mode, engine = request.args.get('mode'), request.args.get('engine')
+    try:
+        validate_forecast_options(mode, engine)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    conn = None
+    cursor = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
-        q = "SELECT `date` as date, metric as y FROM geo_metrics WHERE keyword = %s AND country = %s"
-        params = [keyword, country]
-        if platform:
-            q += " AND platform = %s"
-            params.append(platform)
-        q += " ORDER BY `date` ASC"
-        cursor.execute(q, tuple(params))
-        history = cursor.fetchall()
+        history = load_history(cursor, keyword, geo_scope(country, platform))
+        # release the connection before a possible on-demand forecast
+        cursor.close()
+        conn.close()
+        cursor = conn = None
 
         if not history or len(history) < 30:
             return jsonify({'error': 'Not enough regional historical data to forecast.'}), 404
 
-        # Reuse generate_forecast which accepts historical records
-        forecast_df = generate_forecast(history)
+        # Served from the forecasts table; recomputed only when new geo_metrics points arrived
+        forecast_df, forecast_meta = get_forecast(keyword, geo_scope(country, platform), mode=mode, engine=engine)
         if forecast_df is None:
             return jsonify({'error': 'Failed to generate forecast.'}), 500
 
-        import pandas as pd, math
-        if isinstance(forecast_df, list):
-            forecast_df = pd.DataFrame(forecast_df)
-        if 'ds' in forecast_df.columns:
-            forecast_df['ds'] = pd.to_datetime(forecast_df['ds'])
-        elif 'date' in forecast_df.columns:
-            forecast_df.rename(columns={'date': 'ds'}, inplace=True)
-            forecast_df['ds'] = pd.to_datetime(forecast_df['ds'])
-
-        history_df = pd.DataFrame(history)
-        history_df.rename(columns={'date': 'ds', 'y': 'y'}, inplace=True)
-        history_df['ds'] = pd.to_datetime(history_df['ds'])
-
-        full = pd.merge(history_df, forecast_df, on='ds', how='outer')
-        full['ds'] = full['ds'].dt.strftime('%Y-%m-%d')
-        records = full.to_dict('records')
-
-        def _sanitize(rec):
-            for k, v in rec.items():
-                if isinstance(v, float) and math.isnan(v):
-                    rec[k] = None
-            return rec
-
-        return jsonify([_sanitize(r) for r in records])
+        return _forecast_payload(history, forecast_df, 'y', forecast_meta)
     except Exception as e:
         print(f"Error in /api/geo/forecast: {e}")
         return jsonify({'error': 'Internal server error'}), 500
     finally:
-        if conn and conn.is_connected():
+        if cursor:
             cursor.close()
+        if conn:
             conn.close()
 
 
@@ -392,7 +395,7 @@ def get_top_countries_from_trends():
     finally:
         if cursor:
             cursor.close()
-        if conn and conn.is_connected():
+        if conn:
             conn.close()
 
 
@@ -403,6 +406,8 @@ def get_entities():
     platform = request.args.get('platform')
     if not keyword:
         return jsonify({"error": "Keyword is required"}), 400
+    conn = None
+    cursor = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
@@ -418,8 +423,9 @@ def get_entities():
         print(f"Error in /api/entities: {e}")
         return jsonify({"error": "Internal server error"}), 500
     finally:
-        if conn and conn.is_connected():
+        if cursor:
             cursor.close()
+        if conn:
             conn.close()
 
 
@@ -429,6 +435,8 @@ def get_post_enrichment():
     limit = int(request.args.get('limit', 100))
     if not keyword:
         return jsonify({"error": "Keyword is required"}), 400
+    conn = None
+    cursor = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
@@ -440,8 +448,9 @@ def get_post_enrichment():
         print(f"Error in /api/post_enrichment: {e}")
         return jsonify({"error": "Internal server error"}), 500
     finally:
-        if conn and conn.is_connected():
+        if cursor:
             cursor.close()
+        if conn:
             conn.close()
 
 
@@ -488,7 +497,7 @@ def get_influencers():
     finally:
         if cursor:
             cursor.close()
-        if conn and conn.is_connected():
+        if conn:
             conn.close()
 
 
@@ -501,6 +510,8 @@ def refresh_influencers():
     limit = int(data.get('limit', 20))
     if not keyword:
         return jsonify({'error': 'Keyword is required'}), 400
+    conn = None
+    cursor = None
     try:
         result = run_influencer_pipeline(keyword)
         # After pipeline runs, fetch top influencers
@@ -515,8 +526,9 @@ def refresh_influencers():
         return jsonify({'error': 'Internal server error'}), 500
     finally:
         try:
-            if conn and conn.is_connected():
+            if cursor:
                 cursor.close()
+            if conn:
                 conn.close()
         except Exception:
             pass
@@ -646,8 +658,6 @@ def platforms_comparison():
         
         # FIX 2: Engagement Index - Normalize per-platform using log scale to account for different scales
         # YouTube views (millions) vs Instagram likes (thousands) need different treatment
-        import math
-        
         # Calculate log-scaled scores per platform to compress the range
         log_scores = {}
         for platform, avg_score in platform_avg_scores.items():
@@ -691,7 +701,7 @@ def platforms_comparison():
     finally:
         if cursor:
             cursor.close()
-        if conn and conn.is_connected():
+        if conn:
             conn.close()
 
 # --- This is the "waiter" for the Forecast Chart ---
@@ -703,9 +713,17 @@ def get_trend_forecast():
     keyword = request.args.get('keyword')
     if not keyword:
         return jsonify({"error": "Keyword is required"}), 400
+    # ?engine=ets|lstm asks for a specific engine;
+    # ?mode=recursive|rollout|direct selects how the LSTM produces multi-step forecasts
+    mode, engine = request.args.get('mode'), request.args.get('engine')
+    try:
+        validate_forecast_options(mode, engine)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     print(f"Querying database for /api/trends/forecast with keyword: '{keyword}'")
     connection = None
+    cursor = None
     try:
         connection = get_db_connection()
         if not connection:
@@ -715,67 +733,63 @@ def get_trend_forecast():
         
         # We will build a new forecast model later (Day 9)
         # For now, we still use Google Trends data
-        query = "SELECT post_time as date, score FROM raw_data WHERE keyword = %s AND platform = 'Google Trends' ORDER BY post_time ASC"
-        cursor.execute(query, (keyword,))
-        historical_data = cursor.fetchall()
+        historical_data = load_history(cursor, keyword, 'trends')
+        # release the connection before a possible on-demand forecast
+        cursor.close()
+        connection.close()
+        cursor = connection = None
 
         if not historical_data or len(historical_data) < 30:
             print(f"FORECASTING_WARNING: Not enough historical data for '{keyword}'. Found {len(historical_data)} points.")
             return jsonify({"error": "Not enough historical data to generate a forecast."}), 404
 
-        # Use the imported forecasting function
-        forecast_df = generate_forecast(historical_data)
+        # Served from the forecasts table; recomputed only when new Google Trends points arrived.
+        # An explicit engine/mode is computed for this request only.
+        forecast_df, forecast_meta = get_forecast(keyword, 'trends', mode=mode, engine=engine)
         if forecast_df is None:
-            print(f"FORECASTING_WARNING: generate_forecast() returned None for '{keyword}'.")
+            print(f"FORECASTING_WARNING: no forecast could be made for '{keyword}'.")
             return jsonify({"error": "Failed to generate forecast."}), 500
 
-        # `generate_forecast` may return a list-of-dicts (JSON-serializable records)
-        # or a pandas DataFrame. Normalize to a DataFrame for merging below.
-        if isinstance(forecast_df, list):
-            try:
-                forecast_df = pd.DataFrame(forecast_df)
-            except Exception as e:
-                print(f"FORECASTING_ERROR: could not convert forecast records to DataFrame: {e}")
-                return jsonify({"error": "Failed to process forecast data."}), 500
-
-        # Ensure the forecast DataFrame has a 'ds' column and datetime dtype
-        if 'ds' in forecast_df.columns:
-            forecast_df['ds'] = pd.to_datetime(forecast_df['ds'])
-        elif 'date' in forecast_df.columns:
-            forecast_df.rename(columns={'date': 'ds'}, inplace=True)
-            forecast_df['ds'] = pd.to_datetime(forecast_df['ds'])
-
-        history_df = pd.DataFrame(historical_data)
-        history_df.rename(columns={'date': 'ds', 'score': 'y'}, inplace=True)
-        history_df['ds'] = pd.to_datetime(history_df['ds'])
-        
-        full_data = pd.merge(history_df, forecast_df, on='ds', how='outer')
-        full_data['ds'] = full_data['ds'].dt.strftime('%Y-%m-%d')
-
-        # Convert to records and sanitize NaN -> None so JSON is valid
-        records = full_data.to_dict('records')
-
-        def _sanitize_record(rec):
-            for k, v in rec.items():
-                # Replace NaN (float) with None
-                if isinstance(v, float) and math.isnan(v):
-                    rec[k] = None
-            return rec
-
-        response_data = [_sanitize_record(r) for r in records]
-        return jsonify(response_data)
+        # ?format=columns returns {ds: [...], y: [...], yhat: [...], ...} instead of row objects
+        return _forecast_payload(historical_data, forecast_df, 'score', forecast_meta)
     except Exception as e:
         print(f"An error occurred in /api/trends/forecast: {e}")
         return jsonify({"error": "An internal server error occurred"}), 500
     finally:
-        if connection and connection.is_connected():
+        if cursor:
             cursor.close()
+        if connection:
             connection.close()
 
 
 
+@app.route('/api/db/pool-stats', methods=['GET'])
+def db_pool_stats():
+    """Connection pool sizing and checkout latency counters."""
+    return jsonify(get_pool_stats())
+
+
+@app.route('/api/nlp/cache-stats', methods=['GET'])
+def nlp_cache_stats():
+    """Hit-rate statistics for the sentiment/entity cache."""
+    return jsonify(get_nlp_cache().stats())
+
+
+@app.route('/api/ingest/seen-stats', methods=['GET'])
+def ingest_seen_stats():
+    """Per-platform seen-ID filter size and duplicate-skip counters."""
+    return jsonify(get_seen_stats())
+
+
+@app.route('/api/forecast/registry-stats', methods=['GET'])
+def forecast_registry_stats():
+    """Trained forecast models currently held in memory."""
+    return jsonify(get_registry_stats())
+
+
 # --- This runs the app ---
 if __name__ == '__main__':
     print("Starting Flask server...")
+    warm_seen_filters()
     print("Access the application at http://127.0.0.1:5000")
     app.run(host="0.0.0.0", port=5000)
@@ -0,0 +1,117 @@
+"""Asyncio HTTP layer for the ingestion connectors.
+
+One `AsyncHTTP` wraps a pooled keep-alive `httpx.AsyncClient`, so every
+request to the same API reuses connections instead of opening a new TLS
+session per call. Requests to one host are limited to ASYNC_HTTP_PER_HOST at
+a time. Connection errors and 429/5xx responses are retried up to
+ASYNC_HTTP_RETRIES times with full-jitter exponential backoff; a Retry-After
+header, when sent, is used instead (capped at ASYNC_HTTP_BACKOFF_MAX).
+
+Connectors implement `fetch_async(http, keyword, ...)`; `run_sync` runs such
+a coroutine on a private loop and client for blocking callers.
+"""
+import asyncio
+import logging
+import os
+import random
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+ASYNC_HTTP_MAX_CONNECTIONS = int(os.getenv("ASYNC_HTTP_MAX_CONNECTIONS", 50))
+ASYNC_HTTP_PER_HOST = int(os.getenv("ASYNC_HTTP_PER_HOST", 4))
+ASYNC_HTTP_TIMEOUT = float(os.getenv("ASYNC_HTTP_TIMEOUT", 30))
+ASYNC_HTTP_RETRIES = int(os.getenv("ASYNC_HTTP_RETRIES", 3))
+ASYNC_HTTP_BACKOFF = float(os.getenv("ASYNC_HTTP_BACKOFF", 0.5))
+ASYNC_HTTP_BACKOFF_MAX = float(os.getenv("ASYNC_HTTP_BACKOFF_MAX", 20))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _retry_after(response):
+    """Seconds from a numeric Retry-After header, or None."""
+    try:
+        return min(float(response.headers.get("Retry-After")), ASYNC_HTTP_BACKOFF_MAX)
+    except (TypeError, ValueError):
+        return None
+
+
+class AsyncHTTP:
+    def __init__(self, max_connections=ASYNC_HTTP_MAX_CONNECTIONS, per_host=ASYNC_HTTP_PER_HOST,
+                 timeout=ASYNC_HTTP_TIMEOUT, retries=ASYNC_HTTP_RETRIES):
+        self.per_host = max(1, per_host)
+        self.retries = retries
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                                keepalive_expiry=30),
+            timeout=timeout, follow_redirects=True)
+        self._host_slots = {}
+        self.stats = {"requests": 0, "retries": 0, "failures": 0}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+        return False
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    def _slot(self, url):
+        host = urlsplit(url).netloc
+        if host not in self._host_slots:
+            self._host_slots[host] = asyncio.Semaphore(self.per_host)
+        return self._host_slots[host]
+
+    async def request(self, method, url, **kwargs):
+        """
+        Sends a request with per-host concurrency and retries. Returns the
+        response; raises httpx.HTTPStatusError for a final 4xx/5xx and
+        httpx.TransportError once retries are used up.
+        """
+        attempt = 0
+        while True:
+            delay = None
+            try:
+                async with self._slot(url):
+                    self.stats["requests"] += 1
+                    response = await self._client.request(method, url, **kwargs)
+                if response.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    if response.is_error:
+                        self.stats["failures"] += 1
+                    response.raise_for_status()
+                    return response
+                delay = _retry_after(response)
+                reason = f"HTTP {response.status_code}"
+            except httpx.TransportError as e:
+                if attempt >= self.retries:
+                    self.stats["failures"] += 1
+                    raise
+                reason = type(e).__name__
+
+            attempt += 1
+            self.stats["retries"] += 1
+            if delay is None:
+                delay = random.uniform(0, min(ASYNC_HTTP_BACKOFF_MAX, ASYNC_HTTP_BACKOFF * 2 ** attempt))
+            logger.info("%s %s failed (%s); retry %d/%d in %.1fs", method, urlsplit(url).netloc, reason,
+                        attempt, self.retries, delay)
+            await asyncio.sleep(delay)
+
+    async def get_json(self, url, **kwargs):
+        response = await self.request("GET", url, **kwargs)
+        return response.json()
+
+    async def post_json(self, url, **kwargs):
+        response = await self.request("POST", url, **kwargs)
+        return response.json()
+
+
+def run_sync(fetch_async, *args, **kwargs):
+    """Runs `fetch_async(http, *args, **kwargs)` to completion on a new loop with its own client."""
+    async def _run():
+        async with AsyncHTTP() as http:
+            return await fetch_async(http, *args, **kwargs)
+    return asyncio.run(_run())
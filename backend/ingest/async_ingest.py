@@ -0,0 +1,59 @@
+"""Concurrent ingestion of many keywords in one process.
+
+`fetch_many` runs every platform connector's `fetch_many` on one event loop
+and one pooled HTTP client, so dozens of keywords are fetched at once while
+the per-host limits in `async_http` and the shared rate-limit buckets still
+apply. Connectors on blocking SDKs (Reddit/PRAW, X/tweepy) run on worker
+threads.
+
+Usage:
+    python backend/ingest/async_ingest.py iphone "taylor swift" --platforms YouTube Instagram
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from backend.ingest.async_http import AsyncHTTP
+from backend.ingest.google_trends_connector import GoogleTrendsConnector
+from backend.ingest.instagram_connector import InstagramConnector
+from backend.ingest.reddit_connector import RedditConnector
+from backend.ingest.twitter_connector import TwitterConnector
+from backend.ingest.youtube_connector import YouTubeConnector
+
+CONNECTORS = {
+    'Google Trends': GoogleTrendsConnector,
+    'Reddit': RedditConnector,
+    'Instagram': InstagramConnector,
+    'X': TwitterConnector,
+    'YouTube': YouTubeConnector,
+}
+
+
+async def fetch_many(keywords, platforms=None, options=None):
+    """
+    Fetches `keywords` from `platforms` (default: all) concurrently.
+
+    `options` maps a platform to extra fetch kwargs, e.g. {'YouTube': {'max_results': 25}}.
+    Returns {'results': {platform: {keyword: success}}, 'http': request/retry counts, 'duration_s'}.
+    """
+    platforms = platforms or list(CONNECTORS)
+    options = options or {}
+    started = time.perf_counter()
+    async with AsyncHTTP() as http:
+        results = await asyncio.gather(*(
+            CONNECTORS[p].fetch_many(keywords, http=http, **options.get(p, {})) for p in platforms
+        ))
+        stats = dict(http.stats)
+    return {'results': dict(zip(platforms, results)), 'http': stats,
+            'duration_s': round(time.perf_counter() - started, 2)}
+
+
+if __name__ == '__main__':
+    import argparse
+    p = argparse.ArgumentParser()
+    p.add_argument('keywords', nargs='+')
+    p.add_argument('--platforms', nargs='*', choices=list(CONNECTORS))
+    args = p.parse_args()
+    print(asyncio.run(fetch_many(args.keywords, platforms=args.platforms)))
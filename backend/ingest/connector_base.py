@@ -1,6 +1,7 @@
 
 # --- .env loader ---
-import os
+import asyncio
+import threading
 import time
 import logging
 from typing import Optional
@@ -10,7 +11,11 @@ try:
 except ImportError:
     pass
 
-from database.db import insert_raw_row
+from database.db import RawDataWriter
+from backend.ingest.rate_limiter import allow_request
+from backend.ingest.async_http import AsyncHTTP, run_sync
+from backend.ingest.ingest_state import as_naive, fetch_since, get_watermark, save_watermarks
+from backend.ingest.seen_filter import get_seen_filter
 
 logger = logging.getLogger(__name__)
 
@@ -18,49 +23,150 @@ logger = logging.getLogger(__name__)
 class ConnectorBase:
     """Base class for ingestion connectors.
 
-    Implementations should provide a `fetch` method that yields or returns
-    normalized rows compatible with `insert_raw_row`.
+    Implementations provide either `fetch_async(http, keyword, ...)`, which
+    makes its requests through the shared `AsyncHTTP` client, or a blocking
+    `fetch(keyword, ...)` for connectors built on synchronous SDKs; each one
+    gets the other for free. Rows passed to `insert_row` are buffered in a
+    `RawDataWriter` that writes its batches on a writer thread, so
+    `insert_row` never blocks the event loop on MySQL; `close()` (or leaving
+    the connector as a context manager) flushes the tail of a run and then
+    advances the ingest watermark (see ingest_state.py) of each keyword the
+    connector called `mark_complete` for to the newest post inserted, unless
+    some of that keyword's rows failed to write. A fetch is complete when it
+    ended normally and either reached the old watermark or ran out of
+    results; a fetch cut short keeps the old watermark so the posts it did
+    not reach are fetched next time.
+
+    Rows for posts already in raw_data whose scores have settled are dropped
+    in `insert_row` by the platform's seen-ID filter (see seen_filter.py).
+
+    `fetch_many(keywords)` fetches many keywords concurrently on one client:
+
+        results = asyncio.run(YouTubeConnector.fetch_many(["iphone", "ai"]))
     """
 
     def __init__(self, platform_name: str):
         self.platform = platform_name
-        # simple per-platform rate limiting (min seconds between requests)
-        # default values can be overridden by environment variables RATE_LIMIT_<PLATFORM>
-        self._last_request_time = 0
-        self.min_interval = self._load_min_interval()
+        self.writer = RawDataWriter(background=True)
+        # newest (post_time, post_id) inserted per keyword this run, and the
+        # keywords whose fetch covered everything since their watermark
+        self._newest = {}
+        self._complete = set()
+        self._newest_lock = threading.Lock()
+        # (keyword, post_id) buffered this run; added to the seen filter once written
+        self.seen = get_seen_filter(platform_name)
+        self._written_ids = []
+
+    def flush(self):
+        """Write any buffered rows to raw_data now."""
+        return self.writer.flush()
+
+    def close(self):
+        """Flush the tail of the run and advance the watermarks; called when the fetch is done."""
+        written = self.writer.close()
+        failed = self.writer.failed_keys
+        failed_keywords = {keyword for keyword, _ in failed}
+        if failed:
+            logger.warning("%s: %d rows failed to write; ingest watermarks of %d keywords not advanced",
+                           self.platform, len(failed), len(failed_keywords))
+        newest = {kw: mark for kw, mark in self._newest.items()
+                  if kw in self._complete and kw not in failed_keywords}
+        partial = len([kw for kw in self._newest if kw not in self._complete])
+        if partial:
+            logger.info("%s: %d keyword fetches did not reach their watermark; keeping the old one",
+                        self.platform, partial)
+        try:
+            save_watermarks(self.platform, newest)
+        except Exception as e:
+            logger.warning("%s: could not save ingest watermarks: %s", self.platform, e)
+        if self.seen is not None:
+            self.seen.add_many([key for key in self._written_ids if key not in failed])
+        self.writer.failed_keys = set()
+        self._newest = {}
+        self._complete = set()
+        self._written_ids = []
+        return written
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
 
     def throttle(self, seconds: float = 1.0):
         time.sleep(seconds)
 
-    def _load_min_interval(self):
-        # platform env var name, e.g., RATE_LIMIT_YOUTUBE
-        key = f"RATE_LIMIT_{self.platform.upper().replace(' ', '_')}"
+    def fetch(self, keyword, **kwargs):
+        """Blocking fetch: runs `fetch_async` on a private event loop and HTTP client."""
+        if type(self).fetch_async is ConnectorBase.fetch_async:
+            raise NotImplementedError(f"{type(self).__name__} must implement fetch or fetch_async")
+        return run_sync(self.fetch_async, keyword, **kwargs)
+
+    async def fetch_async(self, http: AsyncHTTP, keyword, **kwargs):
+        """Async fetch; connectors that only implement the blocking `fetch` run it on a worker thread."""
+        if type(self).fetch is ConnectorBase.fetch:
+            raise NotImplementedError(f"{type(self).__name__} must implement fetch or fetch_async")
+        return await asyncio.to_thread(self.fetch, keyword, **kwargs)
+
+    @classmethod
+    async def fetch_many(cls, keywords, http: Optional[AsyncHTTP] = None, **kwargs):
+        """
+        Fetches every keyword concurrently with one connector (one row writer)
+        and one pooled HTTP client. Returns {keyword: success}; a keyword whose
+        fetch raised is logged and reported as False.
+        """
+        own_client = http is None
+        http = http or AsyncHTTP()
         try:
-            val = os.environ.get(key)
-            if val:
-                return float(val)
-        except Exception:
-            pass
-
-        # default intervals (seconds) per platform
-        defaults = {
-            'Google Trends': 86400.0,  # daily by default
-            'YouTube': 86400.0,        # default to daily search to protect quota (override for testing)
-            'X': 600.0,                # 10 minutes
-            'Reddit': 3600.0,          # 1 hour
-            'Instagram': 86400.0,      # 1 day
-        }
-        return defaults.get(self.platform, 60.0)
-
-    def ensure_rate_limit(self):
-        """Block until min_interval since last request has passed."""
-        now = time.time()
-        elapsed = now - self._last_request_time
-        if elapsed < self.min_interval:
-            to_wait = self.min_interval - elapsed
-            logger.info(f"Rate limit: waiting {to_wait:.1f}s for platform {self.platform}")
-            time.sleep(to_wait)
-        self._last_request_time = time.time()
+            # constructing (SDK clients, seen filter file) and closing (final flush,
+            # watermarks) block on I/O, so both run off the event loop
+            connector = await asyncio.to_thread(cls)
+            try:
+                results = await asyncio.gather(*(connector.fetch_async(http, kw, **kwargs) for kw in keywords),
+                                               return_exceptions=True)
+            finally:
+                await asyncio.to_thread(connector.close)
+        finally:
+            if own_client:
+                await http.aclose()
+        summary = {}
+        for keyword, result in zip(keywords, results):
+            if isinstance(result, Exception):
+                logger.error("%s fetch failed for %s: %s", cls.__name__, keyword, result)
+                result = False
+            summary[keyword] = bool(result)
+        return summary
+
+    def watermark(self, keyword):
+        """(last_post_time, last_post_id) already ingested for this keyword, or (None, None)."""
+        return get_watermark(self.platform, keyword)
+
+    def fetch_since(self, keyword):
+        """Start time for an incremental fetch (watermark minus overlap), or None for a full fetch."""
+        return fetch_since(self.platform, keyword)
+
+    def mark_complete(self, keyword):
+        """Lets `close()` advance this keyword's watermark: its fetch left no gap since the old one."""
+        with self._newest_lock:
+            self._complete.add(keyword)
+
+    def _track_newest(self, keyword, post_time, platform_post_id):
+        post_time = as_naive(post_time)
+        if post_time is None:
+            return
+        with self._newest_lock:
+            current = self._newest.get(keyword)
+            if current is None or post_time > current[0]:
+                self._newest[keyword] = (post_time, str(platform_post_id))
+
+    def try_acquire(self, credential: Optional[str] = None, cost: float = 1.0) -> bool:
+        """Take a token from this platform's shared rate-limit bucket; False means skip the request."""
+        return allow_request(self.platform, credential=credential, cost=cost)
+
+    async def try_acquire_async(self, credential: Optional[str] = None, cost: float = 1.0) -> bool:
+        """`try_acquire` off the event loop (the limiter may wait up to RATE_LIMIT_MAX_WAIT)."""
+        return await asyncio.to_thread(self.try_acquire, credential, cost)
 
     def insert_row(self, platform_post_id: str, keyword: str, post_time, author: Optional[str],
                    title: Optional[str], content: Optional[str], score: Optional[float], url: Optional[str], raw_json: Optional[str]):
@@ -106,6 +212,13 @@ class ConnectorBase:
             except Exception:
                 raw_json_val = None
 
-            insert_raw_row(self.platform, platform_post_id, keyword, post_time, author, title, content, score, url, raw_json_val)
+            if self.seen is not None and self.seen.should_skip(keyword, platform_post_id, as_naive(post_time)):
+                return
+
+            self.writer.add(self.platform, platform_post_id, keyword, post_time, author, title, content, score, url, raw_json_val)
+            self._track_newest(keyword, post_time, platform_post_id)
+            if self.seen is not None:
+                with self._newest_lock:
+                    self._written_ids.append((keyword, platform_post_id))
         except Exception as e:
             logger.exception(f"Failed to insert row for {self.platform}: {e}")
@@ -1,8 +1,9 @@
 """Google Trends connector using SerpAPI (preferred) or pytrends (fallback)."""
 from .connector_base import ConnectorBase
+from .ingest_state import GOOGLE_TRENDS_REFRESH_DAYS, is_fresh
+import asyncio
 import logging
 import os
-import requests
 logger = logging.getLogger(__name__)
 
 class GoogleTrendsConnector(ConnectorBase):
@@ -10,14 +11,18 @@ class GoogleTrendsConnector(ConnectorBase):
         super().__init__('Google Trends')
         self.serpapi_key = os.environ.get('SERPAPI_KEY')
 
-    def fetch(self, keyword, start_date=None, end_date=None):
+    async def fetch_async(self, http, keyword, start_date=None, end_date=None):
         if self.serpapi_key:
-            return self._fetch_serpapi(keyword, start_date, end_date)
+            if not start_date and not end_date and await asyncio.to_thread(
+                    is_fresh, self.platform, keyword, GOOGLE_TRENDS_REFRESH_DAYS):
+                logger.info('Google Trends series for %s is fresh; skipping fetch', keyword)
+                return True
+            return await self._fetch_serpapi(http, keyword, start_date, end_date)
         else:
             logger.warning('SERPAPI_KEY not set. Please set your SerpAPI key in the environment.')
             return False
 
-    def _fetch_serpapi(self, keyword, start_date=None, end_date=None):
+    async def _fetch_serpapi(self, http, keyword, start_date=None, end_date=None):
         # See https://serpapi.com/search-api for docs
         url = 'https://serpapi.com/search.json'
         params = {
@@ -31,10 +36,11 @@ class GoogleTrendsConnector(ConnectorBase):
         if end_date:
             params['date_end'] = end_date
 
+        if not await self.try_acquire_async(self.serpapi_key):
+            return False
+
         try:
-            resp = requests.get(url, params=params, timeout=30)
-            resp.raise_for_status()
-            data = resp.json()
+            data = await http.get_json(url, params=params)
             # Parse timeseries data
             timeline = data.get('timeline', [])
             if not timeline:
@@ -47,12 +53,13 @@ class GoogleTrendsConnector(ConnectorBase):
                                 title=None, content=None, score=float(value) if value is not None else None,
                                 url=None, raw_json=str(entry))
             logger.info('Inserted %d Google Trends rows for %s', len(timeline), keyword)
+            # every fetch returns the whole series
+            self.mark_complete(keyword)
             return True
         except Exception as e:
             logger.exception(f'Error fetching Google Trends from SerpAPI for {keyword}: {e}')
             return False
 
 def fetch_google_trends(keyword, start_date=None, end_date=None):
-    connector = GoogleTrendsConnector()
-    return connector.fetch(keyword, start_date=start_date, end_date=end_date)
-    return connector.fetch(keyword, start_date=start_date, end_date=end_date)
+    with GoogleTrendsConnector() as connector:
+        return connector.fetch(keyword, start_date=start_date, end_date=end_date)
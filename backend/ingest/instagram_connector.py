@@ -1,9 +1,11 @@
 """Instagram connector using Apify Instagram Hashtag Scraper."""
 
 from .connector_base import ConnectorBase
+from .ingest_state import as_naive
+import asyncio
 import logging
 import os
-import requests
+import httpx
 
 logger = logging.getLogger(__name__)
 
@@ -41,7 +43,7 @@ class InstagramConnector(ConnectorBase):
 
         return list(tags)
 
-    def fetch(self, keyword, max_results=50):
+    async def fetch_async(self, http, keyword, max_results=50):
         """
         Fetch Instagram posts for hashtags derived from `keyword` using Apify.
 
@@ -56,8 +58,9 @@ class InstagramConnector(ConnectorBase):
             logger.warning("No hashtags derived from keyword '%s'", keyword)
             return False
 
-        # respect per-platform throttling
-        self.ensure_rate_limit()
+        # respect the shared per-platform/token rate limit; skip rather than wait
+        if not await self.try_acquire_async(self.apify_token):
+            return False
 
         url = f"https://api.apify.com/v2/acts/{self.actor_id}/run-sync-get-dataset-items"
         params = {"token": self.apify_token}
@@ -70,25 +73,34 @@ class InstagramConnector(ConnectorBase):
                     self.actor_id, hashtags, max_results)
 
         try:
-            resp = requests.post(url, params=params, json=payload, timeout=60)
-            resp.raise_for_status()
-            items = resp.json()
+            # the actor runs synchronously; allow it a full minute
+            items = await http.post_json(url, params=params, json=payload, timeout=60)
 
             if not isinstance(items, list):
                 logger.warning("Unexpected Instagram response format: %s", type(items))
                 return False
 
-            inserted_any = False
+            # The actor has no "newer than" input; skip posts already ingested to save writes
+            since = await asyncio.to_thread(self.fetch_since, keyword)
+
+            inserted_any = already_ingested = False
             for item in items:
+                posted = as_naive(item.get("timestamp"))
+                if since is not None and posted is not None and posted < since:
+                    already_ingested = True
+                    continue
                 try:
                     self._process_item(keyword, item)
                     inserted_any = True
                 except Exception:
                     logger.exception("Failed to process Instagram item")
 
-            return inserted_any
+            # a full page of only new posts may not reach the watermark yet
+            if since is None or already_ingested or len(items) < int(max_results):
+                self.mark_complete(keyword)
+            return inserted_any or already_ingested
 
-        except requests.RequestException as e:
+        except (httpx.HTTPError, ValueError) as e:
             logger.error("Error calling Apify Instagram actor: %s", e)
             return False
 
@@ -140,5 +152,5 @@ class InstagramConnector(ConnectorBase):
 
 
 def fetch_instagram_data(keyword, max_results=50):
-    conn = InstagramConnector()
-    return conn.fetch(keyword, max_results=max_results)
+    with InstagramConnector() as conn:
+        return conn.fetch(keyword, max_results=max_results)
@@ -0,0 +1,153 @@
+"""Token-bucket rate limiting shared by every connector process on a host.
+
+Each (platform, API key) pair has one bucket holding up to `capacity` tokens
+(the burst) that refills at `rate` tokens per second. A request takes a token;
+when the bucket is empty the caller is told so immediately (`try_acquire`) or
+waits at most `max_wait` seconds (`acquire`), instead of sleeping until the
+next slot.
+
+Per-platform limits default to DEFAULT_LIMITS and can be overridden with
+RATE_LIMIT_<PLATFORM> (seconds per token, 0 = unlimited) and
+RATE_BURST_<PLATFORM> (bucket capacity).
+
+Bucket state lives in SQLite (RATE_LIMIT_DB_PATH) and every take runs in a
+`BEGIN IMMEDIATE` transaction, so Flask workers, the scheduler and job threads
+all draw from the same buckets. API keys are only stored as a short hash.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_DB_PATH = os.getenv("RATE_LIMIT_DB_PATH", "rate_limits.sqlite3")
+# Seconds a caller may wait for a token before the request is skipped (0 = never wait)
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", 0))
+
+# (seconds per token, burst) per platform; a token is one request, except for
+# YouTube where it is one Data API quota unit
+DEFAULT_LIMITS = {
+    'Google Trends': (900.0, 4),  # SerpAPI searches are billed per call
+    'YouTube': (8.64, 1000),      # 10,000 quota units/day; search.list costs 100, videos.list 1
+    'X': (900.0, 1),              # recent search: 1 request / 15 min on the basic tier
+    'Reddit': (2.0, 10),          # OAuth clients get ~60 requests/min
+    'Instagram': (3600.0, 2),     # every Apify actor run is billed
+}
+
+
+def bucket_key(platform, credential=None):
+    """'<platform>' or '<platform>:<sha1 of the API key, 12 chars>'."""
+    if not credential:
+        return platform
+    return f"{platform}:{hashlib.sha1(credential.encode('utf-8')).hexdigest()[:12]}"
+
+
+def platform_limits(platform):
+    """(refill tokens per second, capacity) for a platform, or None if it is unlimited."""
+    interval, burst = DEFAULT_LIMITS.get(platform, (60.0, 1))
+    name = platform.upper().replace(' ', '_')
+    try:
+        interval = float(os.environ.get(f"RATE_LIMIT_{name}", interval))
+        burst = max(int(os.environ.get(f"RATE_BURST_{name}", burst)), 1)
+    except ValueError:
+        logger.warning("Invalid RATE_LIMIT_%s / RATE_BURST_%s; using defaults", name, name)
+    if interval <= 0:
+        return None
+    return 1.0 / interval, burst
+
+
+class TokenBucketLimiter:
+    def __init__(self, db_path=RATE_LIMIT_DB_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+
+    def _take(self, key, rate, capacity, cost):
+        """Refills and takes `cost` tokens if available. Returns (taken, seconds until enough tokens)."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = self._conn.execute("SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens = capacity if row is None else min(capacity, row["tokens"] + (now - row["updated_at"]) * rate)
+                taken = tokens >= cost
+                if taken:
+                    tokens -= cost
+                self._conn.execute(
+                    "INSERT INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                    (key, tokens, now))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if taken:
+            return True, 0.0
+        return False, (cost - tokens) / rate if rate > 0 else float("inf")
+
+    def try_acquire(self, key, rate, capacity, cost=1.0):
+        """Takes `cost` tokens without waiting. Returns (acquired, retry_after_s)."""
+        return self._take(key, rate, capacity, cost)
+
+    def acquire(self, key, rate, capacity, cost=1.0, max_wait=0.0):
+        """Like try_acquire, but waits up to `max_wait` seconds for the tokens."""
+        deadline = time.monotonic() + max_wait
+        while True:
+            acquired, retry_after = self._take(key, rate, capacity, cost)
+            remaining = deadline - time.monotonic()
+            if acquired or retry_after > remaining:
+                return acquired, retry_after
+            time.sleep(retry_after)
+
+    def snapshot(self):
+        """{key: {tokens, updated_at}} as last written (tokens are refilled lazily on the next take)."""
+        with self._lock:
+            rows = self._conn.execute("SELECT key, tokens, updated_at FROM buckets").fetchall()
+        return {r["key"]: {"tokens": round(r["tokens"], 3), "updated_at": r["updated_at"]} for r in rows}
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Returns the process-wide TokenBucketLimiter, creating it on first use."""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = TokenBucketLimiter()
+    return _limiter
+
+
+def allow_request(platform, credential=None, cost=1.0, max_wait=None):
+    """
+    Takes `cost` tokens from the (platform, credential) bucket. Returns False
+    when the request should be skipped. If the limiter store is unavailable the
+    request is allowed, so a broken SQLite file never stops ingestion.
+    """
+    limits = platform_limits(platform)
+    if limits is None:
+        return True
+    rate, capacity = limits
+    cost = min(cost, capacity)
+    max_wait = RATE_LIMIT_MAX_WAIT if max_wait is None else max_wait
+    try:
+        acquired, retry_after = get_rate_limiter().acquire(bucket_key(platform, credential), rate, capacity,
+                                                           cost=cost, max_wait=max_wait)
+    except sqlite3.Error as e:
+        logger.warning("Rate limiter unavailable (%s); allowing %s request", e, platform)
+        return True
+    if not acquired:
+        logger.info("Rate limit: skipping %s request, next token in %.0fs", platform, retry_after)
+    return acquired
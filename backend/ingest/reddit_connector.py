@@ -14,9 +14,10 @@ class RedditConnector(ConnectorBase):
     def __init__(self):
         super().__init__('Reddit')
         self.reddit = None
+        self.client_id = __import__('os').environ.get('REDDIT_CLIENT_ID')
         if PRAW_AVAILABLE:
             # Expect credentials in env vars
-            client_id = __import__('os').environ.get('REDDIT_CLIENT_ID')
+            client_id = self.client_id
             client_secret = __import__('os').environ.get('REDDIT_CLIENT_SECRET')
             user_agent = __import__('os').environ.get('REDDIT_USER_AGENT', 'trend-analysis-bot')
             if client_id and client_secret:
@@ -30,14 +31,34 @@ class RedditConnector(ConnectorBase):
             logger.warning('praw not available or not configured. Install PRAW and set REDDIT_CLIENT_ID and REDDIT_CLIENT_SECRET.')
             return False
 
+        # PRAW pages search results 100 at a time
+        if not self.try_acquire(self.client_id, cost=max(1, (int(limit) + 99) // 100)):
+            return False
+
         try:
-            for submission in self.reddit.subreddit('all').search(keyword, limit=limit):
+            # incremental: newest first, stopping at the last ingested post
+            since = self.fetch_since(keyword)
+            if since is None:
+                results = self.reddit.subreddit('all').search(keyword, limit=limit)
+            else:
+                results = self.reddit.subreddit('all').search(keyword, sort='new', limit=limit)
+            # the watermark may only advance once the walk reached it or ran out of posts;
+            # a walk cut off by `limit` would otherwise skip the posts in between
+            seen = 0
+            reached_since = since is None
+            for submission in results:
+                seen += 1
                 post_time = __import__('datetime').datetime.fromtimestamp(submission.created_utc)
+                if since is not None and post_time < since:
+                    reached_since = True
+                    break
                 content = submission.title + '\n' + (submission.selftext or '')
                 self.insert_row(platform_post_id=submission.id, keyword=keyword, post_time=post_time,
                                 author=str(submission.author), title=submission.title, content=content,
                                 score=float(submission.score) if submission.score is not None else None,
                                 url=submission.url, raw_json=str({'id': submission.id}))
+            if reached_since or limit is None or seen < limit:
+                self.mark_complete(keyword)
             return True
         except Exception as e:
             logger.exception(f'Error fetching Reddit data: {e}')
@@ -45,5 +66,5 @@ class RedditConnector(ConnectorBase):
 
 
 def fetch_reddit_data(keyword, limit=100):
-    conn = RedditConnector()
-    return conn.fetch(keyword, limit=limit)
+    with RedditConnector() as conn:
+        return conn.fetch(keyword, limit=limit)
@@ -0,0 +1,282 @@
+"""Per-platform filter of already-ingested posts, checked before rows reach MySQL.
+
+Each platform has a Bloom filter over "<keyword>\\x1f<platform_post_id>". It is
+loaded from SEEN_FILTER_DIR, or warmed from raw_data on a background thread
+(started by `warm_seen_filters` at process start, or on first use), and saved
+back after connector runs (at most every SEEN_FILTER_SAVE_SECONDS) and at exit.
+Until a filter is warmed it skips nothing and is never saved, so a run with
+MySQL unreachable cannot leave an empty filter on disk; a failed warm is
+retried after SEEN_FILTER_WARM_RETRY_SECONDS.
+
+`ConnectorBase.insert_row` skips a row when the filter has seen it and the
+post is older than SEEN_FILTER_SETTLE_HOURS. Newer posts are still upserted
+so their scores (views, likes) keep updating, and Google Trends points are
+never skipped since their latest values get revised.
+
+A Bloom filter never misses a key it holds, but reports an unseen key as seen
+with probability SEEN_FILTER_FP_RATE at the configured capacity; such a post
+is not stored. Keys are only added after their batch was written, and a
+filter whose count outgrew its capacity is rebuilt from raw_data with double
+the capacity the next time it is loaded.
+"""
+import atexit
+import hashlib
+import logging
+import math
+import os
+import struct
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from database.db import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+SEEN_FILTER_ENABLED = os.environ.get('SEEN_FILTER_ENABLED', '1') == '1'
+SEEN_FILTER_DIR = os.environ.get('SEEN_FILTER_DIR', 'seen_filters')
+SEEN_FILTER_CAPACITY = int(os.environ.get('SEEN_FILTER_CAPACITY', 1_000_000))
+SEEN_FILTER_FP_RATE = float(os.environ.get('SEEN_FILTER_FP_RATE', 0.001))
+SEEN_FILTER_SETTLE_HOURS = float(os.environ.get('SEEN_FILTER_SETTLE_HOURS', 48))
+SEEN_FILTER_SAVE_SECONDS = float(os.environ.get('SEEN_FILTER_SAVE_SECONDS', 300))
+SEEN_FILTER_WARM_RETRY_SECONDS = float(os.environ.get('SEEN_FILTER_WARM_RETRY_SECONDS', 60))
+SEEN_FILTER_PLATFORMS = [p.strip() for p in os.environ.get(
+    'SEEN_FILTER_PLATFORMS', 'Reddit,X,Instagram,YouTube').split(',') if p.strip()]
+
+_HEADER = struct.Struct('<4sQIQQd?')  # magic, bits, hashes, count, capacity, fp_rate, warmed
+_MAGIC = b'BLM2'
+
+
+def seen_key(keyword, platform_post_id):
+    return f"{keyword}\x1f{platform_post_id}"
+
+
+class BloomFilter:
+    def __init__(self, capacity, fp_rate, bits=None, hashes=None, data=None, count=0, warmed=False):
+        self.capacity = max(int(capacity), 1)
+        self.fp_rate = fp_rate
+        self.bits = bits or max(8, int(-self.capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.hashes = hashes or max(1, round(self.bits / self.capacity * math.log(2)))
+        self.data = data if data is not None else bytearray((self.bits + 7) // 8)
+        self.count = count
+        # holds every key in raw_data (warmed or loaded from a warmed file)
+        self.warmed = warmed
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1, h2 = struct.unpack('<QQ', digest)
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def __contains__(self, key):
+        return all(self.data[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    def add(self, key):
+        """Adds `key`; returns False if it (probably) was already present."""
+        new = False
+        for p in self._positions(key):
+            mask = 1 << (p & 7)
+            if not self.data[p >> 3] & mask:
+                self.data[p >> 3] |= mask
+                new = True
+        if new:
+            self.count += 1
+        return new
+
+    def estimated_fp_rate(self):
+        return (1 - math.exp(-self.hashes * self.count / self.bits)) ** self.hashes
+
+    def save(self, path):
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, self.bits, self.hashes, self.count, self.capacity, self.fp_rate,
+                                 self.warmed))
+            f.write(self.data)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            magic, bits, hashes, count, capacity, fp_rate, warmed = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != _MAGIC:
+                # BLM1 files carry no warmed flag and may have been saved empty
+                raise ValueError(f"{path} is not a current seen-ID filter")
+            data = bytearray(f.read())
+        if len(data) != (bits + 7) // 8:
+            raise ValueError(f"{path} is truncated")
+        return cls(capacity, fp_rate, bits=bits, hashes=hashes, data=data, count=count, warmed=warmed)
+
+
+class SeenFilter:
+    """Seen-ID filter and hit counters for one platform."""
+
+    def __init__(self, platform):
+        self.platform = platform
+        self.path = os.path.join(SEEN_FILTER_DIR, platform.lower().replace(' ', '_') + '.bloom')
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self._stats = {'checks': 0, 'hits': 0, 'added': 0, 'warmed_rows': 0}
+        # keys added while a warm runs, replayed into the warmed filter
+        self._pending = []
+        self._warming = False
+        self._last_warm_attempt = None
+        self.bloom = self._load()
+        if not self.bloom.warmed or self.bloom.count > self.bloom.capacity:
+            self.start_warm()
+
+    def _load(self):
+        """Filter saved in SEEN_FILTER_DIR, or an empty unwarmed one."""
+        try:
+            bloom = BloomFilter.load(self.path)
+            if bloom.count > bloom.capacity:
+                # still served until the bigger rebuild replaces it
+                logger.info("%s seen filter is over capacity (%d > %d); rebuilding", self.platform,
+                            bloom.count, bloom.capacity)
+            return bloom
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning("Could not load %s seen filter (%s); rebuilding", self.platform, e)
+        return BloomFilter(SEEN_FILTER_CAPACITY, SEEN_FILTER_FP_RATE)
+
+    def start_warm(self):
+        """Rebuilds the filter from raw_data on a background thread unless a warm is running."""
+        with self._lock:
+            if self._warming:
+                return
+            self._warming = True
+            self._last_warm_attempt = time.monotonic()
+            capacity = self.bloom.count * 2 if self.bloom.count > self.bloom.capacity else None
+        threading.Thread(target=self._warm, args=(capacity,), name=f"seen-warm-{self.platform}",
+                         daemon=True).start()
+
+    def _warm(self, capacity=None):
+        """Builds the filter from raw_data (streamed, so large tables are not held in memory) and swaps it in."""
+        try:
+            conn = get_db_connection()
+            if conn is None:
+                logger.warning("Could not warm %s seen filter: no DB connection", self.platform)
+                return
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT COUNT(*) FROM raw_data WHERE platform = %s", (self.platform,))
+                (rows,) = cursor.fetchone()
+                bloom = BloomFilter(max(capacity or SEEN_FILTER_CAPACITY, rows * 2), SEEN_FILTER_FP_RATE)
+                cursor.close()
+                cursor = conn.cursor(buffered=False)
+                cursor.execute("SELECT keyword, platform_post_id FROM raw_data WHERE platform = %s", (self.platform,))
+                while True:
+                    batch = cursor.fetchmany(10000)
+                    if not batch:
+                        break
+                    for keyword, post_id in batch:
+                        bloom.add(seen_key(keyword, post_id))
+            finally:
+                cursor.close()
+                conn.close()
+            with self._lock:
+                for key in self._pending:
+                    bloom.add(key)
+                self._pending = []
+                bloom.warmed = True
+                self.bloom = bloom
+                self._stats['warmed_rows'] = rows
+                self._dirty = True
+            logger.info("Warmed %s seen filter from %d raw_data rows", self.platform, rows)
+        except Exception as e:
+            logger.warning("Could not warm %s seen filter: %s", self.platform, e)
+        finally:
+            with self._lock:
+                self._warming = False
+
+    def should_skip(self, keyword, platform_post_id, post_time):
+        """True if the post was already ingested and is old enough that its score has settled."""
+        with self._lock:
+            self._stats['checks'] += 1
+            if not self.bloom.warmed:
+                return False
+            if post_time is None or datetime.now() - post_time < timedelta(hours=SEEN_FILTER_SETTLE_HOURS):
+                return False
+            if seen_key(keyword, platform_post_id) in self.bloom:
+                self._stats['hits'] += 1
+                return True
+            return False
+
+    def add_many(self, keys):
+        """Records written (keyword, platform_post_id) pairs; saves if the last save is old enough."""
+        with self._lock:
+            for keyword, post_id in keys:
+                key = seen_key(keyword, post_id)
+                if self._warming:
+                    self._pending.append(key)
+                if self.bloom.add(key):
+                    self._stats['added'] += 1
+                    self._dirty = True
+            due = self._dirty and time.monotonic() - self._last_save >= SEEN_FILTER_SAVE_SECONDS
+            retry_warm = (not self.bloom.warmed and not self._warming and
+                          time.monotonic() - self._last_warm_attempt >= SEEN_FILTER_WARM_RETRY_SECONDS)
+        if retry_warm:
+            self.start_warm()
+        if due:
+            self.save()
+
+    def save(self):
+        with self._lock:
+            # an unwarmed filter only holds this run's keys; saving it would stop it ever being warmed
+            if not self._dirty or not self.bloom.warmed:
+                return
+            try:
+                os.makedirs(SEEN_FILTER_DIR, exist_ok=True)
+                self.bloom.save(self.path)
+                self._dirty = False
+                self._last_save = time.monotonic()
+            except OSError as e:
+                logger.warning("Could not save %s seen filter: %s", self.platform, e)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update(warmed=self.bloom.warmed, warming=self._warming, keys=self.bloom.count, capacity=self.bloom.capacity,
+                         size_bytes=len(self.bloom.data), hashes=self.bloom.hashes,
+                         target_fp_rate=self.bloom.fp_rate,
+                         estimated_fp_rate=round(self.bloom.estimated_fp_rate(), 6))
+        stats['hit_rate'] = stats['hits'] / stats['checks'] if stats['checks'] else 0.0
+        return stats
+
+
+_filters = {}
+_filters_lock = threading.Lock()
+
+
+def get_seen_filter(platform):
+    """Returns the process-wide SeenFilter for `platform`, or None if the platform is not filtered."""
+    if not SEEN_FILTER_ENABLED or platform not in SEEN_FILTER_PLATFORMS:
+        return None
+    seen = _filters.get(platform)
+    if seen is None:
+        with _filters_lock:
+            seen = _filters.get(platform)
+            if seen is None:
+                seen = _filters[platform] = SeenFilter(platform)
+    return seen
+
+
+def warm_seen_filters():
+    """Loads every platform filter at process start; ones not yet warmed warm in the background."""
+    for platform in SEEN_FILTER_PLATFORMS:
+        get_seen_filter(platform)
+
+
+def get_seen_stats():
+    """{platform: stats} for the filters loaded in this process."""
+    with _filters_lock:
+        filters = dict(_filters)
+    return {platform: seen.stats() for platform, seen in filters.items()}
+
+
+@atexit.register
+def _save_all():
+    for seen in list(_filters.values()):
+        seen.save()
@@ -16,8 +16,9 @@ class TwitterConnector(ConnectorBase):
     def __init__(self):
         super().__init__('X')
         self.client = None
+        self.bearer_token = os.environ.get('TWITTER_BEARER_TOKEN')
         if TWEEPY_AVAILABLE:
-            bearer = __import__('os').environ.get('TWITTER_BEARER_TOKEN')
+            bearer = self.bearer_token
             if bearer:
                 try:
                     self.client = tweepy.Client(bearer_token=bearer, wait_on_rate_limit=False)
@@ -29,17 +30,28 @@ class TwitterConnector(ConnectorBase):
             logger.warning('tweepy not available or not configured. Set TWITTER_BEARER_TOKEN env var.')
             return False
 
+        if not self.try_acquire(self.bearer_token):
+            return False
+
         try:
             query = f"{keyword} -is:retweet lang:en"
+            # incremental: tweet ids increase over time, so only ask for ones after the last stored
+            _, last_id = self.watermark(keyword)
             resp = self.client.search_recent_tweets(
                 query=query,
                 max_results=min(100, max_results),
-                tweet_fields=['created_at', 'author_id', 'public_metrics']
+                tweet_fields=['created_at', 'author_id', 'public_metrics'],
+                since_id=last_id if last_id and last_id.isdigit() else None
             )
             if not resp or not resp.data:
                 logger.info("No tweets returned for keyword %s", keyword)
                 return True  # no error, just no data
 
+            # one page of newest tweets; a next_token after since_id means the page
+            # did not reach the watermark, so it must not advance past the gap
+            if not last_id or not (getattr(resp, 'meta', None) or {}).get('next_token'):
+                self.mark_complete(keyword)
+
             for t in resp.data:
                 post_time = t.created_at
                 content = t.text
@@ -73,5 +85,5 @@ class TwitterConnector(ConnectorBase):
 
 
 def fetch_twitter_data(keyword, max_results=10):
-    conn = TwitterConnector()
-    return conn.fetch(keyword, max_results=max_results)
+    with TwitterConnector() as conn:
+        return conn.fetch(keyword, max_results=max_results)
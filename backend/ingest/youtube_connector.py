@@ -1,13 +1,24 @@
-"""YouTube connector using simple REST API calls with requests."""
+"""YouTube connector using simple REST API calls over the async HTTP client."""
 from .connector_base import ConnectorBase
+import asyncio
 import logging
 import os
-import requests
-import time
 
 logger = logging.getLogger(__name__)
 
 
+SEARCH_URL = 'https://www.googleapis.com/youtube/v3/search'
+VIDEOS_URL = 'https://www.googleapis.com/youtube/v3/videos'
+# Data API quota cost per call
+SEARCH_UNITS = 100
+VIDEOS_UNITS = 1
+PAGE_SIZE = 50
+
+# Videos wanted per keyword, and quota units one fetch may spend (search pages + videos.list)
+YOUTUBE_MAX_RESULTS = int(os.environ.get('YOUTUBE_MAX_RESULTS', 200))
+YOUTUBE_QUOTA_BUDGET = int(os.environ.get('YOUTUBE_QUOTA_BUDGET', 500))
+
+
 class YouTubeConnector(ConnectorBase):
     def __init__(self):
         super().__init__('YouTube')
@@ -16,120 +27,159 @@ class YouTubeConnector(ConnectorBase):
             print("[YouTubeConnector] YOUTUBE_API_KEY present?: True")
         else:
             print("[YouTubeConnector] YOUTUBE_API_KEY present?: False")
+        # per-keyword quota report of the last fetch
+        self.quota_reports = {}
 
-    def fetch(self, keyword, max_results=25):
+    async def _videos_chunk(self, http, keyword, video_ids, report):
+        """
+        videos.list for up to 50 IDs; inserts the rows and returns how many were
+        inserted. Its VIDEOS_UNITS are reserved in `report` when it is scheduled.
+        """
+        if not await self.try_acquire_async(self.api_key, cost=VIDEOS_UNITS):
+            print(f"[YouTubeConnector] Rate limited; skipping videos.list for {len(video_ids)} IDs")
+            report['units'] -= VIDEOS_UNITS
+            return 0
+        report['videos_calls'] += 1
+        vdata = await http.get_json(VIDEOS_URL, params={
+            'part': 'snippet,statistics',
+            'id': ','.join(video_ids),
+            'key': self.api_key
+        })
+
+        inserted = 0
+        for v in vdata.get('items', []):
+            vid = v.get('id')
+            snippet = v.get('snippet', {})
+            stats = v.get('statistics', {})
+
+            score = None
+            if stats and stats.get('viewCount'):
+                try:
+                    score = float(stats.get('viewCount'))
+                except Exception:
+                    score = None
+
+            # buffered by the RawDataWriter and written in batches
+            self.insert_row(
+                platform_post_id=vid,
+                keyword=keyword,
+                post_time=snippet.get('publishedAt'),  # ISO string
+                author=snippet.get('channelTitle'),
+                title=snippet.get('title'),
+                content=snippet.get('description'),
+                score=score,
+                url=f"https://www.youtube.com/watch?v={vid}",
+                raw_json=str(v)
+            )
+            inserted += 1
+        return inserted
+
+    async def fetch_async(self, http, keyword, max_results=None, quota_budget=None):
         """
         Fetch YouTube videos for a keyword and store them into raw_data.
-        Uses ONLY requests (no googleapiclient). Includes verbose debug logs.
+
+        Follows search.list `nextPageToken` (50 results, 100 units per page)
+        until `max_results` videos or `quota_budget` units are reached. The
+        statistics of each page are requested with one videos.list call per
+        50 IDs (1 unit), run concurrently with the next search page.
+        The quota spent is printed and kept in `self.quota_reports[keyword]`.
+        An incremental search only advances the watermark once it ran out of
+        pages (stopped_by 'no_more_pages').
         """
         if not self.api_key:
             logger.warning('YOUTUBE_API_KEY not configured. Set YOUTUBE_API_KEY in environment or .env')
             return False
 
-        try:
-            # --- 1) SEARCH: get video IDs ---
-            search_url = 'https://www.googleapis.com/youtube/v3/search'
-            max_results = min(25, max_results)
+        max_results = max_results or YOUTUBE_MAX_RESULTS
+        quota_budget = quota_budget or YOUTUBE_QUOTA_BUDGET
+        report = {'search_pages': 0, 'videos_calls': 0, 'units': 0, 'budget': quota_budget,
+                  'video_ids': 0, 'inserted': 0, 'stopped_by': 'results'}
+        self.quota_reports[keyword] = report
+        chunks = []
 
+        try:
             search_params = {
                 'part': 'snippet',
                 'q': keyword,
                 'type': 'video',
-                'maxResults': max_results,
+                'maxResults': PAGE_SIZE,
                 'key': self.api_key
             }
+            # incremental: only videos published since the last ingested one, newest first
+            since = await asyncio.to_thread(self.fetch_since, keyword)
+            if since is not None:
+                search_params['publishedAfter'] = since.strftime('%Y-%m-%dT%H:%M:%SZ')
+                search_params['order'] = 'date'
 
             print(f"[YouTubeConnector] Starting REST search for keyword='{keyword}'")
-            search_resp = requests.get(search_url, params=search_params, timeout=30)
-            print(f"[YouTubeConnector] search.status_code: {search_resp.status_code}")
-
-            search_resp.raise_for_status()
-            search_data = search_resp.json()
-
-            # Debug: tiny snippet
-            print("[YouTubeConnector] search.raw_response snippet:",
-                  str(search_data)[:400])
-
-            items = search_data.get('items', [])
-            if not items:
+            page_token = None
+            while report['video_ids'] < max_results:
+                # keep room for this page's videos.list call
+                if report['units'] + SEARCH_UNITS + VIDEOS_UNITS > quota_budget:
+                    report['stopped_by'] = 'quota_budget'
+                    break
+                # quota units are the YouTube rate-limit tokens
+                if not await self.try_acquire_async(self.api_key, cost=SEARCH_UNITS):
+                    print(f"[YouTubeConnector] Rate limited; stopping YouTube search for '{keyword}'")
+                    report['stopped_by'] = 'rate_limit'
+                    break
+
+                params = dict(search_params, maxResults=min(PAGE_SIZE, max_results - report['video_ids']))
+                if page_token:
+                    params['pageToken'] = page_token
+                search_data = await http.get_json(SEARCH_URL, params=params)
+                report['search_pages'] += 1
+                report['units'] += SEARCH_UNITS
+
+                video_ids = [
+                    it['id']['videoId']
+                    for it in search_data.get('items', [])
+                    if it.get('id') and it['id'].get('videoId')
+                ]
+                report['video_ids'] += len(video_ids)
+                if video_ids:
+                    # reserve the call's units now, so the budget check before the
+                    # next page counts chunks that are still in flight
+                    report['units'] += VIDEOS_UNITS
+                    chunks.append(asyncio.ensure_future(self._videos_chunk(http, keyword, video_ids, report)))
+
+                page_token = search_data.get('nextPageToken')
+                if not page_token or not video_ids:
+                    report['stopped_by'] = 'no_more_pages'
+                    break
+
+            results = await asyncio.gather(*chunks, return_exceptions=True)
+            for r in results:
+                if isinstance(r, Exception):
+                    logger.error('YouTube videos.list failed for %s: %s', keyword, r)
+                else:
+                    report['inserted'] += r
+
+            print(f"[YouTubeConnector] '{keyword}': {report['search_pages']} search pages, "
+                  f"{report['videos_calls']} videos.list calls, {report['units']}/{quota_budget} quota units, "
+                  f"{report['inserted']} rows ({report['stopped_by']})")
+            # publishedAfter + order=date reads newest first: a search cut short by
+            # max_results, the quota budget or the rate limit never reached the old
+            # watermark, so it is kept and the unread pages are searched next time.
+            # A first fetch is a relevance sample with no watermark to reach.
+            failed_chunks = any(isinstance(r, Exception) for r in results)
+            if not failed_chunks and (report['stopped_by'] == 'no_more_pages'
+                                      or (since is None and report['stopped_by'] == 'results')):
+                self.mark_complete(keyword)
+            if not report['video_ids']:
                 print("[YouTubeConnector] No YouTube search results.")
-                return False
-
-            video_ids = [
-                it['id']['videoId']
-                for it in items
-                if it.get('id') and it['id'].get('videoId')
-            ]
-            print(f"[YouTubeConnector] Found {len(video_ids)} video IDs")
-
-            if not video_ids:
-                return False
-
-            # --- 2) VIDEOS: get stats for those IDs ---
-            vids_url = 'https://www.googleapis.com/youtube/v3/videos'
-            vids_params = {
-                'part': 'snippet,statistics',
-                'id': ','.join(video_ids),
-                'key': self.api_key
-            }
-
-            print(f"[YouTubeConnector] Requesting videos.list for {len(video_ids)} IDs...")
-            vids_resp = requests.get(vids_url, params=vids_params, timeout=30)
-            print(f"[YouTubeConnector] videos.status_code: {vids_resp.status_code}")
-
-            vids_resp.raise_for_status()
-            vdata = vids_resp.json()
-            print("[YouTubeConnector] videos.raw_response snippet:",
-                  str(vdata)[:400])
-
-            items = vdata.get('items', [])
-            if not items:
-                print("[YouTubeConnector] No video items returned in videos.list.")
-                return False
-
-            inserted = 0
-            for v in items:
-                vid = v.get('id')
-                snippet = v.get('snippet', {})
-                stats = v.get('statistics', {})
-
-                post_time = snippet.get('publishedAt')  # ISO string
-                title = snippet.get('title')
-                description = snippet.get('description')
-                author = snippet.get('channelTitle')
-
-                score = None
-                if stats and stats.get('viewCount'):
-                    try:
-                        score = float(stats.get('viewCount'))
-                    except Exception:
-                        score = None
-
-                # small sleep to be nice to DB
-                time.sleep(0.05)
-
-                self.insert_row(
-                    platform_post_id=vid,
-                    keyword=keyword,
-                    post_time=post_time,
-                    author=author,
-                    title=title,
-                    content=description,
-                    score=score,
-                    url=f"https://www.youtube.com/watch?v={vid}",
-                    raw_json=str(v)
-                )
-                inserted += 1
-
-            print(f"[YouTubeConnector] Inserted {inserted} YouTube rows for '{keyword}'")
-            return True
+                # nothing new since the watermark is not a failure
+                return since is not None and report['stopped_by'] == 'no_more_pages'
+            return report['inserted'] > 0
 
         except Exception as e:
+            # let in-flight videos.list calls finish so their rows are still written
+            await asyncio.gather(*chunks, return_exceptions=True)
             logger.exception(f'Error fetching YouTube data: {e}')
             print(f"[YouTubeConnector] Exception in fetch(): {e}")
             return False
 
 
-def fetch_youtube_data(keyword, max_results=25):
-    conn = YouTubeConnector()
-    return conn.fetch(keyword, max_results=max_results)
+def fetch_youtube_data(keyword, max_results=None, quota_budget=None):
+    with YouTubeConnector() as conn:
+        return conn.fetch(keyword, max_results=max_results, quota_budget=quota_budget)
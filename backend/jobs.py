@@ -0,0 +1,219 @@
+"""Background job queue for long-running pipeline work.
+
+Jobs run on an in-process worker pool; their state lives in SQLite so no
+external broker is needed. By default the store is an in-memory database
+private to the process. Set JOB_DB_PATH to a file so that several Flask
+workers on one host share job state and in-flight de-duplication.
+
+Job state:
+    status: queued | running | succeeded | failed
+    stages: {name: {status, started_at, finished_at, duration_s, error}}
+
+Submitting a job with the same `dedupe_key` as a queued/running job returns
+the existing job instead of starting a new one.
+
+Each process refreshes `heartbeat_at` of its queued/running jobs every
+JOB_HEARTBEAT_SECONDS. A job whose heartbeat is older than JOB_STALE_SECONDS
+was stranded by a crashed or restarted worker: it is marked failed when a
+queue starts and before every dedupe check, so it never blocks new jobs.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", ":memory:")
+JOB_MAX_WORKERS = int(os.getenv("JOB_MAX_WORKERS", 2))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", 30))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", 300))
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class JobQueue:
+    def __init__(self, db_path=JOB_DB_PATH, max_workers=JOB_MAX_WORKERS):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                dedupe_key TEXT,
+                params TEXT,
+                status TEXT NOT NULL,
+                stages TEXT NOT NULL DEFAULT '{}',
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                heartbeat_at REAL
+            )
+        """)
+        columns = {r["name"] for r in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "heartbeat_at" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_dedupe ON jobs (dedupe_key, status)")
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        # queued/running jobs owned by this process, kept alive by the heartbeat thread
+        self._active = set()
+        with self._lock:
+            self._reap_stale()
+        threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True).start()
+
+    # --- storage helpers ---
+    def _update(self, job_id, **fields):
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {cols} WHERE id = ?", (*fields.values(), job_id))
+
+    def _set_stage(self, job_id, name, **info):
+        with self._lock:
+            row = self._conn.execute("SELECT stages FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            stages = json.loads(row["stages"]) if row else {}
+            stages.setdefault(name, {}).update(info)
+            self._conn.execute("UPDATE jobs SET stages = ? WHERE id = ?", (json.dumps(stages), job_id))
+
+    def _reap_stale(self):
+        """Marks active jobs without a recent heartbeat as failed; call with self._lock held."""
+        now = time.time()
+        self._conn.execute(
+            "UPDATE jobs SET status = 'failed', error = 'worker stopped before the job finished', finished_at = ? "
+            "WHERE status IN (?, ?) AND COALESCE(heartbeat_at, created_at) < ?",
+            (now, *ACTIVE_STATUSES, now - JOB_STALE_SECONDS))
+
+    def _heartbeat_loop(self):
+        while True:
+            time.sleep(JOB_HEARTBEAT_SECONDS)
+            with self._lock:
+                ids = list(self._active)
+                if not ids:
+                    continue
+                try:
+                    self._conn.execute(
+                        f"UPDATE jobs SET heartbeat_at = ? WHERE id IN ({', '.join('?' * len(ids))})",
+                        (time.time(), *ids))
+                except sqlite3.Error as e:
+                    # a missed beat is retried next interval; JOB_STALE_SECONDS allows several
+                    print(f"⚠️ Job heartbeat failed: {e}")
+
+    @staticmethod
+    def _to_dict(row):
+        job = dict(row)
+        for key in ("params", "stages", "result"):
+            if job.get(key) is not None:
+                job[key] = json.loads(job[key])
+        if job.get("started_at"):
+            end = job.get("finished_at") or time.time()
+            job["duration_s"] = round(end - job["started_at"], 3)
+        return job
+
+    # --- public API ---
+    def submit(self, kind, fn, params=None, dedupe_key=None):
+        """
+        Queues `fn(stage=..., **params)` and returns (job_dict, attached).
+
+        `fn` receives a `stage(name)` context manager factory for reporting
+        per-stage progress. `attached` is True when an in-flight job with the
+        same `dedupe_key` was returned instead of a new one.
+        """
+        params = params or {}
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE takes the write lock so concurrent submitters (including
+            # other processes sharing JOB_DB_PATH) can't both miss the dedupe check
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._reap_stale()
+                if dedupe_key is not None:
+                    existing = self._conn.execute(
+                        "SELECT * FROM jobs WHERE dedupe_key = ? AND status IN (?, ?) ORDER BY created_at DESC LIMIT 1",
+                        (dedupe_key, *ACTIVE_STATUSES)).fetchone()
+                    if existing:
+                        self._conn.execute("COMMIT")
+                        return self._to_dict(existing), True
+                self._conn.execute(
+                    "INSERT INTO jobs (id, kind, dedupe_key, params, status, created_at, heartbeat_at) "
+                    "VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+                    (job_id, kind, dedupe_key, json.dumps(params, default=str), now, now))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._active.add(job_id)
+
+        self._executor.submit(self._run, job_id, fn, params)
+        return self.get(job_id), False
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, status=None, limit=50):
+        query = "SELECT * FROM jobs"
+        params = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(int(limit))
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [self._to_dict(r) for r in rows]
+
+    def _stage_recorder(self, job_id):
+        @contextmanager
+        def stage(name):
+            started = time.time()
+            self._set_stage(job_id, name, status="running", started_at=started)
+            try:
+                yield
+            except Exception as e:
+                finished = time.time()
+                self._set_stage(job_id, name, status="failed", finished_at=finished,
+                                duration_s=round(finished - started, 3), error=str(e))
+                raise
+            finished = time.time()
+            self._set_stage(job_id, name, status="succeeded", finished_at=finished,
+                            duration_s=round(finished - started, 3))
+        return stage
+
+    def _run(self, job_id, fn, params):
+        started = time.time()
+        self._update(job_id, status="running", started_at=started, heartbeat_at=started)
+        try:
+            result = fn(stage=self._stage_recorder(job_id), **params)
+            ok = not (isinstance(result, dict) and result.get("success") is False)
+            self._update(job_id,
+                         status="succeeded" if ok else "failed",
+                         result=json.dumps(result, default=str),
+                         error=None if ok else (result.get("error") or result.get("reason")),
+                         finished_at=time.time())
+        except Exception as e:
+            traceback.print_exc()
+            self._update(job_id, status="failed", error=str(e), finished_at=time.time())
+        finally:
+            with self._lock:
+                self._active.discard(job_id)
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Returns the process-wide JobQueue, creating it on first use."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue()
+    return _queue
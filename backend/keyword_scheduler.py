@@ -0,0 +1,197 @@
+"""Adaptive keyword scheduling for scheduler.py.
+
+Instead of re-running every tracked keyword on one fixed interval, each
+keyword gets its own interval from how fast it is being mentioned:
+
+    velocity      social mentions per hour over the last SCHEDULE_VELOCITY_HOURS
+                  (raw_data, Google Trends excluded)
+    acceleration  (recent rate + 1) / (baseline rate + 1), the baseline being the
+                  last SCHEDULE_BASELINE_DAYS of raw_data or, for keywords whose
+                  raw rows have aged out, their trend_aggregates daily mentions
+    heat          (1 + log1p(velocity)) * acceleration
+    interval      SCHEDULE_BASE_INTERVAL / heat, clipped to [min, max]
+
+A keyword is due once the time since its last run reaches its interval;
+keywords that never ran are due at once. Every run is planned at
+SCHEDULE_CALLS_PER_RUN API calls and charged one call per platform fetch it
+actually started, against a rolling SCHEDULE_API_BUDGET_PER_HOUR.
+When the intervals together would need more calls than the budget, they are
+all stretched by the same factor, so hot keywords stay relatively more
+frequent, and each tick only starts the most overdue keywords that fit in
+what is left of the last hour's budget.
+
+Each keyword's last run time and the spent calls live in SQLite
+(SCHEDULE_DB_PATH), so restarts keep both. The last run time only decides
+when a keyword is next due; what each platform fetch asks its API for is
+decided by the ingest watermarks (backend/ingest/ingest_state.py).
+"""
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from database.db import get_db_connection
+
+SCHEDULE_DB_PATH = os.getenv("SCHEDULE_DB_PATH", "keyword_schedule.sqlite3")
+SCHEDULE_BASE_INTERVAL = float(os.getenv("SCHEDULE_BASE_INTERVAL_HOURS", 6)) * 3600
+SCHEDULE_MIN_INTERVAL = float(os.getenv("SCHEDULE_MIN_INTERVAL_MINUTES", 30)) * 60
+SCHEDULE_MAX_INTERVAL = float(os.getenv("SCHEDULE_MAX_INTERVAL_HOURS", 24)) * 3600
+SCHEDULE_VELOCITY_HOURS = int(os.getenv("SCHEDULE_VELOCITY_HOURS", 6))
+SCHEDULE_BASELINE_DAYS = int(os.getenv("SCHEDULE_BASELINE_DAYS", 7))
+SCHEDULE_API_BUDGET_PER_HOUR = int(os.getenv("SCHEDULE_API_BUDGET_PER_HOUR", 60))
+# One call per platform fetch in backend/pipeline.py
+SCHEDULE_CALLS_PER_RUN = int(os.getenv("SCHEDULE_CALLS_PER_RUN", 5))
+
+
+def keyword_activity(keywords):
+    """
+    Returns {keyword: {velocity, baseline_rate, last_post_time}} from raw_data,
+    falling back to trend_aggregates for the baseline. Keywords without any
+    data are left out.
+    """
+    if not keywords:
+        return {}
+    conn = get_db_connection()
+    if conn is None:
+        return {}
+    cursor = conn.cursor(dictionary=True)
+    placeholders = ", ".join(["%s"] * len(keywords))
+    try:
+        cursor.execute(
+            "SELECT keyword, MAX(post_time) AS last_post_time, "
+            "SUM(post_time >= NOW() - INTERVAL %s HOUR) AS recent, COUNT(*) AS baseline "
+            "FROM raw_data WHERE platform <> 'Google Trends' AND post_time >= NOW() - INTERVAL %s DAY "
+            f"AND keyword IN ({placeholders}) GROUP BY keyword",
+            (SCHEDULE_VELOCITY_HOURS, SCHEDULE_BASELINE_DAYS, *keywords))
+        activity = {}
+        for r in cursor.fetchall():
+            activity[r['keyword']] = {
+                'velocity': float(r['recent'] or 0) / SCHEDULE_VELOCITY_HOURS,
+                'baseline_rate': float(r['baseline'] or 0) / (SCHEDULE_BASELINE_DAYS * 24),
+                'last_post_time': r['last_post_time'],
+            }
+
+        cursor.execute(
+            "SELECT keyword, AVG(mentions) AS daily_mentions FROM trend_aggregates "
+            "WHERE date >= CURDATE() - INTERVAL %s DAY "
+            f"AND keyword IN ({placeholders}) GROUP BY keyword",
+            (SCHEDULE_BASELINE_DAYS, *keywords))
+        for r in cursor.fetchall():
+            entry = activity.setdefault(r['keyword'], {'velocity': 0.0, 'baseline_rate': 0.0, 'last_post_time': None})
+            if not entry['baseline_rate']:
+                entry['baseline_rate'] = float(r['daily_mentions'] or 0) / 24
+        return activity
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def keyword_interval(velocity, baseline_rate):
+    """Target seconds between runs for a keyword with this activity."""
+    acceleration = (velocity + 1) / (baseline_rate + 1)
+    heat = (1 + math.log1p(velocity)) * acceleration
+    return min(max(SCHEDULE_BASE_INTERVAL / heat, SCHEDULE_MIN_INTERVAL), SCHEDULE_MAX_INTERVAL)
+
+
+class KeywordScheduler:
+    def __init__(self, db_path=SCHEDULE_DB_PATH, budget_per_hour=SCHEDULE_API_BUDGET_PER_HOUR,
+                 calls_per_run=SCHEDULE_CALLS_PER_RUN):
+        self.budget_per_hour = budget_per_hour
+        self.calls_per_run = calls_per_run
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS keyword_runs (
+                keyword TEXT PRIMARY KEY,
+                last_run_at REAL NOT NULL,
+                runs INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS api_spend (
+                spent_at REAL NOT NULL,
+                keyword TEXT NOT NULL,
+                calls INTEGER NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_api_spend_time ON api_spend (spent_at)")
+
+    def calls_last_hour(self, now=None):
+        now = now or time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT COALESCE(SUM(calls), 0) AS calls FROM api_spend WHERE spent_at >= ?",
+                                     (now - 3600,)).fetchone()
+        return int(row["calls"])
+
+    def record_run(self, keyword, calls=None, now=None):
+        """Stores a finished run: its time and the calls it spent (default SCHEDULE_CALLS_PER_RUN)."""
+        now = now or time.time()
+        calls = self.calls_per_run if calls is None else calls
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO keyword_runs (keyword, last_run_at, runs) VALUES (?, ?, 1) "
+                "ON CONFLICT(keyword) DO UPDATE SET last_run_at = excluded.last_run_at, "
+                "runs = keyword_runs.runs + 1",
+                (keyword, now))
+            self._conn.execute("INSERT INTO api_spend (spent_at, keyword, calls) VALUES (?, ?, ?)",
+                               (now, keyword, int(calls)))
+            # spend older than a day is never read again
+            self._conn.execute("DELETE FROM api_spend WHERE spent_at < ?", (now - 86400,))
+
+    def plan(self, keywords, now=None):
+        """
+        Returns one entry per keyword, most overdue first:
+        {keyword, velocity, baseline_rate, last_post_time, interval_s, last_run_at, overdue}
+        where overdue >= 1 means the keyword is due (inf if it never ran).
+        """
+        now = now or time.time()
+        activity = keyword_activity(keywords)
+        with self._lock:
+            rows = self._conn.execute("SELECT keyword, last_run_at FROM keyword_runs").fetchall()
+        last_runs = {r["keyword"]: r["last_run_at"] for r in rows}
+
+        plan = []
+        for keyword in keywords:
+            stats = activity.get(keyword, {})
+            velocity = stats.get('velocity', 0.0)
+            baseline_rate = stats.get('baseline_rate', 0.0)
+            plan.append({'keyword': keyword, 'velocity': round(velocity, 3), 'baseline_rate': round(baseline_rate, 3),
+                         'last_post_time': stats.get('last_post_time'),
+                         'interval_s': keyword_interval(velocity, baseline_rate),
+                         'last_run_at': last_runs.get(keyword)})
+
+        # Calls/hour the intervals ask for; stretch them all evenly if that exceeds the budget
+        demand = sum(self.calls_per_run * 3600 / p['interval_s'] for p in plan)
+        stretch = max(1.0, demand / self.budget_per_hour) if self.budget_per_hour > 0 else 1.0
+        for p in plan:
+            p['interval_s'] = round(p['interval_s'] * stretch)
+            p['overdue'] = (math.inf if p['last_run_at'] is None
+                            else (now - p['last_run_at']) / p['interval_s'])
+        plan.sort(key=lambda p: (p['overdue'], p['velocity']), reverse=True)
+        return plan
+
+    def due_keywords(self, keywords, now=None):
+        """Due keywords, most overdue first, limited to what the remaining hourly budget allows."""
+        plan = self.plan(keywords, now=now)
+        budget_left = self.budget_per_hour - self.calls_last_hour(now=now)
+        runs_left = budget_left // self.calls_per_run if self.calls_per_run > 0 else len(plan)
+        due = [p for p in plan if p['overdue'] >= 1]
+        return [p['keyword'] for p in due[:max(int(runs_left), 0)]], plan
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_keyword_scheduler():
+    """Returns the process-wide KeywordScheduler, creating it on first use."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = KeywordScheduler()
+    return _scheduler
@@ -0,0 +1,217 @@
+"""Fetch-and-analyze pipeline for a keyword.
+
+Runs the same steps the `/api/fetch-and-analyze` endpoint used to run inline:
+
+  1. fetch      - Google Trends, Reddit, Instagram, X and YouTube (concurrently)
+  2. analyze    - VADER sentiment + spaCy entities
+  3. clean      - Google Trends cleaning/aggregation into trends_cleaned
+  4. influencers
+  5. geo        - geo enrichment into geo_metrics
+
+`run_fetch_and_analyze` accepts an optional `stage` callable returning a
+context manager, which the job queue uses to record per-stage state/timings.
+"""
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.ingest.reddit_connector import fetch_reddit_data
+from backend.scripts.google_trends import fetch_and_store_google_trends
+from backend.ingest.instagram_connector import fetch_instagram_data
+from backend.ingest.twitter_connector import fetch_twitter_data
+from backend.ingest.youtube_connector import fetch_youtube_data
+from backend.processing.analyzer import analyze_and_store_sentiment_and_entities
+from backend.scripts.clean_and_aggregate import clean_and_aggregate_google_trends
+from backend.analytics.geo_pipeline import enrich_geo_and_aggregate
+from backend.analytics.influencer_pipeline import run_pipeline as run_influencer_pipeline
+
+# --- STEP 1 fan-out: platforms are fetched concurrently on a shared, bounded pool ---
+FETCH_MAX_WORKERS = int(os.getenv("FETCH_MAX_WORKERS", 8))
+# Per-platform timeouts (seconds); Instagram's Apify call alone can take 60 s
+FETCH_TIMEOUTS = {
+    "Google Trends": float(os.getenv("FETCH_TIMEOUT_GOOGLE_TRENDS", 45)),
+    "Reddit": float(os.getenv("FETCH_TIMEOUT_REDDIT", 45)),
+    "Instagram": float(os.getenv("FETCH_TIMEOUT_INSTAGRAM", 75)),
+    "X": float(os.getenv("FETCH_TIMEOUT_X", 30)),
+    "YouTube": float(os.getenv("FETCH_TIMEOUT_YOUTUBE", 45)),
+}
+# Max concurrent fetches per platform across all keywords in this process, so running
+# several keywords at once (scheduler.py) still stays inside each API's rate limits
+FETCH_CONCURRENCY = {
+    "Google Trends": int(os.getenv("FETCH_CONCURRENCY_GOOGLE_TRENDS", 2)),
+    "Reddit": int(os.getenv("FETCH_CONCURRENCY_REDDIT", 2)),
+    "Instagram": int(os.getenv("FETCH_CONCURRENCY_INSTAGRAM", 1)),
+    "X": int(os.getenv("FETCH_CONCURRENCY_X", 1)),
+    "YouTube": int(os.getenv("FETCH_CONCURRENCY_YOUTUBE", 2)),
+}
+# Seconds a fetch may wait for a free slot (or pool thread) before it is reported as timed out
+FETCH_SLOT_TIMEOUT = float(os.getenv("FETCH_SLOT_TIMEOUT", 120))
+_fetch_executor = ThreadPoolExecutor(max_workers=FETCH_MAX_WORKERS, thread_name_prefix="fetch")
+_platform_slots = {platform: threading.BoundedSemaphore(max(n, 1)) for platform, n in FETCH_CONCURRENCY.items()}
+
+
+def _timed_fetch(platform, slot_started, cancelled, state_lock, fn, *args, **kwargs):
+    """
+    Runs one platform fetch inside that platform's concurrency slot and stamps
+    `slot_started[platform]` once it gets the slot. Returns (success, error, latency).
+    If the caller gave up on the platform (it is in `cancelled`) before a slot
+    came free, returns without fetching, so no quota is spent after the
+    platform was reported as failed.
+    """
+    slot = _platform_slots[platform]
+    while not slot.acquire(timeout=0.5):
+        if platform in cancelled:
+            return False, "cancelled", 0.0
+    try:
+        with state_lock:
+            if platform in cancelled:
+                return False, "cancelled", 0.0
+            started = time.perf_counter()
+            slot_started[platform] = started
+        try:
+            result = fn(*args, **kwargs)
+            return bool(result), None, time.perf_counter() - started
+        except Exception as e:
+            return False, str(e), time.perf_counter() - started
+    finally:
+        slot.release()
+
+
+def _wait_for_slot(platform, slot_started, cancelled, state_lock, deadline):
+    """Waits until the platform got its slot; past `deadline` marks it cancelled and returns False."""
+    while True:
+        with state_lock:
+            if platform in slot_started:
+                return True
+            if time.perf_counter() >= deadline:
+                cancelled.add(platform)
+                return False
+        time.sleep(0.05)
+
+
+def fetch_all_platforms(keyword, start_date=None, end_date=None):
+    """
+    Runs the STEP 1 platform fetches concurrently and waits for each one up to
+    its own timeout, counted from when it got a FETCH_CONCURRENCY slot.
+    Returns {platform: {success, latency_s, wait_s, timed_out, error}}, where
+    wait_s is the time spent queued for that slot.
+    A platform that times out is reported as failed; its worker keeps running in
+    the background and still flushes whatever rows it fetched. A platform that
+    never got a slot is cancelled and does not fetch at all.
+    """
+    jobs = {
+        "Google Trends": (fetch_and_store_google_trends, (keyword,), {"start_date": start_date, "end_date": end_date}),
+        "Reddit": (fetch_reddit_data, (keyword,), {}),
+        "Instagram": (fetch_instagram_data, (keyword,), {"max_results": 30}),
+        "X": (fetch_twitter_data, (keyword,), {"max_results": 10}),
+        # paginates up to YOUTUBE_MAX_RESULTS / YOUTUBE_QUOTA_BUDGET
+        "YouTube": (fetch_youtube_data, (keyword,), {}),
+    }
+    started = time.perf_counter()
+    slot_started = {}
+    cancelled = set()
+    state_lock = threading.Lock()
+    futures = {
+        platform: _fetch_executor.submit(_timed_fetch, platform, slot_started, cancelled, state_lock,
+                                         fn, *args, **kwargs)
+        for platform, (fn, args, kwargs) in jobs.items()
+    }
+
+    summary = {}
+    for platform, future in futures.items():
+        # Slot waits and timeouts are absolute deadlines, so waits don't stack up
+        if not _wait_for_slot(platform, slot_started, cancelled, state_lock, started + FETCH_SLOT_TIMEOUT):
+            # not started yet: drop it from the pool queue, or let _timed_fetch skip it
+            future.cancel()
+            summary[platform] = {"success": False, "latency_s": None, "wait_s": round(time.perf_counter() - started, 3),
+                                 "timed_out": True, "error": "no free fetch slot"}
+            print(f"STEP 1: {platform} done: {summary[platform]}")
+            continue
+        wait = slot_started[platform] - started
+        remaining = slot_started[platform] + FETCH_TIMEOUTS.get(platform, 60.0) - time.perf_counter()
+        try:
+            success, error, latency = future.result(timeout=max(remaining, 0))
+            summary[platform] = {"success": success, "latency_s": round(latency, 3), "wait_s": round(wait, 3),
+                                 "timed_out": False, "error": error}
+        except FutureTimeoutError:
+            summary[platform] = {"success": False, "latency_s": round(time.perf_counter() - slot_started[platform], 3),
+                                 "wait_s": round(wait, 3), "timed_out": True, "error": "timeout"}
+        print(f"STEP 1: {platform} done: {summary[platform]}")
+    return summary
+
+
+@contextmanager
+def _no_stage(name):
+    yield
+
+
+def run_fetch_and_analyze(keyword, start_date=None, end_date=None, stage=None):
+    """
+    Runs every pipeline step for `keyword`.
+
+    Returns a dict: { 'success': bool, 'message' | 'error': str, 'platforms': {...} }.
+    Influencer and geo failures are logged but do not fail the run.
+    """
+    stage = stage or _no_stage
+    print(f"--- Starting REAL-TIME data fetch for keyword: '{keyword}' ---")
+
+    # ===== STEP 1: FETCH RAW DATA (concurrent) =====
+    with stage("fetch"):
+        print("STEP 1: Starting concurrent platform fetches...")
+        fetch_summary = fetch_all_platforms(keyword, start_date=start_date, end_date=end_date)
+        google_success = fetch_summary["Google Trends"]["success"]
+
+        social_success = any(r["success"] for p, r in fetch_summary.items() if p != "Google Trends")
+        print(f"STEP 1 SUMMARY: social_success={social_success}")
+
+    if not social_success:
+        print(f"❌ Failed to fetch social media data for '{keyword}'.")
+        return {"success": False, "error": "Failed to fetch social media data. Try again later.",
+                "platforms": fetch_summary}
+
+    if not google_success:
+        print(f"⚠️ Warning: Google Trends fetch failed for '{keyword}'.")
+
+    # ===== STEP 2: ANALYSIS & CLEANING =====
+    with stage("analyze"):
+        print("STEP 2: Starting NLP analyzer...")
+        sentiment_success = analyze_and_store_sentiment_and_entities(keyword)
+        print(f"STEP 2: Analyzer done: {sentiment_success}")
+
+    gtrends_clean_success = True
+    if google_success:
+        with stage("clean"):
+            print("STEP 2: Starting Google Trends cleaning...")
+            gtrends_clean_success = clean_and_aggregate_google_trends(keyword)
+            print(f"STEP 2: Trends cleaning done: {gtrends_clean_success}")
+
+    if not sentiment_success or not gtrends_clean_success:
+        print(f"❌ Analysis/Cleaning failed for '{keyword}'.")
+        return {"success": False, "error": "Data fetched but analysis failed.", "platforms": fetch_summary}
+
+    # ===== STEP 3: INFLUENCER PIPELINE =====
+    try:
+        with stage("influencers"):
+            print("STEP 3: Running influencer pipeline...")
+            inf_result = run_influencer_pipeline(keyword)
+            print(f"STEP 3: Influencer pipeline done: {inf_result}")
+    except Exception as pipe_error:
+        print(f"⚠️ Influencer pipeline error: {pipe_error}")
+
+    # ===== STEP 4: GEO ENRICHMENT (fills geo_metrics) =====
+    try:
+        with stage("geo"):
+            print("STEP 4: Running geo enrichment...")
+            geo_result = enrich_geo_and_aggregate(keyword, days_back=30)
+            print(f"STEP 4: Geo enrichment done: {geo_result}")
+    except Exception as geo_err:
+        print(f"⚠️ Geo enrichment error: {geo_err}")
+
+    print(f"--- ✅ Successfully fetched and analyzed all data for '{keyword}' ---")
+    return {"success": True, "message": f"Successfully fetched and analyzed all data for '{keyword}'",
+            "platforms": fetch_summary}
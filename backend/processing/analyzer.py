@@ -1,6 +1,6 @@
+import json
 import sys
 import os
-import re
 import spacy
 from collections import Counter
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
@@ -9,7 +9,8 @@ from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
 sys.path.append(PROJECT_ROOT)
 
-from database.db import get_db_connection, insert_cleaned_trend
+from database.db import get_db_connection, insert_cleaned_trend, add_column_if_missing, BulkUpserter
+from backend.processing.nlp_cache import clean_text, get_nlp_cache
 
 # --- 1. Load spaCy (for Entities) ---
 try:
@@ -19,101 +20,236 @@ except IOError:
     print("Please run: python -m spacy download en_core_web_sm")
     sys.exit(1)
 
+
+def _ner_required_pipes(model):
+    """'ner' plus any shared tok2vec it listens to (en_core_web_sm's NER has its own)."""
+    required = {"ner"}
+    for name, pipe in model.pipeline:
+        if "ner" in getattr(pipe, "listening_components", []):
+            required.add(name)
+    return required
+
+
+# Only doc.ents is used, so every component NER doesn't depend on is disabled
+NER_DISABLED_PIPES = [name for name in nlp.pipe_names if name not in _ner_required_pipes(nlp)]
+NER_BATCH_SIZE = int(os.environ.get("NER_BATCH_SIZE", 256))
+# >1 fans nlp.pipe out over worker processes; worth it for tens of thousands of posts
+NER_N_PROCESS = int(os.environ.get("NER_N_PROCESS", 1))
+ENTITY_LABELS = ("PERSON", "ORG", "GPE", "PRODUCT")
+
 # --- 2. Load VADER (for Sentiment) ---
 vader_analyzer = SentimentIntensityAnalyzer()
 
 
-def clean_text(text):
+def extract_entities(texts, batch_size=None, n_process=None):
     """
-    Simple text cleaning.
+    Runs spaCy NER over `texts` in batches with `nlp.pipe` and returns, per
+    text, a list of (entity_text_lower, label) for the labels we track.
     """
-    if not text:
-        return ""
-    text = re.sub(r"http\S+|www\S+|https\S+", '', text, flags=re.MULTILINE)
-    text = re.sub(r'\@\w+|\#','', text)
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
-
-def analyze_and_store_sentiment_and_entities(keyword):
+    if not texts:
+        return []
+    docs = nlp.pipe(texts,
+                    batch_size=batch_size or NER_BATCH_SIZE,
+                    n_process=n_process or NER_N_PROCESS,
+                    disable=NER_DISABLED_PIPES)
+    return [
+        [(ent.text.strip().lower(), ent.label_) for ent in doc.ents if ent.label_ in ENTITY_LABELS]
+        for doc in docs
+    ]
+
+
+def score_texts(clean_texts, batch_size=None, n_process=None):
+    """
+    Returns (compound scores, entity lists) for a list of cleaned texts, where
+    each entity list holds the (entity_text_lower, label) pairs of one text.
+
+    Results are looked up in the shared NLP cache first; only texts not seen
+    before go through VADER, and each distinct uncached text goes through NER
+    once no matter how many posts repeat it.
+    """
+    cache = get_nlp_cache()
+    scores = []
+    entity_lists = [None] * len(clean_texts)
+    updates = {}
+    needs_ner = {}
+
+    for i, clean in enumerate(clean_texts):
+        if not clean:
+            scores.append(0)  # neutral
+            entity_lists[i] = []
+            continue
+        entry = cache.get(clean) if clean not in updates else updates[clean]
+        compound = entry.get("compound") if entry else None
+        if compound is None:
+            compound = vader_analyzer.polarity_scores(clean)["compound"]
+            updates.setdefault(clean, {"compound": None, "entities": None})["compound"] = compound
+        scores.append(compound)
+
+        entities = entry.get("entities") if entry else None
+        if entities is None:
+            needs_ner.setdefault(clean, []).append(i)
+        else:
+            entity_lists[i] = [tuple(ent) for ent in entities]
+
+    # Entity extraction (batched over the distinct uncached texts)
+    pending = list(needs_ner)
+    for clean, entities in zip(pending, extract_entities(pending, batch_size=batch_size, n_process=n_process)):
+        for i in needs_ner[clean]:
+            entity_lists[i] = entities
+        entry = updates.setdefault(clean, {"compound": None, "entities": None})
+        entry["entities"] = entities
+
+    cache.put_many(updates)
+    return scores, entity_lists
+
+
+POST_SENTIMENT_UPSERT = """
+    INSERT INTO post_enrichment (platform_post_id, keyword, platform, sentiment_compound, content_hash, entities_json)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        sentiment_compound = VALUES(sentiment_compound),
+        content_hash = VALUES(content_hash),
+        entities_json = VALUES(entities_json)
+"""
+# Entities stored per keyword (top N by support)
+TOP_ENTITIES = 5
+
+_schema_checked = False
+
+
+def _ensure_schema(cursor):
+    """Adds post_enrichment.content_hash/entities_json on databases created before they existed."""
+    global _schema_checked
+    if not _schema_checked:
+        add_column_if_missing(cursor, "post_enrichment", "content_hash", "CHAR(40) NULL")
+        add_column_if_missing(cursor, "post_enrichment", "entities_json", "TEXT NULL")
+        _schema_checked = True
+
+
+def _stored_sentiment_counts(cursor, keyword):
+    """Per-platform pos/neg/neu counts from the sentiment already stored in post_enrichment."""
+    cursor.execute("""
+        SELECT r.platform AS platform,
+               SUM(pe.sentiment_compound >= 0.05) AS pos,
+               SUM(pe.sentiment_compound <= -0.05) AS neg,
+               SUM(pe.sentiment_compound > -0.05 AND pe.sentiment_compound < 0.05) AS neu,
+               COUNT(*) AS total
+        FROM raw_data r
+        JOIN post_enrichment pe
+          ON pe.platform_post_id = r.platform_post_id
+         AND pe.keyword = r.keyword
+        WHERE r.keyword = %s
+          AND pe.sentiment_compound IS NOT NULL
+        GROUP BY r.platform
+    """, (keyword,))
+    platform_stats = {}
+    for row in cursor.fetchall():
+        platform_stats[row["platform"]] = {k: int(row[k] or 0) for k in ("pos", "neg", "neu", "total")}
+    return platform_stats
+
+
+def _stored_entity_counts(cursor, keyword):
+    """Entity support for the keyword, recounted from the per-post entities in post_enrichment."""
+    cursor.execute("""
+        SELECT pe.entities_json
+        FROM raw_data r
+        JOIN post_enrichment pe
+          ON pe.platform_post_id = r.platform_post_id
+         AND pe.keyword = r.keyword
+        WHERE r.keyword = %s
+          AND pe.entities_json IS NOT NULL
+    """, (keyword,))
+    counter = Counter()
+    for row in cursor.fetchall():
+        counter.update(tuple(ent) for ent in json.loads(row["entities_json"]))
+    return counter
+
+
+def analyze_and_store_sentiment_and_entities(keyword, batch_size=None, n_process=None, incremental=True,
+                                             chunk_size=None):
     """
     Analyze sentiment and entities across ALL social platforms
     and store per post sentiment + aggregated platform sentiment.
     Also stores a combined 'Social Media' row for the UI pie chart.
+
+    With `incremental=True` (the default) only posts that have no
+    post_enrichment row yet, or whose content hash changed since they were
+    scored, are run through VADER/spaCy. The trends_cleaned percentages are
+    always rebuilt from the counts stored in post_enrichment, so a repeat run
+    costs O(new posts). Pass `incremental=False` to rescore everything.
+    Entity support is likewise recounted from each post's stored entities,
+    so rescoring a post replaces its entities instead of adding them again.
+
+    Posts are scored and written in chunks of `chunk_size` rows
+    (BULK_UPSERT_CHUNK_SIZE by default), one multi-row upsert per chunk.
     """
-    print(f"--- Starting NLP analysis for keyword: '{keyword}' ---")
+    print(f"--- Starting NLP analysis for keyword: '{keyword}' (incremental={incremental}) ---")
 
     connection = None
+    cursor = None
     try:
         connection = get_db_connection()
         cursor = connection.cursor(dictionary=True)
+        _ensure_schema(cursor)
 
-        # Fetch all platforms (not just Reddit)
+        # Fetch all platforms (not just Reddit); hash in MySQL so unchanged
+        # posts can be skipped without pulling their content
         query = """
-            SELECT platform, platform_post_id, content, score
-            FROM raw_data
-            WHERE keyword = %s
+            SELECT r.platform, r.platform_post_id, r.content,
+                   SHA1(COALESCE(r.content, '')) AS content_hash
+            FROM raw_data r
+            LEFT JOIN post_enrichment pe
+              ON pe.platform_post_id = r.platform_post_id
+             AND pe.keyword = r.keyword
+            WHERE r.keyword = %s
         """
+        if incremental:
+            query += """
+              AND (pe.id IS NULL
+                   OR pe.content_hash IS NULL
+                   OR pe.entities_json IS NULL
+                   OR pe.content_hash <> SHA1(COALESCE(r.content, '')))
+            """
         cursor.execute(query, (keyword,))
         posts = cursor.fetchall()
 
-        if not posts:
+        if posts:
+            print(f"Found {len(posts)} new or changed posts to analyze...")
+        else:
+            print(f"No new posts for '{keyword}'. Refreshing aggregates only.")
+
+        # Score posts chunk by chunk; each chunk's post_enrichment upsert is
+        # written on a background thread while the next chunk is scored
+        with BulkUpserter(POST_SENTIMENT_UPSERT, chunk_size=chunk_size, background=True) as upserter:
+            for start in range(0, len(posts), upserter.chunk_size):
+                chunk = posts[start:start + upserter.chunk_size]
+                clean_texts = [clean_text(post["content"] or "") for post in chunk]
+                sentiment_scores, entity_lists = score_texts(clean_texts, batch_size=batch_size, n_process=n_process)
+                upserter.add_many([
+                    (post["platform_post_id"], keyword, post["platform"], sentiment_score, post["content_hash"],
+                     json.dumps(entities))
+                    for post, sentiment_score, entities in zip(chunk, sentiment_scores, entity_lists)
+                ])
+
+        print(f"NLP cache: {get_nlp_cache().stats()}")
+
+        # End this connection's read snapshot so the chunks committed by the
+        # writer thread are visible to the aggregation below
+        connection.commit()
+
+        # Aggregate sentiment from stored per-post scores
+        platform_stats = _stored_sentiment_counts(cursor, keyword)
+        if not platform_stats:
             print(f"No posts found for '{keyword}'. Skipping analysis.")
+            connection.commit()
             return True
 
-        print(f"Found {len(posts)} posts to analyze...")
-
-        platform_stats = {}
-        entity_counter = Counter()
-
-        # 👉 NEW: overall social media stats
+        # 👉 overall social media stats (skip Google Trends)
         overall_social = {"pos": 0, "neg": 0, "neu": 0, "total": 0}
-
-        for post in posts:
-            raw_text = post["content"] or ""
-            platform = post["platform"]
-            post_id = post["platform_post_id"]
-
-            clean = clean_text(raw_text)
-            if not clean:
-                sentiment_score = 0  # neutral
-            else:
-                vader_result = vader_analyzer.polarity_scores(clean)
-                sentiment_score = vader_result["compound"]
-
-            # Store per-post sentiment in post_enrichment
-            cursor.execute("""
-                INSERT INTO post_enrichment (platform_post_id, keyword, platform, sentiment_compound)
-                VALUES (%s, %s, %s, %s)
-                ON DUPLICATE KEY UPDATE sentiment_compound = VALUES(sentiment_compound);
-            """, (post_id, keyword, platform, sentiment_score))
-
-            # Track stats per platform
-            if platform not in platform_stats:
-                platform_stats[platform] = {"pos": 0, "neg": 0, "neu": 0, "total": 0}
-
-            platform_stats[platform]["total"] += 1
-            if sentiment_score >= 0.05:
-                platform_stats[platform]["pos"] += 1
-            elif sentiment_score <= -0.05:
-                platform_stats[platform]["neg"] += 1
-            else:
-                platform_stats[platform]["neu"] += 1
-
-            # 👉 NEW: update overall social stats (skip Google Trends)
+        for platform, stats in platform_stats.items():
             if platform != "Google Trends":
-                overall_social["total"] += 1
-                if sentiment_score >= 0.05:
-                    overall_social["pos"] += 1
-                elif sentiment_score <= -0.05:
-                    overall_social["neg"] += 1
-                else:
-                    overall_social["neu"] += 1
-
-            # Entity extraction
-            doc = nlp(clean)
-            for ent in doc.ents:
-                if ent.label_ in ["PERSON", "ORG", "GPE", "PRODUCT"]:
-                    entity_counter[(ent.text.strip().lower(), ent.label_)] += 1
+                for k in overall_social:
+                    overall_social[k] += stats[k]
 
         # Insert aggregated sentiment per platform
         for platform, stats in platform_stats.items():
@@ -162,16 +298,19 @@ def analyze_and_store_sentiment_and_entities(keyword):
                   f"{overall_social['pos']}⬆  {overall_social['neg']}⬇  {overall_social['neu']}😐 "
                   f"out of {overall_social['total']} posts")
 
-        # Store entities
+        # Store entities: support is recounted from every post's stored entities,
+        # so the stored rows are replaced rather than added to
+        entity_counter = _stored_entity_counts(cursor, keyword)
+        cursor.execute("DELETE FROM entities WHERE keyword = %s AND platform = %s", (keyword, 'All Platforms'))
         if entity_counter:
             print("\n🏷 Top Entities Found:")
-            for (text, label), count in entity_counter.most_common(5):
+            for (text, label), count in entity_counter.most_common(TOP_ENTITIES):
                 print(f"  {text} ({label}): {count}")
 
                 cursor.execute("""
                     INSERT INTO entities (keyword, platform, entity, entity_type, support)
                     VALUES (%s, %s, %s, %s, %s)
-                    ON DUPLICATE KEY UPDATE support = support + VALUES(support)
+                    ON DUPLICATE KEY UPDATE support = VALUES(support)
                 """, (keyword, 'All Platforms', text, label, count))
 
         connection.commit()
@@ -182,8 +321,9 @@ def analyze_and_store_sentiment_and_entities(keyword):
         return False
 
     finally:
-        if connection and connection.is_connected():
+        if cursor:
             cursor.close()
+        if connection:
             connection.close()
 
 
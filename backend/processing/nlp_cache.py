@@ -0,0 +1,164 @@
+"""Persistent cache of per-text NLP results (VADER compound + spaCy entities).
+
+Entries are keyed by a SHA1 of the exact text that was scored (the analyzer
+scores `clean_text(content)`, the topic pipeline the raw title + content), so
+retweets, reposted captions and repeated Google Trends "Interest score: N"
+strings are scored once across all keywords and runs.
+
+Two tiers:
+  - an in-memory LRU (NLP_CACHE_MEMORY_ITEMS entries) per process
+  - an on-disk SQLite table (NLP_CACHE_PATH) shared by processes on the host
+
+Either field of an entry may be None when only one pipeline has seen the
+text, e.g. the topic pipeline stores sentiment but not entities.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+NLP_CACHE_PATH = os.environ.get("NLP_CACHE_PATH", os.path.join(PROJECT_ROOT, "nlp_cache.sqlite3"))
+NLP_CACHE_MEMORY_ITEMS = int(os.environ.get("NLP_CACHE_MEMORY_ITEMS", 50000))
+# Bump when the VADER/spaCy models or clean_text change so old scores are ignored
+NLP_CACHE_VERSION = os.environ.get("NLP_CACHE_VERSION", "1")
+
+
+def clean_text(text):
+    """
+    Simple text cleaning.
+    """
+    if not text:
+        return ""
+    text = re.sub(r"http\S+|www\S+|https\S+", '', text, flags=re.MULTILINE)
+    text = re.sub(r'\@\w+|\#','', text)
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text
+
+
+def text_key(clean):
+    """Cache key for an already-cleaned text."""
+    return hashlib.sha1(f"{NLP_CACHE_VERSION}\x00{clean}".encode("utf-8")).hexdigest()
+
+
+class NLPCache:
+    def __init__(self, path=NLP_CACHE_PATH, max_memory_items=NLP_CACHE_MEMORY_ITEMS):
+        self.max_memory_items = max_memory_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0}
+        self._conn = None
+        try:
+            self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS nlp_cache (
+                    key TEXT PRIMARY KEY,
+                    compound REAL,
+                    entities TEXT,
+                    updated_at REAL
+                )
+            """)
+            self._conn.commit()
+        except sqlite3.Error as e:
+            # Fall back to memory-only caching
+            print(f"⚠️ NLP cache disk tier unavailable ({path}): {e}")
+            self._conn = None
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, clean):
+        """Returns {'compound': float|None, 'entities': list|None} or None."""
+        key = text_key(clean)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return entry
+            row = None
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT compound, entities FROM nlp_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            entry = {
+                "compound": row[0],
+                "entities": [tuple(e) for e in json.loads(row[1])] if row[1] is not None else None,
+            }
+            self._remember(key, entry)
+            self._stats["disk_hits"] += 1
+            return entry
+
+    def put_many(self, items):
+        """
+        Stores results for many texts in one disk transaction.
+        `items` maps clean text -> {'compound': ..., 'entities': ...}; fields
+        left as None keep whatever is already cached.
+        """
+        if not items:
+            return
+        rows = []
+        with self._lock:
+            for clean, new in items.items():
+                key = text_key(clean)
+                entry = {"compound": new.get("compound"), "entities": new.get("entities")}
+                cached = self._memory.get(key)
+                if cached is not None:
+                    merged = dict(cached)
+                    merged.update({k: v for k, v in entry.items() if v is not None})
+                    self._remember(key, merged)
+                elif None not in entry.values():
+                    # Partial entries are only merged on disk, so memory never
+                    # holds a half entry that hides the other field
+                    self._remember(key, entry)
+                entities = json.dumps(entry["entities"]) if entry["entities"] is not None else None
+                rows.append((key, entry["compound"], entities, time.time()))
+            if self._conn is not None:
+                try:
+                    self._conn.executemany("""
+                        INSERT INTO nlp_cache (key, compound, entities, updated_at)
+                        VALUES (?, ?, ?, ?)
+                        ON CONFLICT(key) DO UPDATE SET
+                            compound = COALESCE(excluded.compound, nlp_cache.compound),
+                            entities = COALESCE(excluded.entities, nlp_cache.entities),
+                            updated_at = excluded.updated_at
+                    """, rows)
+                    self._conn.commit()
+                except sqlite3.Error as e:
+                    print(f"⚠️ NLP cache write failed: {e}")
+                    self._conn.rollback()
+            self._stats["writes"] += len(rows)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_items"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["lookups"] = lookups
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        stats["disk_tier"] = self._conn is not None
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_nlp_cache():
+    """Returns the process-wide NLPCache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = NLPCache()
+    return _cache
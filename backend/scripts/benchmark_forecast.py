@@ -0,0 +1,80 @@
+"""Benchmark per-forecast latency of the multi-step forecast modes.
+
+Trains the one-step and direct LSTM models once on a synthetic daily series,
+then times producing the 90-step forecast with each mode.
+
+Usage:
+    python backend/scripts/benchmark_forecast.py --points 730 --repeats 20
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import MinMaxScaler
+from backend.analytics.forecasting import create_sequences
+from backend.analytics.lstm_engine import WindowBatches, build_model, compile_rollout, predict_horizon
+
+SEQUENCE_LENGTH = 30
+FORECAST_STEPS = 90
+
+
+def synthetic_series(points, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(points)
+    y = 50 + 0.02 * t + 10 * np.sin(2 * np.pi * t / 7) + 15 * np.sin(2 * np.pi * t / 365) + rng.normal(0, 3, points)
+    return pd.DataFrame({'score': y}, index=pd.date_range('2020-01-01', periods=points, freq='D'))
+
+
+def train(scaled, horizon, epochs):
+    X, y = create_sequences(scaled, SEQUENCE_LENGTH, horizon=horizon)
+    model = build_model(SEQUENCE_LENGTH, outputs=horizon)
+    model.fit(WindowBatches(X, y, batch_size=16), epochs=epochs, verbose=0)
+    return model
+
+
+def time_mode(model, scaled, mode, repeats, rollout=None):
+    # first call traces/warms up and is reported separately
+    started = time.perf_counter()
+    out = predict_horizon(model, scaled, SEQUENCE_LENGTH, FORECAST_STEPS, mode=mode, rollout=rollout)
+    first = time.perf_counter() - started
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        predict_horizon(model, scaled, SEQUENCE_LENGTH, FORECAST_STEPS, mode=mode, rollout=rollout)
+        timings.append(time.perf_counter() - started)
+    return first, np.array(timings), out
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser()
+    p.add_argument('--points', type=int, default=730)
+    p.add_argument('--repeats', type=int, default=20)
+    p.add_argument('--epochs', type=int, default=2)
+    args = p.parse_args()
+
+    df = synthetic_series(args.points)
+    scaled = MinMaxScaler().fit_transform(df[['score']])
+
+    print(f"Training models on {args.points} daily points...")
+    one_step = train(scaled, 1, args.epochs)
+    direct = train(scaled, FORECAST_STEPS, args.epochs)
+    rollout = compile_rollout(one_step, SEQUENCE_LENGTH, FORECAST_STEPS)
+
+    results = {
+        'recursive': time_mode(one_step, scaled, 'recursive', args.repeats),
+        'rollout': time_mode(one_step, scaled, 'rollout', args.repeats, rollout=rollout),
+        'direct': time_mode(direct, scaled, 'direct', args.repeats),
+    }
+
+    baseline = np.median(results['recursive'][1])
+    print(f"\n{FORECAST_STEPS}-step forecast latency over {args.repeats} runs")
+    print(f"{'mode':<10} {'first (ms)':>11} {'median (ms)':>12} {'p95 (ms)':>10} {'speedup':>8}")
+    for mode, (first, timings, _) in results.items():
+        median = np.median(timings)
+        print(f"{mode:<10} {first * 1000:>11.1f} {median * 1000:>12.2f} "
+              f"{np.percentile(timings, 95) * 1000:>10.2f} {baseline / median:>7.1f}x")
+
+    drift = np.abs(results['rollout'][2] - results['recursive'][2]).max()
+    print(f"\nmax |rollout - recursive| (scaled units): {drift:.2e}")
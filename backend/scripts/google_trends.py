@@ -3,7 +3,9 @@ import os
 import json
 from datetime import datetime
 from serpapi import GoogleSearch
-from database.db import insert_raw_row
+from database.db import RawDataWriter
+from backend.ingest.rate_limiter import allow_request
+from backend.ingest.ingest_state import GOOGLE_TRENDS_REFRESH_DAYS, is_fresh, save_watermarks
 
 # --- CONFIGURATION ---
 SERPAPI_KEY = os.getenv("SERPAPI_KEY")
@@ -16,6 +18,11 @@ def fetch_and_store_google_trends(keyword, start_date=None, end_date=None):
         print("❌ SERPAPI_KEY is not set. Configure it in environment variables.")
         return False
 
+    # The weekly 5-year series only gains a point per week; skip the call until it is due
+    if not start_date and not end_date and is_fresh("Google Trends", keyword, GOOGLE_TRENDS_REFRESH_DAYS):
+        print(f"✅ Google Trends data for '{keyword}' is up to date. Skipping fetch.")
+        return True
+
     # 1. Build timeframe
     if start_date and end_date:
         timeframe = f"{start_date} {end_date}"
@@ -36,6 +43,11 @@ def fetch_and_store_google_trends(keyword, start_date=None, end_date=None):
         "api_key": SERPAPI_KEY
     }
 
+    # Shares the 'Google Trends' bucket with GoogleTrendsConnector
+    if not allow_request("Google Trends", credential=SERPAPI_KEY):
+        print(f"⚠️ Google Trends rate limit reached; skipping fetch for '{keyword}'.")
+        return False
+
     try:
         search = GoogleSearch(params)
         results = search.get_dict()
@@ -51,24 +63,29 @@ def fetch_and_store_google_trends(keyword, start_date=None, end_date=None):
             return True
 
         rows_inserted = 0
-        for item in timeline_data:
-            score = item.get('values', [{}])[0].get('extracted_value', 0)
-            post_time = datetime.fromtimestamp(int(item.get('timestamp')))
-
-            insert_raw_row(
-                platform="Google Trends",
-                platform_post_id=f"googletrends_{keyword}_{post_time.strftime('%Y%m%d')}",
-                keyword=keyword,
-                post_time=post_time,
-                author="N/A",
-                title=f"Google Trends for {keyword}",
-                content=f"Interest score: {score}",
-                score=float(score),
-                url="https://trends.google.com/",
-                raw_json=json.dumps(item)
-            )
-            rows_inserted += 1
+        newest = None
+        with RawDataWriter() as writer:
+            for item in timeline_data:
+                score = item.get('values', [{}])[0].get('extracted_value', 0)
+                post_time = datetime.fromtimestamp(int(item.get('timestamp')))
+
+                writer.add(
+                    platform="Google Trends",
+                    platform_post_id=f"googletrends_{keyword}_{post_time.strftime('%Y%m%d')}",
+                    keyword=keyword,
+                    post_time=post_time,
+                    author="N/A",
+                    title=f"Google Trends for {keyword}",
+                    content=f"Interest score: {score}",
+                    score=float(score),
+                    url="https://trends.google.com/",
+                    raw_json=json.dumps(item)
+                )
+                rows_inserted += 1
+                newest = max(newest, post_time) if newest else post_time
 
+        if newest and not writer.rows_failed:
+            save_watermarks("Google Trends", {keyword: (newest, f"googletrends_{keyword}_{newest.strftime('%Y%m%d')}")})
         print(f"✅ Google Trends fetch complete. Inserted {rows_inserted} rows.")
         return True
 
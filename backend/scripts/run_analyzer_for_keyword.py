@@ -8,6 +8,7 @@ import argparse
 if __name__ == '__main__':
     p = argparse.ArgumentParser()
     p.add_argument('--keyword', required=True)
+    p.add_argument('--full', action='store_true', help='rescore every post, not just new/changed ones')
     args = p.parse_args()
-    res = analyze_and_store_sentiment_and_entities(args.keyword)
+    res = analyze_and_store_sentiment_and_entities(args.keyword, incremental=not args.full)
     print(res)
@@ -0,0 +1,14 @@
+"""Runner for the global multi-series forecast (all tracked keywords/countries)."""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from backend.analytics.global_forecast import run_global_forecast
+import argparse
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser()
+    p.add_argument('--keywords', nargs='*', help='limit to these keywords (default: every tracked keyword)')
+    p.add_argument('--no-geo', action='store_true', help='skip per-country geo_metrics series')
+    p.add_argument('--epochs', type=int, default=None)
+    args = p.parse_args()
+    res = run_global_forecast(args.keywords, include_geo=not args.no_geo, epochs=args.epochs)
+    print(res)
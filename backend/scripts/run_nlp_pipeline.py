@@ -1,14 +1,19 @@
 """Runner for the NLP pipeline."""
 import sys, os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
-from backend.analytics.nlp_pipeline import run_pipeline
+from backend.analytics.nlp_pipeline import run_pipeline, run_streaming_pipeline
 import argparse
 
 if __name__ == '__main__':
     p = argparse.ArgumentParser()
     p.add_argument('--keyword', required=True)
-    p.add_argument('--limit', type=int, default=500)
+    p.add_argument('--limit', type=int, default=None, help='newest N posts (default 500; all posts with --stream)')
     p.add_argument('--n_topics', type=int, default=8)
+    p.add_argument('--refit', action='store_true', help='refit the saved topic model even if it is still fresh')
+    p.add_argument('--stream', action='store_true', help='chunked minibatch topic modeling with bounded memory')
     args = p.parse_args()
-    res = run_pipeline(args.keyword, limit=args.limit, n_topics=args.n_topics)
+    if args.stream:
+        res = run_streaming_pipeline(args.keyword, n_topics=args.n_topics, limit=args.limit)
+    else:
+        res = run_pipeline(args.keyword, limit=args.limit or 500, n_topics=args.n_topics, force_refit=args.refit)
     print(res)
@@ -6,7 +6,6 @@ import requests
 from bs4 import BeautifulSoup
 import json
 from datetime import datetime
-import time
 
 # Adjust path to import the database function from the project root
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
@@ -108,9 +107,6 @@ def fetch_and_store_twitter_trends(keyword, limit=20):
                     pass
                 else:
                     print(f"   ❌ Error inserting tweet {platform_post_id}: {e}")
-            
-            # Be polite to the server
-            time.sleep(0.1)
 
     except requests.exceptions.RequestException as e:
         print(f"❌ Failed to fetch data from Nitter: {e}")
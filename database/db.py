@@ -1,6 +1,11 @@
 # database/db.py
-import mysql.connector
+import os
+import time
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from mysql.connector import Error
+from mysql.connector import pooling
 import json # For handling JSON data for insertion
 
 # Your connection details
@@ -11,16 +16,150 @@ DB_CONFIG = {
     "database": "trend_analysis"
 }
 
+# --- Connection pool settings (override via environment) ---
+# mysql.connector caps a single pool at pooling.CNX_POOL_MAXSIZE (32) connections.
+DB_POOL_NAME = "trend_analysis_pool"
+DB_POOL_SIZE = min(int(os.environ.get("DB_POOL_SIZE", 10)), pooling.CNX_POOL_MAXSIZE)
+# Max seconds a caller waits for a free connection before giving up
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 10))
+
+_pool = None
+_pool_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_pool_stats = {
+    "checkouts": 0,          # successful connection checkouts
+    "failures": 0,           # checkouts that returned None
+    "waits": 0,              # checkouts that found the pool exhausted and had to wait
+    "wait_time_total": 0.0,  # seconds spent waiting on an exhausted pool
+    "checkout_time_total": 0.0,
+    "checkout_time_max": 0.0,
+    "health_check_failures": 0,
+}
+
+
+def _get_pool():
+    """Lazily create the process-wide connection pool."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = pooling.MySQLConnectionPool(
+                    pool_name=DB_POOL_NAME,
+                    pool_size=DB_POOL_SIZE,
+                    pool_reset_session=True,
+                    **DB_CONFIG
+                )
+    return _pool
+
+
+def _record_checkout(started, waited_for, ok):
+    elapsed = time.perf_counter() - started
+    with _stats_lock:
+        if ok:
+            _pool_stats["checkouts"] += 1
+        else:
+            _pool_stats["failures"] += 1
+        if waited_for > 0:
+            _pool_stats["waits"] += 1
+            _pool_stats["wait_time_total"] += waited_for
+        _pool_stats["checkout_time_total"] += elapsed
+        _pool_stats["checkout_time_max"] = max(_pool_stats["checkout_time_max"], elapsed)
+
+
 def get_db_connection():
-    """Establishes and returns a database connection."""
+    """Checks a connection out of the shared pool and returns it.
+
+    Calling `close()` on the returned connection hands it back to the pool.
+    Waits up to DB_POOL_TIMEOUT seconds when every connection is in use and
+    returns None if the pool cannot supply a healthy connection.
+    """
+    started = time.perf_counter()
+    wait_started = None
+    waited_for = 0.0
     try:
-        connection = mysql.connector.connect(**DB_CONFIG)
-        return connection
+        pool = _get_pool()
+        while True:
+            try:
+                connection = pool.get_connection()
+            except pooling.PoolError:
+                # Pool exhausted: wait for another caller to return a connection
+                now = time.perf_counter()
+                if wait_started is None:
+                    wait_started = now
+                if now - wait_started >= DB_POOL_TIMEOUT:
+                    raise
+                time.sleep(0.01)
+                continue
+
+            # Health check on checkout; reconnect stale connections once
+            try:
+                connection.ping(reconnect=True, attempts=1, delay=0)
+            except Error:
+                with _stats_lock:
+                    _pool_stats["health_check_failures"] += 1
+                connection.close()
+                raise
+
+            if wait_started is not None:
+                waited_for = time.perf_counter() - wait_started
+            _record_checkout(started, waited_for, True)
+            return connection
     except Error as e:
+        if wait_started is not None:
+            waited_for = time.perf_counter() - wait_started
+        _record_checkout(started, waited_for, False)
         print(f"Error connecting to MySQL database: {e}")
         return None
 
 
+@contextmanager
+def db_connection():
+    """Context manager around get_db_connection().
+
+    Yields a pooled connection (or None if unavailable) and always returns it
+    to the pool on exit:
+
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            ...
+    """
+    connection = get_db_connection()
+    try:
+        yield connection
+    finally:
+        if connection is not None:
+            try:
+                connection.close()
+            except Error:
+                pass
+
+
+def get_pool_stats():
+    """Returns a snapshot of pool sizing and checkout counters."""
+    with _stats_lock:
+        stats = dict(_pool_stats)
+    checkouts = stats["checkouts"] + stats["failures"]
+    stats["checkout_time_avg"] = stats["checkout_time_total"] / checkouts if checkouts else 0.0
+    stats["pool_size"] = DB_POOL_SIZE
+    stats["pool_timeout"] = DB_POOL_TIMEOUT
+    return stats
+
+
+def add_column_if_missing(cursor, table, column, definition):
+    """Adds `column` to `table` if it does not exist yet. Returns True if added."""
+    cursor.execute(f"SHOW COLUMNS FROM {table} LIKE %s", (column,))
+    if cursor.fetchone() is not None:
+        return False
+    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return True
+
+
+def has_index(cursor, table, index):
+    """True if `table` has an index named `index`."""
+    cursor.execute(f"SHOW INDEX FROM {table} WHERE Key_name = %s", (index,))
+    return bool(cursor.fetchall())
+
+
 def create_tables():
     """Create additional tables for topics, entities, influencers, aggregates, and geo metrics."""
     conn = get_db_connection()
@@ -53,9 +192,24 @@ def create_tables():
             entity TEXT,
             entity_type VARCHAR(50),
             support INT DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE KEY uk_entity (keyword, platform, entity_type, entity(191))
         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
         """)
+        # Older tables have no unique key, so incremental support could not accumulate:
+        # fold duplicate rows into one (summing support), then add the key
+        if not has_index(cursor, "entities", "uk_entity"):
+            cursor.execute("""
+            CREATE TEMPORARY TABLE entities_merged AS
+            SELECT keyword, platform, MIN(entity) AS entity, entity_type,
+                   SUM(support) AS support, MIN(created_at) AS created_at
+            FROM entities GROUP BY keyword, platform, entity_type, LEFT(entity, 191)
+            """)
+            cursor.execute("DELETE FROM entities")
+            cursor.execute("INSERT INTO entities (keyword, platform, entity, entity_type, support, created_at) "
+                           "SELECT keyword, platform, entity, entity_type, support, created_at FROM entities_merged")
+            cursor.execute("DROP TEMPORARY TABLE entities_merged")
+            cursor.execute("ALTER TABLE entities ADD UNIQUE KEY uk_entity (keyword, platform, entity_type, entity(191))")
 
         # Influencers table
         cursor.execute("""
@@ -113,10 +267,48 @@ def create_tables():
             sentiment_compound FLOAT,
             assigned_topic VARCHAR(100),
             topic_weight FLOAT,
+            content_hash CHAR(40) NULL,
+            entities_json TEXT NULL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             UNIQUE KEY uk_post (platform_post_id, keyword)
         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
         """)
+        # SHA1 of the raw_data content the row was scored from (incremental analysis)
+        add_column_if_missing(cursor, "post_enrichment", "content_hash", "CHAR(40) NULL")
+        # [[entity, label], ...] found in the post; entity support is recounted from these
+        add_column_if_missing(cursor, "post_enrichment", "entities_json", "TEXT NULL")
+
+        # Stored forecasts, one row per future date per series.
+        # scope: 'trends' (Google Trends), 'geo:<country>' or 'geo:<country>:<platform>'
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS forecasts (
+            keyword VARCHAR(255) NOT NULL,
+            scope VARCHAR(150) NOT NULL,
+            ds DATE NOT NULL,
+            yhat DOUBLE,
+            yhat_lower DOUBLE,
+            yhat_upper DOUBLE,
+            engine VARCHAR(50) NOT NULL,
+            model_version INT NOT NULL DEFAULT 1,
+            generated_at DATETIME NOT NULL,
+            input_watermark VARCHAR(100) NULL,
+            PRIMARY KEY (keyword, scope, ds)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """)
+        # last point time | point count | value sum of the history the forecast was built from
+        add_column_if_missing(cursor, "forecasts", "input_watermark", "VARCHAR(100) NULL")
+
+        # Newest post seen per platform and keyword (incremental ingestion)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_state (
+            platform VARCHAR(100) NOT NULL,
+            keyword VARCHAR(255) NOT NULL,
+            last_post_time DATETIME NULL,
+            last_post_id VARCHAR(255) NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (platform, keyword)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """)
 
         conn.commit()
         print('✅ Database tables created or already exist.')
@@ -156,6 +348,246 @@ def insert_raw_row(platform, platform_post_id, keyword, post_time, author,
         cursor.close()
         conn.close()
 
+
+# --- Buffered bulk writer for raw_data ---
+RAW_WRITER_FLUSH_SIZE = int(os.environ.get("RAW_WRITER_FLUSH_SIZE", 200))
+RAW_WRITER_FLUSH_INTERVAL = float(os.environ.get("RAW_WRITER_FLUSH_INTERVAL", 5))
+
+RAW_DATA_UPSERT = """
+    INSERT INTO raw_data (platform, platform_post_id, keyword, post_time, author,
+                          title, content, score, url, raw_json)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        author = VALUES(author),
+        title = VALUES(title),
+        content = VALUES(content),
+        score = VALUES(score),
+        url = VALUES(url),
+        raw_json = VALUES(raw_json)
+    """
+
+
+class RawDataWriter:
+    """Accumulates normalized raw_data rows and writes them in batches.
+
+    Rows are flushed with a single `executemany` upsert (which mysql.connector
+    rewrites into one multi-row INSERT) and one COMMIT per batch. A flush is
+    triggered when `flush_size` rows are buffered, by a timer `flush_interval`
+    seconds after the first row buffered since the last flush (so a quiet
+    connector does not hold rows until `close()`), and on `close()`.
+    `batches_written` counts executed batches (executemany chunks). A batch that
+    fails is retried row by row, so one bad row only loses itself; the
+    (keyword, platform_post_id) of rows that could not be written are kept in
+    `failed_keys`.
+
+    With `background=True` the size-triggered flushes run on a single writer
+    thread, so `add` never blocks on MySQL (e.g. when called from an event
+    loop); `close()` waits for them.
+
+        with RawDataWriter() as writer:
+            writer.add(platform, platform_post_id, keyword, ...)
+    """
+
+    def __init__(self, flush_size=None, flush_interval=None, background=False):
+        self.flush_size = max(1, int(flush_size or RAW_WRITER_FLUSH_SIZE))
+        self.flush_interval = float(flush_interval if flush_interval is not None else RAW_WRITER_FLUSH_INTERVAL)
+        self._rows = []
+        self._lock = threading.Lock()
+        self._timer = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="raw-writer") if background else None
+        self._futures = []
+        self.rows_written = 0
+        self.batches_written = 0
+        self.rows_failed = 0
+        self.failed_keys = set()
+
+    def add(self, platform, platform_post_id, keyword, post_time, author,
+            title, content, score, url, raw_json):
+        """Buffers one row; flushes once `flush_size` rows are buffered."""
+        with self._lock:
+            self._rows.append((platform, platform_post_id, keyword, post_time, author,
+                               title, content, score, url, raw_json))
+            due = len(self._rows) >= self.flush_size
+            if not due and self._timer is None and self.flush_interval > 0:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if not due:
+            return
+        if self._executor is None:
+            self.flush()
+            return
+        # hand the batch to the writer thread now, so the next rows start a new one
+        rows = self._take_rows()
+        if rows:
+            future = self._executor.submit(self._write, rows)
+            with self._lock:
+                self._futures.append(future)
+
+    def _take_rows(self):
+        """Empties the buffer and disarms the interval timer. Returns the buffered rows."""
+        with self._lock:
+            rows, self._rows = self._rows, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        return rows
+
+    def flush(self):
+        """Writes all buffered rows. Returns the number of rows written."""
+        rows = self._take_rows()
+        if not rows:
+            return 0
+        return self._write(rows)
+
+    def _write(self, rows):
+        """Upserts `rows` in `flush_size` batches. Returns the number of rows written."""
+        conn = get_db_connection()
+        if conn is None:
+            self._record_failed(rows)
+            return 0
+
+        cursor = conn.cursor()
+        written = batches = 0
+        try:
+            for start in range(0, len(rows), self.flush_size):
+                chunk = rows[start:start + self.flush_size]
+                batches += 1
+                try:
+                    cursor.executemany(RAW_DATA_UPSERT, chunk)
+                    conn.commit()
+                    written += len(chunk)
+                except Error as e:
+                    print(f"Error flushing raw data batch of {len(chunk)} rows, retrying row by row: {e}")
+                    conn.rollback()
+                    written += self._write_rows(conn, cursor, chunk)
+            with self._lock:
+                self.rows_written += written
+                self.batches_written += batches
+            print(f"Successfully flushed {written} of {len(rows)} raw data rows")
+        finally:
+            cursor.close()
+            conn.close()
+        return written
+
+    def _write_rows(self, conn, cursor, rows):
+        """Upserts rows one at a time after a failed batch. Returns the number written."""
+        written = 0
+        for row in rows:
+            try:
+                cursor.execute(RAW_DATA_UPSERT, row)
+                conn.commit()
+                written += 1
+            except Error as e:
+                print(f"Error inserting raw data row {row[1]!r} ({row[0]}): {e}")
+                conn.rollback()
+                self._record_failed([row])
+        return written
+
+    def _record_failed(self, rows):
+        with self._lock:
+            self.rows_failed += len(rows)
+            self.failed_keys.update((row[2], row[1]) for row in rows)
+
+    def close(self):
+        """Flushes any remaining rows and waits for background flushes. Returns rows written by this call."""
+        written = self.flush()
+        if self._executor is not None:
+            with self._lock:
+                futures, self._futures = self._futures, []
+            for future in futures:
+                written += future.result()
+        return written
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+# --- Chunked bulk upserts (post_enrichment etc.) ---
+BULK_UPSERT_CHUNK_SIZE = int(os.environ.get("BULK_UPSERT_CHUNK_SIZE", 500))
+
+
+class BulkUpserter:
+    """Writes rows for one INSERT ... ON DUPLICATE KEY UPDATE statement in chunks.
+
+    Each chunk is sent as one `executemany` (a single multi-row statement)
+    and committed on its own pooled connection, so N rows cost about
+    N / chunk_size round-trips. With `background=True` the chunks are written
+    on a single writer thread: the caller can compute the next chunk while
+    the previous one is in flight. `close()` waits for every write and
+    re-raises the first error.
+
+        with BulkUpserter(QUERY, background=True) as upserter:
+            for chunk in chunks:
+                upserter.add_many(compute(chunk))
+    """
+
+    def __init__(self, query, chunk_size=None, background=False):
+        self.query = query
+        self.chunk_size = max(1, int(chunk_size or BULK_UPSERT_CHUNK_SIZE))
+        self._rows = []
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bulk-upsert") if background else None
+        self._futures = []
+        self.rows_written = 0
+
+    def _write(self, rows):
+        conn = get_db_connection()
+        if conn is None:
+            raise Error(msg="DB connection failed")
+        cursor = conn.cursor()
+        try:
+            cursor.executemany(self.query, rows)
+            conn.commit()
+            self.rows_written += len(rows)
+            return len(rows)
+        except Error:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+
+    def _submit(self, rows):
+        if self._executor is not None:
+            self._futures.append(self._executor.submit(self._write, rows))
+        else:
+            self._write(rows)
+
+    def add_many(self, rows):
+        self._rows.extend(rows)
+        while len(self._rows) >= self.chunk_size:
+            chunk, self._rows = self._rows[:self.chunk_size], self._rows[self.chunk_size:]
+            self._submit(chunk)
+
+    def close(self):
+        """Writes the remaining rows and waits for all chunks. Returns rows written."""
+        if self._rows:
+            chunk, self._rows = self._rows, []
+            self._submit(chunk)
+        if self._executor is not None:
+            try:
+                for future in self._futures:
+                    future.result()
+            finally:
+                self._futures = []
+                self._executor.shutdown(wait=True)
+                self._executor = None
+        return self.rows_written
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self._executor is not None:
+            self._executor.shutdown(wait=True)
+        return False
+
 # You might also want functions for inserting into trends_cleaned later
 # def insert_cleaned_trend(keyword, platform, average_score, mentions, peak_time):
 #     # ... implementation ...
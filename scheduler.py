@@ -1,66 +1,171 @@
 # scheduler.py
 
+import os
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from apscheduler.schedulers.blocking import BlockingScheduler
 
 # Import all the functions we need to run
-from backend.scripts.google_trends import fetch_and_store_google_trends
-from backend.scripts.reddit import fetch_and_store_reddit_trends
-# from backend.scripts.twitter import fetch_and_store_twitter_trends # We can uncomment this later
-from backend.processing.analyzer import analyze_and_store_sentiment
+from backend.pipeline import run_fetch_and_analyze
+from backend.analytics.forecast_store import refresh_stale_forecasts
+from backend.keyword_scheduler import get_keyword_scheduler
+from backend.ingest.seen_filter import warm_seen_filters
 
 # Define the list of keywords you want to track automatically
 KEYWORDS_TO_TRACK = ["smartwatch", "AI", "Quantum Computing", "Electric Vehicle"]
 
-def scheduled_job():
+# Keywords processed at the same time. Per-platform API concurrency is capped
+# separately by FETCH_CONCURRENCY_* in backend/pipeline.py.
+SCHEDULER_WORKERS = int(os.environ.get('SCHEDULER_WORKERS', 4))
+
+# adaptive: run keywords when their activity-based interval has passed, within the
+# API budget (backend/keyword_scheduler.py); fixed: run every keyword every 6 hours
+SCHEDULER_MODE = os.environ.get('SCHEDULER_MODE', 'adaptive')
+# How often the adaptive scheduler checks which keywords are due
+SCHEDULER_TICK_MINUTES = int(os.environ.get('SCHEDULER_TICK_MINUTES', 5))
+
+# How often stored forecasts are checked against new data
+FORECAST_REFRESH_MINUTES = int(os.environ.get('FORECAST_REFRESH_MINUTES', 60))
+
+REPORT_STAGES = ["fetch", "analyze", "clean", "influencers", "geo"]
+
+
+def _stage_timer(durations):
+    """`stage` hook for run_fetch_and_analyze that records each stage's duration."""
+    @contextmanager
+    def stage(name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            durations[name] = time.perf_counter() - started
+    return stage
+
+
+def process_keyword(keyword):
+    """Runs the full pipeline for one keyword and returns its timing report."""
+    durations = {}
+    started = time.perf_counter()
+    try:
+        result = run_fetch_and_analyze(keyword, stage=_stage_timer(durations))
+    except Exception as e:
+        print(f"❌ An error occurred while processing '{keyword}': {e}")
+        result = {"success": False, "error": str(e)}
+    return {
+        "keyword": keyword,
+        "success": result.get("success", False),
+        "error": result.get("error"),
+        "stages": durations,
+        "platforms": result.get("platforms", {}),
+        "total_s": time.perf_counter() - started,
+    }
+
+
+def print_run_report(reports, wall_s):
+    """Prints per-keyword, per-stage durations for one scheduler run."""
+    print("\n[RUN REPORT] seconds per stage")
+    print(f"{'keyword':<20}" + "".join(f"{s:>12}" for s in REPORT_STAGES) + f"{'total':>10}  status")
+    for r in sorted(reports, key=lambda r: r["total_s"], reverse=True):
+        cells = "".join(f"{r['stages'][s]:>12.1f}" if s in r["stages"] else f"{'-':>12}" for s in REPORT_STAGES)
+        status = "ok" if r["success"] else f"failed: {r['error']}"
+        print(f"{r['keyword'][:20]:<20}{cells}{r['total_s']:>10.1f}  {status}")
+        slow = {p: v["latency_s"] for p, v in r["platforms"].items() if v.get("timed_out") or not v.get("success")}
+        if slow:
+            print(f"{'':<20}  failed/timed-out fetches: {slow}")
+    sequential = sum(r["total_s"] for r in reports)
+    print(f"Run took {wall_s:.1f}s across {len(reports)} keywords "
+          f"(sum of keyword times {sequential:.1f}s, {SCHEDULER_WORKERS} workers).")
+
+
+def scheduled_job(keywords=None):
     """
     This is the main function that will be executed by the scheduler.
-    It runs the entire data pipeline for all tracked keywords.
+    It runs the entire data pipeline for `keywords` (default: all tracked
+    keywords), several keywords at a time, and returns the per-keyword reports.
     """
+    keywords = keywords or KEYWORDS_TO_TRACK
     print("======================================================")
     print(f"SCHEDULER: Starting new job run at {time.ctime()}")
     print("======================================================")
 
-    for keyword in KEYWORDS_TO_TRACK:
-        print(f"\n--- Processing keyword: {keyword} ---")
-        
-        # --- Step 1: Fetch Raw Data ---
-        print("\n[FETCHING DATA]")
-        try:
-            fetch_and_store_google_trends(keyword)
-            fetch_and_store_reddit_trends(keyword)
-            # fetch_and_store_twitter_trends(keyword) # Uncomment when Twitter script is fixed
-        except Exception as e:
-            print(f"❌ An error occurred during data fetching for '{keyword}': {e}")
-            continue # Move to the next keyword if fetching fails
-
-        # --- Step 2: Analyze and Clean Data ---
-        print("\n[ANALYZING SENTIMENT]")
-        try:
-            analyze_and_store_sentiment(keyword)
-        except Exception as e:
-            print(f"❌ An error occurred during sentiment analysis for '{keyword}': {e}")
+    started = time.perf_counter()
+    reports = []
+    workers = max(1, min(SCHEDULER_WORKERS, len(keywords)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="keyword") as pool:
+        futures = [pool.submit(process_keyword, keyword) for keyword in keywords]
+        for future in as_completed(futures):
+            reports.append(future.result())
 
+    print_run_report(reports, time.perf_counter() - started)
     print("\n======================================================")
     print(f"SCHEDULER: Job run finished at {time.ctime()}")
     print("======================================================")
+    return reports
+
+
+def adaptive_job():
+    """Runs only the keywords that are due, hottest and most overdue first, within the API budget."""
+    keyword_scheduler = get_keyword_scheduler()
+    try:
+        due, plan = keyword_scheduler.due_keywords(KEYWORDS_TO_TRACK)
+    except Exception as e:
+        print(f"❌ Could not plan the keyword schedule: {e}")
+        return []
+
+    for p in plan:
+        next_in = "now" if p['overdue'] >= 1 else f"in {(1 - p['overdue']) * p['interval_s'] / 60:.0f} min"
+        print(f"SCHEDULER: {p['keyword']:<20} {p['velocity']:>8.2f} mentions/h "
+              f"(baseline {p['baseline_rate']:.2f}/h), every {p['interval_s'] / 60:.0f} min, due {next_in}")
+    if not due:
+        print(f"SCHEDULER: nothing to run ({keyword_scheduler.calls_last_hour()} of "
+              f"{keyword_scheduler.budget_per_hour} API calls used in the last hour).")
+        return []
+
+    reports = scheduled_job(due)
+    for r in reports:
+        # one call per platform fetch that got a slot; a run that crashed before
+        # fetching still counts as a full run's spend
+        fetched = [p for p, v in r["platforms"].items() if v.get("latency_s") is not None]
+        keyword_scheduler.record_run(r["keyword"], calls=len(fetched) if r["platforms"] else None)
+    return reports
+
+
+def forecast_refresh_job():
+    """Recomputes stored forecasts whose input series received new points."""
+    try:
+        summary = refresh_stale_forecasts()
+        print(f"SCHEDULER: forecast refresh {summary}")
+    except Exception as e:
+        print(f"❌ An error occurred during the forecast refresh: {e}")
 
 
 # --- Scheduler Configuration ---
 if __name__ == "__main__":
+    # Load the seen-ID filters now; any that need warming from raw_data do so in the background
+    warm_seen_filters()
+
     # Create a scheduler instance
     scheduler = BlockingScheduler()
 
-    # Schedule the job to run every 6 hours
-    # You can change 'hours' to 'minutes' or 'days' for testing or production
-    scheduler.add_job(scheduled_job, 'interval', hours=6)
+    if SCHEDULER_MODE == 'fixed':
+        # Schedule the job to run every 6 hours
+        # You can change 'hours' to 'minutes' or 'days' for testing or production
+        job, every = scheduled_job, "every 6 hours"
+        scheduler.add_job(scheduled_job, 'interval', hours=6)
+    else:
+        # Each keyword runs on its own activity-based interval; checked every few minutes
+        job, every = adaptive_job, f"every {SCHEDULER_TICK_MINUTES} minutes for due keywords"
+        scheduler.add_job(adaptive_job, 'interval', minutes=SCHEDULER_TICK_MINUTES)
+    # Forecasts are materialized; only series with new points are recomputed
+    scheduler.add_job(forecast_refresh_job, 'interval', minutes=FORECAST_REFRESH_MINUTES)
 
-    print("✅ Scheduler started. The first job will run immediately, then every 6 hours.")
+    print(f"✅ Scheduler started ({SCHEDULER_MODE}). The first job will run immediately, then {every}.")
     print("Press Ctrl+C to exit.")
 
     try:
         # Run the job once immediately at the start
-        scheduled_job() 
+        job()
         # Start the scheduler's main loop
         scheduler.start()
     except (KeyboardInterrupt, SystemExit):